@@ -0,0 +1,106 @@
+"""
+Capture benchmark: time and allocations of rapid repeated screen captures.
+
+Compares capture_image, which returns a new PIL image for every capture, with
+capture_frame, which converts into the reusable frame buffer. Allocations of one
+steady-state capture (after the buffer exists) are counted twice: the peak of traced Python
+and NumPy allocations, and the number of images Pillow created (their pixel memory is
+allocated by Pillow itself and not traced). With the fake backend the frames come from memory; --backend mss captures the real screen
+through the long-lived grabber (mss' own copy of each grab is included there).
+
+Usage (from the repository root):
+    python -m benchmarks.capture --output capture.json
+    python -m benchmarks.capture --backend mss --resolution native
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from PIL import Image
+from benchmarks.latency import RESOLUTIONS, ReplayBackend, summarize, synthetic_screen
+from src.core.screenshot_capture import MssBackend, ScreenshotCapture
+
+METHODS = ("capture_image", "capture_frame")
+
+
+def make_capture(backend_name, size):
+    if backend_name == "mss":
+        return ScreenshotCapture(backend=MssBackend(), mode="monitor", monitor=1)
+    frames = [synthetic_screen(*size, seed=seed) for seed in range(2)]
+    return ScreenshotCapture(backend=ReplayBackend(frames), mode="monitor", monitor=1)
+
+
+def run_method(capture, method, iterations, warmup):
+    grab = getattr(capture, method)
+    for _ in range(warmup):
+        grab()
+    seconds = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        grab()
+        seconds.append(time.perf_counter() - start)
+    images_before = Image.core.get_stats()["new_count"]
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        grab()
+        allocated = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": summarize({method: seconds})[method], "allocated_bytes": allocated,
+            "pil_images": Image.core.get_stats()["new_count"] - images_before}
+
+
+def run_benchmark(backend_name, resolutions, iterations, warmup):
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "backend": backend_name,
+            "iterations": iterations,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "resolutions": {},
+    }
+    for name in resolutions:
+        capture = make_capture(backend_name, RESOLUTIONS.get(name))
+        try:
+            results["resolutions"][name] = {method: run_method(capture, method, iterations, warmup)
+                                            for method in METHODS}
+        finally:
+            capture.close()
+        print(f"Measured {name}.", file=sys.stderr)
+    return results
+
+
+def print_report(results):
+    print(f"{'resolution':<10} {'method':<14} {'p50 ms':>8} {'p90 ms':>8} {'alloc MB':>9} {'images':>7}")
+    for name, methods in results["resolutions"].items():
+        for method, stats in methods.items():
+            print(f"{name:<10} {method:<14} {stats['seconds']['p50'] * 1000:>8.2f} "
+                  f"{stats['seconds']['p90'] * 1000:>8.2f} {stats['allocated_bytes'] / 1e6:>9.2f} "
+                  f"{stats['pil_images']:>7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark repeated screen captures.")
+    parser.add_argument("--backend", choices=("fake", "mss"), default="fake",
+                        help="fake replays synthetic frames; mss captures the real primary monitor.")
+    parser.add_argument("--resolution", action="append", choices=sorted(RESOLUTIONS) + ["native"],
+                        help="Resolution to measure (repeatable; native for --backend mss). Defaults to all.")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    if args.backend == "mss":
+        chosen = ["native"]
+    else:
+        chosen = [name for name in args.resolution or list(RESOLUTIONS) if name != "native"]
+    run = run_benchmark(args.backend, chosen, args.iterations, args.warmup)
+    print_report(run)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
@@ -0,0 +1,243 @@
+"""
+End-to-end latency benchmark for the hotkey-to-answer path.
+
+Drives LLMAssistant.analyze_screen against a local mock Ollama server, with a fake capture
+backend that replays fixed frames, and reports per-stage timing percentiles plus peak RSS.
+
+Usage (from the repository root):
+    python -m benchmarks.latency --output run.json
+    python -m benchmarks.latency --baseline run.json   # exits 1 on regressions
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import numpy as np
+from src.cli.main import LLMAssistant
+from src.cli.markdown_renderer import IncrementalMarkdownRenderer
+from src.core.llm_interface import LLMInterface
+from src.core.screenshot_capture import FakeFramebufferBackend, ScreenshotCapture
+from src.devtools.mock_ollama import MockOllamaServer
+
+RESOLUTIONS = {
+    "1080p": (1920, 1080),
+    "1440p": (2560, 1440),
+    "4k": (3840, 2160),
+    "5k": (5120, 2880),
+}
+STAGES = ("capture", "convert", "encode", "serialize", "http", "ttft", "render", "total")
+MODEL = "llava:7b-v1.5-q4_K_M"
+
+
+def synthetic_screen(width, height, seed):
+    """
+    Builds a BGRA frame that compresses roughly like a real desktop: a light background,
+    a few panels and many short dark "text" runs.
+    """
+    rng = np.random.default_rng(seed)
+    frame = np.full((height, width, 4), 245, dtype=np.uint8)
+    for _ in range(8):
+        x, y = rng.integers(0, width // 2), rng.integers(0, height // 2)
+        w, h = rng.integers(width // 8, width // 2), rng.integers(height // 8, height // 2)
+        frame[y:y + h, x:x + w, :3] = rng.integers(180, 255, size=3, dtype=np.uint8)
+    line_height = max(8, height // 90)
+    for row in range(0, height - line_height, line_height * 2):
+        starts = rng.integers(0, width, size=12)
+        lengths = rng.integers(width // 40, width // 6, size=12)
+        for start, length in zip(starts, lengths):
+            frame[row:row + line_height // 2, start:start + length, :3] = rng.integers(0, 90)
+    frame[..., 3] = 255
+    return frame
+
+
+class ReplayBackend(FakeFramebufferBackend):
+    """A fake capture backend that cycles through a fixed set of frames."""
+
+    def __init__(self, frames):
+        height, width = frames[0].shape[:2]
+        super().__init__(monitors=[{"left": 0, "top": 0, "width": width, "height": height}],
+                         desktop=frames[0])
+        self.frames = frames
+        self._index = 0
+
+    def grab(self, region):
+        self.desktop = self.frames[self._index % len(self.frames)]
+        self._index += 1
+        return super().grab(region)
+
+
+def markdown_response(token_count):
+    """A Markdown answer of roughly token_count words with headings, lists and code."""
+    words = []
+    while len(words) < token_count:
+        words += ["##", "Section\n\nThis", "screen", "shows", "a", "**settings**", "panel.\n\n"]
+        words += ["-", "Click", "**Save**", "to", "apply.\n-", "Press", "`Esc`", "to", "close.\n\n"]
+        words += ["```python\nprint('hello')\n```\n\n"]
+    return " ".join(words[:token_count])
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(samples):
+    summary = {}
+    for stage, values in samples.items():
+        values = sorted(v for v in values if v is not None)
+        if not values:
+            continue
+        summary[stage] = {
+            "p50": percentile(values, 0.50),
+            "p90": percentile(values, 0.90),
+            "p99": percentile(values, 0.99),
+            "mean": sum(values) / len(values),
+            "n": len(values),
+        }
+    return summary
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_resolution(server, name, size, iterations, warmup, stream):
+    frames = [synthetic_screen(size[0], size[1], seed) for seed in range(3)]
+    capture = ScreenshotCapture(backend=ReplayBackend(frames))
+    interface = LLMInterface(host=server.url, model=MODEL)
+    interface.response_cache = None # Every iteration must reach the server
+    assistant = LLMAssistant(screenshot_tool=capture, llm_interface=interface)
+    samples = {stage: [] for stage in STAGES}
+
+    for iteration in range(warmup + iterations):
+        renderer = IncrementalMarkdownRenderer()
+        render_seconds = [0.0]
+
+        def on_token(chunk):
+            render_start = time.perf_counter()
+            renderer.append(chunk)
+            render_seconds[0] += time.perf_counter() - render_start
+
+        start = time.perf_counter()
+        # The pipeline's progress prints would dominate small stages; silence them.
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            response = assistant.analyze_screen("What is on this screen?",
+                                                on_token=on_token if stream else None)
+            if not stream:
+                render_start = time.perf_counter()
+                renderer.append(response)
+                render_seconds[0] = time.perf_counter() - render_start
+        total = time.perf_counter() - start
+
+        if iteration < warmup:
+            continue
+        for stage, seconds in list(capture.last_timings.items()) + list(interface.last_timings.items()):
+            samples[stage].append(seconds)
+        if stream and interface.last_stream_stats:
+            samples["ttft"].append(interface.last_stream_stats.time_to_first_token)
+        samples["render"].append(render_seconds[0])
+        samples["total"].append(total)
+
+    interface.close()
+    return summarize(samples)
+
+
+def run_benchmark(resolutions, iterations, warmup, prefill_delay, token_delay, tokens, stream):
+    server = MockOllamaServer(models=[MODEL], response_text=markdown_response(tokens),
+                              prefill_delay=prefill_delay, token_delay=token_delay)
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "iterations": iterations,
+            "prefill_delay": prefill_delay,
+            "token_delay": token_delay,
+            "tokens": tokens,
+            "stream": stream,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "resolutions": {},
+    }
+    with server:
+        for name in resolutions:
+            print(f"Benchmarking {name}...", file=sys.stderr)
+            results["resolutions"][name] = run_resolution(server, name, RESOLUTIONS[name],
+                                                          iterations, warmup, stream)
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+def print_report(results):
+    print(f"{'resolution':<8} {'stage':<10} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10}")
+    for name, stages in results["resolutions"].items():
+        for stage in STAGES:
+            if stage in stages:
+                s = stages[stage]
+                print(f"{name:<8} {stage:<10} {s['p50'] * 1e3:>10.2f} {s['p90'] * 1e3:>10.2f} {s['p99'] * 1e3:>10.2f}")
+    print(f"peak RSS: {results['peak_rss_mb']:.1f} MB")
+
+
+def compare(baseline, current, threshold, min_delta=0.001):
+    """
+    Compares p50 stage times of two runs.
+
+    A stage regresses when it is more than threshold (a fraction) slower and the absolute
+    difference exceeds min_delta seconds, which keeps sub-millisecond noise out.
+
+    Returns:
+        list[str]: One line per regression.
+    """
+    regressions = []
+    for name, stages in current["resolutions"].items():
+        for stage, stats in stages.items():
+            base = baseline.get("resolutions", {}).get(name, {}).get(stage)
+            if not base:
+                continue
+            before, after = base["p50"], stats["p50"]
+            change = (after - before) / before if before else 0.0
+            marker = ""
+            if change > threshold and after - before > min_delta:
+                marker = "  REGRESSION"
+                regressions.append(f"{name}/{stage}: {before * 1e3:.2f} -> {after * 1e3:.2f} ms ({change:+.0%})")
+            print(f"{name:<8} {stage:<10} {before * 1e3:>10.2f} -> {after * 1e3:>10.2f} ms {change:>+7.0%}{marker}")
+    base_rss, rss = baseline.get("peak_rss_mb"), current.get("peak_rss_mb")
+    if base_rss and rss and rss > base_rss * (1 + threshold):
+        regressions.append(f"peak RSS: {base_rss:.1f} -> {rss:.1f} MB")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the capture-to-answer latency.")
+    parser.add_argument("--resolution", action="append", choices=sorted(RESOLUTIONS),
+                        help="Resolution to test (repeatable). Defaults to all.")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--prefill-delay", type=float, default=0.05, help="Simulated prompt processing (s).")
+    parser.add_argument("--token-delay", type=float, default=0.002, help="Simulated decode time per token (s).")
+    parser.add_argument("--tokens", type=int, default=200, help="Tokens in the simulated answer.")
+    parser.add_argument("--no-stream", action="store_true", help="Use non-streaming requests.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--baseline", help="Compare against a previous --output file.")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed slowdown before flagging (fraction).")
+    args = parser.parse_args()
+
+    run = run_benchmark(args.resolution or list(RESOLUTIONS), args.iterations, args.warmup,
+                        args.prefill_delay, args.token_delay, args.tokens, not args.no_stream)
+    print_report(run)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            found = compare(json.load(f), run, args.threshold)
+        if found:
+            print("Regressions:\n  " + "\n  ".join(found))
+            sys.exit(1)
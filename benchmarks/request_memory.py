@@ -0,0 +1,165 @@
+"""
+Request memory benchmark: peak Python allocations of building and sending one /api/generate
+request with a large screenshot.
+
+Compares the previous request path, which base64-encodes the image into a str, puts it in
+the payload dict and serializes everything with json.dumps, against StreamingJSONBody,
+which encodes the image chunk by chunk while it is sent. Images are encoded at full
+resolution (no downscaling) from a busy synthetic desktop, so 4K and 5K frames give
+multi-megabyte payloads. Peaks are measured with tracemalloc, on top of the encoded image
+itself:
+
+- build: building the body and iterating it once, as a transport would.
+- send:  a full request through OllamaTransport to a mock Ollama server running in a
+         separate process, so the server's own allocations are not counted.
+
+Usage (from the repository root):
+    python -m benchmarks.request_memory --output request_memory.json
+"""
+import argparse
+import base64
+import json
+import platform
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+from benchmarks.latency import RESOLUTIONS, synthetic_screen
+from src.core.image_processing import ImagePreparer, ImagePrepPolicy
+from src.core.screenshot_capture import FakeFramebufferBackend, ScreenshotCapture
+from src.core.transport import OllamaTransport, OllamaTransportError, StreamingJSONBody
+
+MODEL = "llava:7b-v1.5-q4_K_M"
+# Full-size encodings, like a model policy without a pixel budget would send.
+FULL_SIZE_POLICY = ImagePrepPolicy(max_long_edge=None, quality_ladder=(("JPEG", 90),))
+
+
+def screen_with_photo(width, height):
+    """A synthetic desktop with a noisy photo-like panel, so its JPEG is as large as a busy real screen's."""
+    import numpy as np
+    frame = synthetic_screen(width, height, seed=1)
+    rng = np.random.default_rng(1)
+    panel = frame[height // 4:3 * height // 4, width // 4:3 * width // 4, :3]
+    panel[...] = rng.integers(0, 256, size=panel.shape, dtype=np.uint8)
+    return frame
+
+
+def request_payload():
+    return {"model": MODEL, "system": "You describe screens.", "prompt": "Describe this screen.",
+            "stream": False, "keep_alive": "30m"}
+
+
+def legacy_body(image_data):
+    """The previous request path: base64 str in the payload dict, then json.dumps and encode."""
+    payload = request_payload()
+    payload["images"] = [base64.b64encode(image_data).decode("utf-8")]
+    return json.dumps(payload).encode("utf-8")
+
+
+def streaming_body(image_data):
+    return StreamingJSONBody(request_payload(), [image_data])
+
+
+def traced_peak(fn):
+    """Runs fn and returns the peak of traced allocations above the level before it, in bytes."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        fn()
+        return tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+
+
+def consume(body):
+    """Iterates a body like a transport sending it; bytes are sent as one piece."""
+    if isinstance(body, bytes):
+        return len(body)
+    return sum(len(chunk) for chunk in body)
+
+
+def start_mock_server():
+    """Starts the mock Ollama server in a subprocess; returns (process, transport)."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    process = subprocess.Popen([sys.executable, "-m", "src.devtools.mock_ollama", "--port", str(port),
+                                "--model", MODEL, "--prefill-delay", "0", "--token-delay", "0"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    transport = OllamaTransport(f"http://127.0.0.1:{port}")
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            transport.get_json("tags")
+            return process, transport
+        except OllamaTransportError:
+            if time.monotonic() > deadline or process.poll() is not None:
+                process.kill()
+                raise RuntimeError("The mock Ollama server did not start.")
+            time.sleep(0.05)
+
+
+def run_resolution(transport, name, size, iterations):
+    width, height = size
+    backend = FakeFramebufferBackend(({"left": 0, "top": 0, "width": width, "height": height},),
+                                     desktop=screen_with_photo(width, height))
+    image = ScreenshotCapture(backend=backend).capture_image()
+    image_data = ImagePreparer(FULL_SIZE_POLICY).prepare(image).data
+    del image, backend
+    results = {"image_bytes": len(image_data)}
+    for method, build in (("legacy", legacy_body), ("streaming", streaming_body)):
+        build_peaks, send_peaks = [], []
+        for _ in range(iterations):
+            build_peaks.append(traced_peak(lambda: consume(build(image_data))))
+            send_peaks.append(traced_peak(lambda: transport.post_json("generate", build(image_data))))
+        results[method] = {"build": min(build_peaks), "send": min(send_peaks)}
+    print(f"Measured {name}.", file=sys.stderr)
+    return results
+
+
+def run_benchmark(resolutions, iterations):
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "iterations": iterations,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "resolutions": {},
+    }
+    process, transport = start_mock_server()
+    try:
+        transport.post_json("generate", {"model": MODEL}) # Opens the connection and loads the model
+        for name in resolutions:
+            results["resolutions"][name] = run_resolution(transport, name, RESOLUTIONS[name], iterations)
+    finally:
+        transport.close()
+        process.terminate()
+        process.wait()
+    return results
+
+
+def print_report(results):
+    print(f"{'resolution':<10} {'image MB':>9} {'stage':<6} {'legacy MB':>10} {'stream MB':>10} {'reduction':>10}")
+    for name, stats in results["resolutions"].items():
+        for stage in ("build", "send"):
+            legacy, streaming = stats["legacy"][stage], stats["streaming"][stage]
+            print(f"{name:<10} {stats['image_bytes'] / 1e6:>9.2f} {stage:<6} {legacy / 1e6:>10.2f} "
+                  f"{streaming / 1e6:>10.2f} {1 - streaming / legacy:>10.0%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark peak memory of building and sending a request.")
+    parser.add_argument("--resolution", action="append", choices=sorted(RESOLUTIONS),
+                        help="Resolution to measure (repeatable). Defaults to 4k and 5k.")
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    run = run_benchmark(args.resolution or ["4k", "5k"], args.iterations)
+    print_report(run)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
@@ -0,0 +1,203 @@
+"""
+Startup benchmark: import time of the entry points and which heavy modules they load.
+
+Each measurement runs in a fresh interpreter with `python -X importtime`, so module caches
+of this process do not hide anything. For every entry point it reports the median import
+time, the slowest imports, and whether modules that must stay lazy (Qt, Pillow, NumPy,
+requests, ...) were loaded at import time.
+
+Usage (from the repository root):
+    python -m benchmarks.startup --output startup.json
+    python -m benchmarks.startup --baseline startup.json   # exits 1 on regressions
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Entry point module -> top-level modules it must not import eagerly.
+ENTRY_POINTS = {
+    "src.cli.main": ("PyQt6", "pynput", "markdown", "PIL", "numpy", "mss", "requests", "httpx", "dotenv"),
+    "src.cli.batch": ("PyQt6", "pynput", "markdown", "PIL", "numpy", "mss", "requests", "httpx", "dotenv"),
+    "src.core.llm_interface": ("PyQt6", "pynput", "markdown", "PIL", "numpy", "mss", "requests", "httpx"),
+    "src.cli.hotkey_listener": ("PIL", "numpy", "mss", "requests", "httpx", "markdown"),
+    "src.cli.client": ("PyQt6", "pynput", "markdown", "PIL", "numpy", "mss", "requests", "httpx", "dotenv"),
+    "src.cli.watch": ("PyQt6", "pynput", "markdown", "PIL", "numpy", "mss", "requests", "httpx", "dotenv"),
+    "src.cli.daemon": ("PyQt6", "pynput", "markdown", "PIL", "numpy", "mss", "requests", "httpx"),
+    "src.cli.history": ("PyQt6", "pynput", "markdown", "PIL", "numpy", "mss", "requests", "httpx", "dotenv"),
+}
+# Commands timed end to end; the CLI must be able to print its help without touching Qt.
+COMMANDS = {
+    "cli_help": ["-m", "src.cli.main", "--help"],
+    "client_help": ["-m", "src.cli.client", "--help"],
+}
+TOP_IMPORTS = 8
+
+
+def parse_importtime(stderr):
+    """
+    Parses `-X importtime` output.
+
+    Returns:
+        list[tuple]: (module, self seconds, cumulative seconds, depth) in the order printed,
+            where each module comes after the modules it imported.
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue # The header line
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6, depth))
+    return modules
+
+
+def import_subtree(modules, module):
+    """Returns the cumulative seconds of module and the (name, cumulative seconds) of everything it imported."""
+    for index, (name, _, cumulative, depth) in enumerate(modules):
+        if name == module:
+            children = []
+            for child, _, child_cumulative, child_depth in reversed(modules[:index]):
+                if child_depth <= depth:
+                    break
+                children.append((child, child_cumulative))
+            return cumulative, children
+    return 0.0, []
+
+
+def measure_import(module, forbidden):
+    """Imports module in a fresh interpreter; returns its import time, top imports and eager heavy modules."""
+    probe = (f"import sys, {module}\n"
+             f"print(','.join(m for m in {forbidden!r} if m in sys.modules))")
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", probe], cwd=REPO_ROOT,
+                               capture_output=True, text=True)
+    if completed.returncode != 0:
+        return None
+    seconds, children = import_subtree(parse_importtime(completed.stderr), module)
+    top = sorted(children, key=lambda item: item[1], reverse=True)[:TOP_IMPORTS]
+    loaded = completed.stdout.strip()
+    return {
+        "seconds": seconds,
+        "top": top,
+        "eager": loaded.split(",") if loaded else [],
+    }
+
+
+def measure_command(args):
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, *args], cwd=REPO_ROOT, capture_output=True)
+    seconds = time.perf_counter() - start
+    return seconds if completed.returncode == 0 else None
+
+
+def run_benchmark(iterations):
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "iterations": iterations,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "imports": {},
+        "commands": {},
+    }
+    for module, forbidden in ENTRY_POINTS.items():
+        print(f"Importing {module}...", file=sys.stderr)
+        runs = [measure_import(module, forbidden) for _ in range(iterations)]
+        if any(run is None for run in runs):
+            # An optional dependency of this entry point (e.g. PyQt6) is not installed.
+            results["imports"][module] = {"skipped": True}
+            continue
+        median_run = sorted(runs, key=lambda run: run["seconds"])[len(runs) // 2]
+        results["imports"][module] = {
+            "p50": statistics.median(run["seconds"] for run in runs),
+            "max": max(run["seconds"] for run in runs),
+            "top": median_run["top"],
+            "eager": sorted(set().union(*(run["eager"] for run in runs))),
+        }
+    for name, args in COMMANDS.items():
+        print(f"Running {name}...", file=sys.stderr)
+        times = [measure_command(args) for _ in range(iterations)]
+        if any(seconds is None for seconds in times):
+            results["commands"][name] = {"skipped": True}
+            continue
+        results["commands"][name] = {"p50": statistics.median(times), "max": max(times)}
+    return results
+
+
+def print_report(results):
+    print(f"{'entry point':<26} {'p50 ms':>10} {'max ms':>10}  eager heavy imports")
+    for module, stats in results["imports"].items():
+        if stats.get("skipped"):
+            print(f"{module:<26} {'skipped (import failed)':>22}")
+            continue
+        eager = ", ".join(stats["eager"]) or "-"
+        print(f"{module:<26} {stats['p50'] * 1e3:>10.1f} {stats['max'] * 1e3:>10.1f}  {eager}")
+        for name, seconds in stats["top"]:
+            print(f"    {name:<40} {seconds * 1e3:>8.1f} ms")
+    for name, stats in results["commands"].items():
+        if stats.get("skipped"):
+            print(f"{name:<26} {'skipped (command failed)':>22}")
+            continue
+        print(f"{name:<26} {stats['p50'] * 1e3:>10.1f} {stats['max'] * 1e3:>10.1f}")
+
+
+def compare(baseline, current, threshold, min_delta=0.005):
+    """
+    Compares p50 import and command times of two runs, and flags heavy modules that are
+    now imported eagerly but were not before.
+
+    A time regresses when it is more than threshold (a fraction) slower and the absolute
+    difference exceeds min_delta seconds, which keeps process start-up noise out.
+
+    Returns:
+        list[str]: One line per regression.
+    """
+    regressions = []
+    for section in ("imports", "commands"):
+        for name, stats in current[section].items():
+            base = baseline.get(section, {}).get(name)
+            if not base or base.get("skipped") or stats.get("skipped"):
+                continue
+            before, after = base["p50"], stats["p50"]
+            change = (after - before) / before if before else 0.0
+            marker = ""
+            if change > threshold and after - before > min_delta:
+                marker = "  REGRESSION"
+                regressions.append(f"{name}: {before * 1e3:.1f} -> {after * 1e3:.1f} ms ({change:+.0%})")
+            print(f"{name:<26} {before * 1e3:>10.1f} -> {after * 1e3:>10.1f} ms {change:>+7.0%}{marker}")
+            new_eager = set(stats.get("eager", ())) - set(base.get("eager", ()))
+            if new_eager:
+                regressions.append(f"{name}: now imports {', '.join(sorted(new_eager))} eagerly")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark start-up and import time.")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--baseline", help="Compare against a previous --output file.")
+    parser.add_argument("--threshold", type=float, default=0.20, help="Allowed slowdown before flagging (fraction).")
+    args = parser.parse_args()
+
+    run = run_benchmark(args.iterations)
+    print_report(run)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
+    failures = [f"{module}: imports {', '.join(stats['eager'])} eagerly"
+                for module, stats in run["imports"].items() if stats.get("eager")]
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            failures += compare(json.load(f), run, args.threshold)
+    if failures:
+        print("Regressions:\n  " + "\n  ".join(failures))
+        sys.exit(1)
@@ -0,0 +1,193 @@
+"""
+Watch mode benchmark: cost of change detection and CPU use of a watched session.
+
+Two parts:
+- detect: per-sample cost of ChangeDetector.update and of a whole watcher sample (capture
+  into the frame buffer plus detection) for each resolution and pixel step.
+- session: a scripted desktop session replayed in real time through a fake capture
+  backend: idle, typing a line of text, idle, switching windows, idle. It runs once
+  with the adaptive interval and CPU budget, and once sampling at a fixed rate without a
+  budget. For each run it reports the process CPU share, the samples taken while idle and
+  while active, the events reported with their region, and the delay from the last change
+  of a burst to its event.
+
+Usage (from the repository root):
+    python -m benchmarks.watch --output watch.json
+    python -m benchmarks.watch --duration 24 --resolution 4k
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from benchmarks.latency import RESOLUTIONS, summarize, synthetic_screen
+from src.core.screenshot_capture import FakeFramebufferBackend, ScreenshotCapture
+from src.core.watch import ChangeDetector, ScreenWatcher
+
+PIXEL_STEPS = (1, 2, 4)
+
+
+def fake_capture(size, seed=1):
+    width, height = size
+    backend = FakeFramebufferBackend(({"left": 0, "top": 0, "width": width, "height": height},),
+                                     desktop=synthetic_screen(width, height, seed))
+    return ScreenshotCapture(backend=backend, mode="monitor", monitor=1)
+
+
+def run_detect(size, iterations):
+    """Seconds per detector update and per whole sample, by pixel step."""
+    capture = fake_capture(size)
+    frame = capture.capture_frame()
+    results = {}
+    for step in PIXEL_STEPS:
+        detector = ChangeDetector(tile_size=32, pixel_step=step)
+        detector.update(frame)
+        detect = []
+        for index in range(iterations):
+            frame[index % 64, :64, 0] ^= 0xFF # A small change, so the reduction has work to do
+            start = time.perf_counter()
+            detector.update(frame)
+            detect.append(time.perf_counter() - start)
+        watcher = ScreenWatcher(capture, on_change=lambda event: None, pixel_step=step, interval=0)
+        watcher.sample()
+        sample = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            watcher.sample()
+            sample.append(time.perf_counter() - start)
+        results[step] = summarize({"detect": detect, "sample": sample})
+    return results
+
+
+class ScriptedSession:
+    """Plays a desktop session into a fake backend's framebuffer on a background thread."""
+
+    def __init__(self, backend, duration):
+        self.backend = backend
+        self.duration = duration
+        self.bursts = [] # (first change, last change) per burst, in time.monotonic seconds
+        self.phases = {} # name -> (start, end)
+
+    def run(self):
+        desktop = self.backend.desktop
+        height, width = desktop.shape[:2]
+        unit = self.duration / 12
+        start = time.monotonic()
+
+        def wait_until(offset):
+            time.sleep(max(0.0, start + offset * unit - time.monotonic()))
+
+        self.phases["idle"] = (start, start + 3 * unit)
+        wait_until(3)
+        # Typing: one glyph every 80 ms along a line of text, glyphs sized like 1080p text
+        typing_start = time.monotonic()
+        glyph_width, glyph_height = max(1, width // 190), max(1, height // 60)
+        x, y = width // 10, height // 3
+        while time.monotonic() < start + 5 * unit:
+            desktop[y:y + glyph_height, x:x + glyph_width, :3] = 30
+            x += glyph_width + glyph_width // 4
+            time.sleep(0.08)
+        self.bursts.append((typing_start, time.monotonic()))
+        self.phases["typing"] = (typing_start, time.monotonic())
+        wait_until(8)
+        # Window switch: most of the screen is redrawn at once
+        switch = time.monotonic()
+        desktop[height // 8:height * 7 // 8, width // 8:width * 7 // 8, :3] = 200
+        self.bursts.append((switch, switch))
+        wait_until(12)
+
+
+def run_session(size, duration, adaptive):
+    capture = fake_capture(size)
+    events = []
+    options = dict(interval=0.25, max_interval=2.0, cpu_budget=0.05) if adaptive else \
+        dict(interval=0.25, max_interval=0.25, cpu_budget=0)
+    watcher = ScreenWatcher(capture, on_change=events.append, debounce=0.75, **options)
+    sample_times = []
+    sample = watcher.sample
+
+    def timed_sample():
+        sample_times.append(time.monotonic())
+        return sample()
+
+    watcher.sample = timed_sample
+    session = ScriptedSession(capture.backend, duration)
+    cpu_start, wall_start = time.process_time(), time.monotonic()
+    watcher.start()
+    session.run()
+    watcher.stop()
+    cpu, wall = time.process_time() - cpu_start, time.monotonic() - wall_start
+
+    def samples_in(phase):
+        begin, end = session.phases[phase]
+        return sum(begin <= t < end for t in sample_times) / max(end - begin, 1e-9)
+
+    delays = []
+    for event in events:
+        finished = [last for _, last in session.bursts if last <= event.created_at]
+        if finished:
+            delays.append(event.created_at - finished[-1])
+    return {
+        "cpu_share": cpu / wall,
+        "idle_samples_per_second": samples_in("idle"),
+        "typing_samples_per_second": samples_in("typing"),
+        "events": [{"region": event.region, "fraction": event.fraction} for event in events],
+        "event_delays": delays,
+        "stats": watcher.stats(),
+    }
+
+
+def run_benchmark(resolutions, iterations, duration):
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "iterations": iterations,
+            "duration": duration,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "detect": {},
+        "session": {},
+    }
+    for name in resolutions:
+        results["detect"][name] = run_detect(RESOLUTIONS[name], iterations)
+        results["session"][name] = {mode: run_session(RESOLUTIONS[name], duration, mode == "adaptive")
+                                    for mode in ("adaptive", "fixed")}
+        print(f"Measured {name}.", file=sys.stderr)
+    return results
+
+
+def print_report(results):
+    print(f"{'resolution':<10} {'step':>4} {'detect p50 ms':>14} {'sample p50 ms':>14}")
+    for name, steps in results["detect"].items():
+        for step, stats in steps.items():
+            print(f"{name:<10} {step:>4} {stats['detect']['p50'] * 1000:>14.2f} {stats['sample']['p50'] * 1000:>14.2f}")
+    print()
+    print(f"{'resolution':<10} {'run':<9} {'CPU %':>6} {'idle/s':>7} {'typing/s':>9} {'events':>7} "
+          f"{'delay s':>8} {'throttled':>10}")
+    for name, runs in results["session"].items():
+        for mode, run in runs.items():
+            delay = max(run["event_delays"]) if run["event_delays"] else float("nan")
+            print(f"{name:<10} {mode:<9} {run['cpu_share'] * 100:>6.1f} {run['idle_samples_per_second']:>7.2f} "
+                  f"{run['typing_samples_per_second']:>9.2f} {len(run['events']):>7} {delay:>8.2f} "
+                  f"{run['stats']['throttled']:>10}")
+            for event in run["events"]:
+                region = event["region"]
+                print(f"{'':<10}   event {region['width']}x{region['height']}+{region['left']}+{region['top']} "
+                      f"({event['fraction']:.1%} of tiles)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark watch mode change detection and CPU use.")
+    parser.add_argument("--resolution", action="append", choices=sorted(RESOLUTIONS),
+                        help="Resolution to measure (repeatable). Defaults to 1440p and 4k.")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--duration", type=float, default=12.0, help="Seconds per scripted session run.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    run = run_benchmark(args.resolution or ["1440p", "4k"], args.iterations, args.duration)
+    print_report(run)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
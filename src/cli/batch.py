@@ -0,0 +1,203 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from src.core.config import AppConfig
+from src.core.image_processing import prepare_file
+from src.core.llm_interface import LLMInterface, StreamStats
+from src.core.prompts import PROMPTS
+from src.core.tracing import setup_instrumentation
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp")
+
+
+class BatchItem:
+    """One screenshot to analyze. The id identifies it in the results for resuming."""
+
+    def __init__(self, item_id, path, query=None):
+        self.id = item_id
+        self.path = path
+        self.query = query
+
+
+def items_from_directory(directory):
+    """Walks a directory (recursively, in sorted order) and returns a BatchItem per image."""
+    items = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                path = os.path.join(root, name)
+                items.append(BatchItem(os.path.relpath(path, directory), path))
+    return items
+
+
+def items_from_manifest(manifest_path):
+    """
+    Reads a manifest. Each line is either a plain image path or a JSON object with "path"
+    and optional "id" and "query". Relative paths are resolved against the manifest's folder.
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    items = []
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            entry = json.loads(line) if line.startswith("{") else {"path": line}
+            path = entry["path"]
+            if not os.path.isabs(path):
+                path = os.path.join(base_dir, path)
+            items.append(BatchItem(entry.get("id", entry["path"]), path, entry.get("query")))
+    return items
+
+
+def load_completed_ids(output_path):
+    """Returns the ids already answered successfully in an existing results file."""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue # A line cut short by an interrupted run
+            if result.get("status") == "ok":
+                completed.add(result.get("id"))
+    return completed
+
+
+class BatchRunner:
+    """
+    Analyzes many screenshots offline.
+
+    Images are decoded, downscaled and encoded in a process pool, while requests go out
+    with bounded concurrency per Ollama host. Each result is appended to a JSONL file as
+    soon as it is available; the file doubles as the checkpoint, so an interrupted run
+    resumes where it stopped.
+    """
+
+    def __init__(self, hosts, model=None, concurrency=2, workers=None, query=None, template=None):
+        """
+        Args:
+            hosts (list[str]): Ollama base URLs; requests are spread across them.
+            model (str, optional): Model to use on every host. Defaults to OLLAMA_MODEL.
+            concurrency (int): Requests in flight per host.
+            workers (int, optional): Image preparation processes. Defaults to the CPU count.
+            query (str, optional): Query for items without their own. Defaults to the template's question.
+            template (str, optional): Prompt template name, see PROMPTS. Defaults to "describe", or "ask" with a query.
+        """
+        self.interfaces = [LLMInterface(host=host, model=model) for host in hosts]
+        self.concurrency = concurrency
+        self.workers = workers
+        self.query = query
+        self.template = template
+        self.policy = self.interfaces[0].image_preparer.policy
+        self.counts = {"ok": 0, "error": 0, "skipped": 0}
+
+    async def _analyze(self, interface, item, image_bytes):
+        # Streaming gives time-to-first-token and tells errors apart from answers.
+        stats = StreamStats()
+        chunks = []
+        async for chunk in interface.astream_llm_response(image_bytes, item.query or self.query, stats=stats,
+                                                          template=self.template):
+            chunks.append(chunk)
+        return "".join(chunks), stats
+
+    async def run(self, items, output_path):
+        """
+        Processes items, skipping those already answered in output_path.
+
+        Returns:
+            dict: Counts of ok, error and skipped items plus elapsed time.
+        """
+        completed = load_completed_ids(output_path)
+        todo = [item for item in items if item.id not in completed]
+        self.counts["skipped"] = len(items) - len(todo)
+        logger.info("Batch: %d to analyze, %d already done.", len(todo), self.counts["skipped"])
+
+        consumers = len(self.interfaces) * self.concurrency
+        # Bounds how far image preparation runs ahead of the requests.
+        queue = asyncio.Queue(maxsize=consumers * 2)
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+
+        with ProcessPoolExecutor(self.workers) as pool, open(output_path, "a", encoding="utf-8") as out:
+            def write(result):
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+                self.counts[result["status"]] += 1
+                done = self.counts["ok"] + self.counts["error"]
+                logger.info("[%d/%d] %s: %s", done, len(todo), result["id"], result["status"])
+
+            async def produce():
+                for item in todo:
+                    future = loop.run_in_executor(pool, prepare_file, item.path, self.policy)
+                    await queue.put((item, future))
+                for _ in range(consumers):
+                    await queue.put(None)
+
+            async def consume(interface):
+                while True:
+                    entry = await queue.get()
+                    if entry is None:
+                        return
+                    item, future = entry
+                    result = {"id": item.id, "path": item.path, "query": item.query,
+                              "host": interface.host, "model": interface.model}
+                    try:
+                        image_bytes, prep_report = await future
+                    except Exception as e:
+                        result.update(status="error", error=f"Could not prepare image: {e}")
+                        write(result)
+                        continue
+                    request_start = time.perf_counter()
+                    response, stats = await self._analyze(interface, item, image_bytes)
+                    result.update(
+                        status="error" if stats.error else "ok",
+                        response=response,
+                        error=stats.error,
+                        latency_s=time.perf_counter() - request_start,
+                        stream=stats.as_dict(),
+                        image=prep_report,
+                    )
+                    write(result)
+
+            await asyncio.gather(produce(), *(consume(interface)
+                                              for interface in self.interfaces
+                                              for _ in range(self.concurrency)))
+
+        for interface in self.interfaces:
+            await interface.aclose()
+        summary = dict(self.counts, elapsed_s=time.perf_counter() - start)
+        logger.info("Batch finished: %s", summary)
+        return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyze a directory or manifest of screenshots offline.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--dir", help="Directory of screenshots (searched recursively).")
+    source.add_argument("--manifest", help="Manifest file: one path or JSON object per line.")
+    parser.add_argument("--output", required=True, help="JSONL results file; re-running resumes it.")
+    parser.add_argument("--host", action="append", help="Ollama host URL (repeatable). Defaults to OLLAMA_HOST.")
+    parser.add_argument("--model", default=AppConfig.OLLAMA_MODEL)
+    parser.add_argument("--query", default=None, help="Query for items without their own.")
+    parser.add_argument("--template", choices=PROMPTS.names(), default=None,
+                        help="Prompt template (default: describe, or ask with a query).")
+    parser.add_argument("--concurrency", type=int, default=2, help="Requests in flight per host.")
+    parser.add_argument("--workers", type=int, default=None, help="Image preparation processes.")
+    args = parser.parse_args()
+    setup_instrumentation()
+
+    batch_items = items_from_directory(args.dir) if args.dir else items_from_manifest(args.manifest)
+    runner = BatchRunner(args.host or [AppConfig.OLLAMA_HOST], model=args.model,
+                         concurrency=args.concurrency, workers=args.workers, query=args.query,
+                         template=args.template)
+    asyncio.run(runner.run(batch_items, args.output))
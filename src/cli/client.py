@@ -0,0 +1,273 @@
+import argparse
+import logging
+import sys
+from src.core.config import AppConfig
+from src.core.prompts import PROMPTS
+from src.core.screenshot_capture import CAPTURE_MODES
+from src.core.transport import AsyncOllamaTransport, OllamaConnectionError, OllamaTransport
+
+logger = logging.getLogger(__name__)
+
+# Seconds (connect and read) a speculative capture request may take; they are only hints.
+PRECAPTURE_TIMEOUT = 1.0
+
+
+def read_token(path):
+    """Returns the daemon token stored at path, or None if there is none."""
+    if not path:
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+class DaemonClient:
+    """
+    Client of the Bambi daemon (src/cli/daemon.py). The daemon's API follows Ollama's
+    conventions, so the Ollama transports serve as its pooled, keep-alive HTTP clients;
+    nothing heavier than them is imported.
+    """
+
+    def __init__(self, url=None, token_file=None):
+        """
+        Args:
+            url (str, optional): Base URL of the daemon. Defaults to DAEMON_HOST and DAEMON_PORT.
+            token_file (str, optional): File holding the daemon token. Defaults to DAEMON_TOKEN_FILE.
+        """
+        self.url = url or AppConfig.get_daemon_url()
+        token = read_token(AppConfig.DAEMON_TOKEN_FILE if token_file is None else token_file)
+        options = dict(connect_timeout=AppConfig.OLLAMA_CONNECT_TIMEOUT, read_timeout=AppConfig.OLLAMA_READ_TIMEOUT,
+                       pool_size=2, headers={"Authorization": f"Bearer {token}"} if token else None)
+        self.transport = OllamaTransport(self.url, **options)
+        self.async_transport = AsyncOllamaTransport(self.url, **options)
+
+    def health(self):
+        """Returns the daemon's status: model, uptime, active analyses, session and cache stats."""
+        return self.transport.get_json("health", timeout=(AppConfig.OLLAMA_CONNECT_TIMEOUT, 10))
+
+    @staticmethod
+    def _collect(message, chunks, on_token):
+        """Handles one streamed message; returns it if it is the final one."""
+        if message.get("error"):
+            raise RuntimeError(f"Error from the Bambi daemon: {message['error']}")
+        if message.get("response"):
+            chunks.append(message["response"])
+            on_token(message["response"])
+        return message if message.get("done") else None
+
+    def _request(self, endpoint, body, on_token):
+        """Sends an analysis request; returns (response, final message)."""
+        if on_token is None:
+            final = self.transport.post_json(endpoint, dict(body, stream=False))
+            return final.get("response", ""), final
+        chunks = []
+        for message in self.transport.iter_ndjson(endpoint, dict(body, stream=True)):
+            final = self._collect(message, chunks, on_token)
+            if final is not None:
+                return "".join(chunks), final
+        raise RuntimeError("The Bambi daemon closed the stream before the answer was complete.")
+
+    async def _arequest(self, endpoint, body, on_token):
+        if on_token is None:
+            final = await self.async_transport.post_json(endpoint, dict(body, stream=False))
+            return final.get("response", ""), final
+        chunks = []
+        async for message in self.async_transport.iter_ndjson(endpoint, dict(body, stream=True)):
+            final = self._collect(message, chunks, on_token)
+            if final is not None:
+                return "".join(chunks), final
+        raise RuntimeError("The Bambi daemon closed the stream before the answer was complete.")
+
+    def analyze(self, body, on_token=None):
+        """
+        Analyzes the screen. body holds the /api/analyze fields: query, template, mode, monitor,
+        region, screenshot, keep and session (true opens a follow-up session).
+
+        Returns:
+            tuple[str, dict]: The response and the final message, with the session id.
+        """
+        return self._request("analyze", body, on_token)
+
+    async def aanalyze(self, body, on_token=None):
+        return await self._arequest("analyze", body, on_token)
+
+    def followup(self, session_id, question, on_token=None):
+        return self._request("followup", {"session": session_id, "question": question}, on_token)
+
+    async def afollowup(self, session_id, question, on_token=None):
+        return await self._arequest("followup", {"session": session_id, "question": question}, on_token)
+
+    def close_session(self, session_id):
+        self.transport.post_json("close_session", {"session": session_id})
+
+    def begin_precapture(self, mode=None, monitor=None, region=None, timeout=PRECAPTURE_TIMEOUT):
+        self.transport.post_json("precapture", {"mode": mode, "monitor": monitor, "region": region},
+                                 timeout=timeout)
+
+    def discard_precapture(self, timeout=PRECAPTURE_TIMEOUT):
+        self.transport.post_json("discard_precapture", {}, timeout=timeout)
+
+    def close(self):
+        self.transport.close()
+
+    async def aclose(self):
+        await self.async_transport.aclose()
+
+
+class RemoteSession:
+    """Client-side handle of a follow-up session held by the daemon; the id is set by the first analysis."""
+
+    def __init__(self):
+        self.id = None
+        self.can_follow_up = False
+
+    def update(self, final):
+        self.id = final.get("session", self.id)
+        self.can_follow_up = bool(final.get("can_follow_up"))
+
+    def __repr__(self):
+        return f"RemoteSession({self.id})"
+
+
+class RemoteAssistant:
+    """
+    Stand-in for LLMAssistant that runs every analysis in the daemon, so the hotkey UI
+    shares the daemon's warm model, caches and sessions instead of building its own.
+    """
+
+    def __init__(self, client=None):
+        self.client = client or DaemonClient()
+        self.precapture = None # Speculative captures happen in the daemon
+        # Precapture hints are called from the keyboard hook, which must never wait on the
+        # daemon; they are sent in order from one worker thread instead.
+        self._notifier = None
+
+    def warm_up(self, start_heartbeat: bool = True):
+        """The daemon keeps the model warm; this only checks that it is reachable."""
+        try:
+            health = self.client.health()
+            logger.info("Using the Bambi daemon at %s (model %s).", self.client.url, health.get("model"))
+            return health
+        except Exception as e:
+            logger.warning("The Bambi daemon at %s is not reachable: %s", self.client.url, e)
+            return None
+
+    def _notify(self, what, call, *args):
+        """Sends a precapture hint in the background; failures are logged, never raised."""
+        def send():
+            try:
+                call(*args)
+            except Exception as e:
+                logger.warning("Could not %s in the daemon: %s", what, e)
+
+        if self._notifier is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._notifier = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bambi-precapture")
+        self._notifier.submit(send)
+
+    def begin_precapture(self, capture_mode: str = None, monitor: int = None, region: dict = None):
+        self._notify("start a speculative capture", self.client.begin_precapture, capture_mode, monitor, region)
+
+    def discard_precapture(self):
+        self._notify("discard the speculative capture", self.client.discard_precapture)
+
+    def new_session(self):
+        return RemoteSession()
+
+    def close_session(self, session):
+        if session.id is not None:
+            try:
+                self.client.close_session(session.id)
+            except Exception as e:
+                logger.debug("Could not close daemon session %s: %s", session.id, e)
+        session.can_follow_up = False
+
+    @staticmethod
+    def _analyze_body(query, keep_screenshot, screenshot_path, capture_mode, monitor, region, session, template):
+        return {"query": query, "keep": keep_screenshot, "screenshot": screenshot_path, "mode": capture_mode,
+                "monitor": monitor, "region": region, "template": template, "session": session is not None}
+
+    def analyze_screen(self, query: str = None, keep_screenshot: bool = False, screenshot_path: str = None, on_token=None,
+                       capture_mode: str = None, monitor: int = None, region: dict = None, session=None,
+                       template: str = None) -> str | None:
+        """Same as LLMAssistant.analyze_screen, run by the daemon."""
+        body = self._analyze_body(query, keep_screenshot, screenshot_path, capture_mode, monitor, region,
+                                  session, template)
+        response, final = self.client.analyze(body, on_token)
+        if session is not None:
+            session.update(final)
+        return response
+
+    async def aanalyze_screen(self, query: str = None, keep_screenshot: bool = False, screenshot_path: str = None, on_token=None,
+                       capture_mode: str = None, monitor: int = None, region: dict = None, session=None,
+                       template: str = None) -> str | None:
+        """asyncio variant of analyze_screen; cancelling it closes the connection and aborts the daemon's request."""
+        body = self._analyze_body(query, keep_screenshot, screenshot_path, capture_mode, monitor, region,
+                                  session, template)
+        response, final = await self.client.aanalyze(body, on_token)
+        if session is not None:
+            session.update(final)
+        return response
+
+    def ask_followup(self, session, question: str, on_token=None) -> str:
+        response, final = self.client.followup(session.id, question, on_token)
+        session.update(final)
+        return response
+
+    async def aask_followup(self, session, question: str, on_token=None) -> str:
+        response, final = await self.client.afollowup(session.id, question, on_token)
+        session.update(final)
+        return response
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ask the running Bambi daemon about your screen.")
+    parser.add_argument("query", nargs="?", default=None, help="Question about the screen (default: describe it).")
+    parser.add_argument("--mode", choices=CAPTURE_MODES, default=None, help="Capture mode (default: CAPTURE_MODE).")
+    parser.add_argument("--monitor", type=int, default=None, help="Monitor index for --mode monitor (1 = primary).")
+    parser.add_argument("--region", default=None, help="left,top,width,height for --mode region.")
+    parser.add_argument("--screenshot", default=None, help="Analyze an existing screenshot file instead of capturing.")
+    parser.add_argument("--template", choices=PROMPTS.names(), default=None,
+                        help="Prompt template (default: describe, or ask with a query).")
+    parser.add_argument("--keep", action="store_true",
+                        help="Record the screenshot and the answer in the daemon's history (see src.cli.history).")
+    parser.add_argument("--session", type=int, default=None,
+                        help="Ask the query as a follow-up in this session (printed after every answer).")
+    parser.add_argument("--health", action="store_true", help="Print the daemon's status and exit.")
+    parser.add_argument("--url", default=None, help="Daemon URL (default: from DAEMON_HOST and DAEMON_PORT).")
+    args = parser.parse_args()
+    logging.basicConfig(level=AppConfig.LOG_LEVEL.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    client = DaemonClient(args.url)
+    if args.health:
+        import json
+        print(json.dumps(client.health(), indent=2))
+        sys.exit(0)
+
+    def print_chunk(chunk):
+        sys.stdout.write(chunk)
+        sys.stdout.flush()
+
+    try:
+        if args.session is not None:
+            if not args.query:
+                parser.error("a follow-up needs a query")
+            _, final = client.followup(args.session, args.query, on_token=print_chunk)
+        else:
+            _, final = client.analyze({"query": args.query, "mode": args.mode, "monitor": args.monitor,
+                                       "region": args.region, "screenshot": args.screenshot, "keep": args.keep,
+                                       "template": args.template, "session": True}, on_token=print_chunk)
+    except OllamaConnectionError:
+        print(f"The Bambi daemon is not running at {client.url}; start it with: python -m src.cli.daemon",
+              file=sys.stderr)
+        sys.exit(1)
+    except Exception as e:
+        print(f"\nError: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        client.close()
+    print()
+    if final.get("can_follow_up"):
+        print(f"(follow up with --session {final['session']})", file=sys.stderr)
@@ -0,0 +1,336 @@
+import argparse
+import hmac
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.cli.main import LLMAssistant
+from src.core.config import AppConfig
+from src.core.prompts import PROMPTS
+from src.core.screenshot_capture import CAPTURE_MODES, parse_region
+from src.core.session import SESSION_EXPIRED_MESSAGE
+from src.core.tracing import setup_instrumentation, tracer
+
+logger = logging.getLogger(__name__)
+
+
+class DaemonRequestError(Exception):
+    """A request the daemon rejects; status is the HTTP status of the answer."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class _DaemonHandler(BaseHTTPRequestHandler):
+    """
+    Serves the daemon's API. Answers follow Ollama's conventions: JSON objects, streamed as
+    newline-delimited JSON where every line carries a "response" fragment and the last one
+    "done": true, and errors as {"error": message}.
+    """
+
+    # Keeps client connections alive between requests and allows chunked streaming
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _handle(self, method):
+        daemon = self.server.analysis_daemon
+        self._streaming = False
+        try:
+            # The body is read even for rejected requests, so the kept-alive connection stays usable
+            body = self._read_json() if method == "POST" else {}
+            if not daemon.authorized(self.headers.get("Authorization")):
+                raise DaemonRequestError("Missing or wrong daemon token.", 401)
+            route = daemon.routes.get((method, self.path))
+            if route is None:
+                raise DaemonRequestError(f"Unknown endpoint: {method} {self.path}", 404)
+            route(body, self)
+        except DaemonRequestError as e:
+            self._send_error(str(e), e.status)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away (e.g. a newer hotkey press cancelled it); the analysis was aborted
+            logger.info("Client disconnected during %s", self.path)
+            self.close_connection = True
+        except Exception as e:
+            logger.exception("Daemon request %s failed", self.path)
+            self._send_error(str(e), 500)
+
+    def _send_error(self, message, status):
+        """Answers with an error status, or ends a stream that already started with an error line."""
+        if self._streaming:
+            self.send_line({"error": message, "done": True})
+            self.end_stream()
+        else:
+            self.send_json({"error": message}, status)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length)) if length else {}
+        except ValueError:
+            raise DaemonRequestError("The request body is not valid JSON.") from None
+        if not isinstance(body, dict):
+            raise DaemonRequestError("The request body must be a JSON object.")
+        return body
+
+    def send_json(self, obj, status=200):
+        data = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_line(self, obj):
+        """Sends one NDJSON line of a streamed answer, starting the stream on the first one."""
+        if not self._streaming:
+            self._streaming = True
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+        data = json.dumps(obj).encode("utf-8") + b"\n"
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+    def end_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+class _DaemonServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, daemon):
+        self.analysis_daemon = daemon
+        super().__init__(address, _DaemonHandler)
+
+
+class AnalysisDaemon:
+    """
+    Long-running service around one LLMAssistant, shared by the hotkey UI and CLI clients.
+
+    Every client used to build its own capture tool and LLM interface and paid the cold
+    start (imports, connection setup, model load) again. The daemon pays it once per
+    login: it keeps the model warm, the Ollama connections pooled and the response cache,
+    sessions and speculative captures in one place. Each client connection is served on
+    its own thread; analyses beyond max_concurrent wait for a slot. Answers stream back as
+    they are generated, and a client that disconnects aborts its Ollama request.
+
+    The daemon listens on the loopback interface only. Since it can capture the screen,
+    clients also have to present the token it writes to token_file, which only the user
+    can read. The daemon has to run inside the user's graphical session to capture it.
+    """
+
+    def __init__(self, assistant=None, host=None, port=None, token_file=None, max_concurrent=None):
+        """
+        Args:
+            assistant (LLMAssistant, optional): The shared pipeline. Defaults to one built from AppConfig.
+            host (str, optional): Address to listen on. Defaults to DAEMON_HOST.
+            port (int, optional): Port to listen on (0 = any free port). Defaults to DAEMON_PORT.
+            token_file (str, optional): Where the client token is written ("" = no token).
+                Defaults to DAEMON_TOKEN_FILE.
+            max_concurrent (int, optional): Analyses run at the same time. Defaults to DAEMON_MAX_CONCURRENT.
+        """
+        self.assistant = assistant or LLMAssistant()
+        self.host = host or AppConfig.DAEMON_HOST
+        self.port = AppConfig.DAEMON_PORT if port is None else port
+        self.token_file = AppConfig.DAEMON_TOKEN_FILE if token_file is None else token_file
+        self.token = None
+        max_concurrent = max_concurrent or AppConfig.DAEMON_MAX_CONCURRENT
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrent))
+        self._active = 0
+        self._served = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self.started_at = None
+        self.routes = {
+            ("GET", "/api/health"): self._health,
+            ("POST", "/api/analyze"): self._analyze,
+            ("POST", "/api/followup"): self._followup,
+            ("POST", "/api/close_session"): self._close_session,
+            ("POST", "/api/precapture"): self._precapture,
+            ("POST", "/api/discard_precapture"): self._discard_precapture,
+        }
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self, warm_up=True):
+        """Starts serving on a background thread and returns the daemon's URL."""
+        self._server = _DaemonServer((self.host, self.port), self)
+        self._write_token()
+        self.started_at = time.monotonic()
+        threading.Thread(target=self._server.serve_forever, name="bambi-daemon", daemon=True).start()
+        if warm_up:
+            threading.Thread(target=self.assistant.warm_up, name="bambi-daemon-warmup", daemon=True).start()
+        logger.info("Bambi daemon listening at %s", self.url)
+        return self.url
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self.token is not None and self.token_file:
+            try:
+                os.remove(self.token_file)
+            except FileNotFoundError:
+                pass
+        self.assistant.close()
+
+    def _write_token(self):
+        if not self.token_file:
+            return
+        self.token = secrets.token_urlsafe(32)
+        directory = os.path.dirname(self.token_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(self.token_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(self.token)
+
+    def authorized(self, header):
+        if self.token is None:
+            return True
+        return hmac.compare_digest(header or "", f"Bearer {self.token}")
+
+    def _run(self, handler, stream, call):
+        """
+        Runs one analysis in a concurrency slot. call(on_token) returns (response, extra), where
+        extra holds the fields of the final message besides the response.
+        """
+        with self._slots:
+            with self._lock:
+                self._active += 1
+                self._served += 1
+            try:
+                if not stream:
+                    response, extra = call(None)
+                    handler.send_json(dict(extra, response=response, done=True))
+                    return
+                response, extra = call(lambda chunk: handler.send_line({"response": chunk, "done": False}))
+                handler.send_line(dict(extra, response="", done=True))
+                handler.end_stream()
+            finally:
+                with self._lock:
+                    self._active -= 1
+
+    def _health(self, body, handler):
+        with self._lock:
+            active, served = self._active, self._served
+        llm = self.assistant.llm_interface
+        handler.send_json({
+            "status": "ok",
+            "pid": os.getpid(),
+            "model": llm.model,
+            "uptime": time.monotonic() - self.started_at,
+            "active": active,
+            "served": served,
+            "sessions": self.assistant.sessions.stats(),
+            "response_cache": llm.response_cache.stats() if llm.response_cache is not None else None,
+        })
+
+    @staticmethod
+    def _capture_options(body):
+        mode = body.get("mode")
+        if mode is not None and mode not in CAPTURE_MODES:
+            raise DaemonRequestError(f"Unknown capture mode: {mode}")
+        region = body.get("region")
+        if isinstance(region, str):
+            try:
+                region = parse_region(region)
+            except ValueError:
+                raise DaemonRequestError(f"Invalid region: {region}") from None
+        return {"capture_mode": mode, "monitor": body.get("monitor"), "region": region}
+
+    def _analyze(self, body, handler):
+        template = body.get("template")
+        if template is not None and template not in PROMPTS:
+            raise DaemonRequestError(f"Unknown prompt template: {template}")
+        options = self._capture_options(body)
+        # "session": true opens a follow-up session; its id comes back in the final message
+        session = None
+        if body.get("session") is True:
+            session = self.assistant.new_session()
+
+        def call(on_token):
+            with tracer.span("daemon_analyze"):
+                response = self.assistant.analyze_screen(
+                    body.get("query"), keep_screenshot=bool(body.get("keep")), screenshot_path=body.get("screenshot"),
+                    on_token=on_token, session=session, template=template, **options)
+            if response is None:
+                raise DaemonRequestError("The screen could not be captured.", 500)
+            return response, self._session_fields(session)
+
+        self._run(handler, body.get("stream", True), call)
+
+    def _followup(self, body, handler):
+        session = self.assistant.sessions.get(body.get("session"))
+        question = body.get("question")
+        if not question:
+            raise DaemonRequestError("A follow-up needs a question.")
+
+        def call(on_token):
+            if session is None:
+                if on_token is not None:
+                    on_token(SESSION_EXPIRED_MESSAGE)
+                return SESSION_EXPIRED_MESSAGE, self._session_fields(None)
+            with tracer.span("daemon_followup"):
+                response = self.assistant.ask_followup(session, question, on_token=on_token)
+            return response, self._session_fields(session)
+
+        self._run(handler, body.get("stream", True), call)
+
+    @staticmethod
+    def _session_fields(session):
+        if session is None:
+            return {"session": None, "can_follow_up": False}
+        return {"session": session.id, "can_follow_up": session.can_follow_up}
+
+    def _close_session(self, body, handler):
+        session = self.assistant.sessions.get(body.get("session"))
+        if session is not None:
+            self.assistant.close_session(session)
+        handler.send_json({"status": "ok"})
+
+    def _precapture(self, body, handler):
+        self.assistant.begin_precapture(**self._capture_options(body))
+        handler.send_json({"status": "ok"})
+
+    def _discard_precapture(self, body, handler):
+        self.assistant.discard_precapture()
+        handler.send_json({"status": "ok"})
+
+    def serve_forever(self):
+        """Runs the daemon until interrupted (Ctrl+C)."""
+        self.start()
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            logger.info("Stopping the Bambi daemon.")
+        finally:
+            self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve screen analyses to the hotkey UI and CLI clients.")
+    parser.add_argument("--host", default=None, help="Address to listen on (default: DAEMON_HOST).")
+    parser.add_argument("--port", type=int, default=None, help="Port to listen on (default: DAEMON_PORT).")
+    parser.add_argument("--max-concurrent", type=int, default=None,
+                        help="Analyses run at the same time (default: DAEMON_MAX_CONCURRENT).")
+    args = parser.parse_args()
+    setup_instrumentation()
+
+    AnalysisDaemon(host=args.host, port=args.port, max_concurrent=args.max_concurrent).serve_forever()
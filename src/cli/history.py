@@ -0,0 +1,84 @@
+import argparse
+import logging
+import sys
+import time
+from src.core.prompts import PROMPTS
+from src.core.tracing import setup_instrumentation
+
+logger = logging.getLogger(__name__)
+
+
+def write(text):
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+
+def format_entry(entry, width=80):
+    when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry.created_at))
+    question = entry.query or f"[{entry.template or 'describe'}]"
+    answer = " ".join(entry.response.split())
+    line = f"{entry.id:>5}  {when}  {question}: {answer}"
+    return line if len(line) <= width else line[:width - 3] + "..."
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List, show and re-run the analyses of kept screenshots.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    listing = commands.add_parser("list", help="List the latest analyses, newest first.")
+    listing.add_argument("--limit", type=int, default=20)
+    listing.add_argument("--search", default=None, help="Only analyses whose question or answer contains this text.")
+    listing.add_argument("--similar", type=int, default=None, metavar="ID",
+                         help="Only analyses of screens near-identical to this entry's.")
+    show = commands.add_parser("show", help="Print an analysis and the path of its screenshot.")
+    show.add_argument("id", type=int)
+    rerun = commands.add_parser("rerun", help="Analyze the screenshot of an entry again.")
+    rerun.add_argument("id", type=int)
+    rerun.add_argument("query", nargs="?", default=None, help="New question (default: the entry's question).")
+    rerun.add_argument("--template", choices=PROMPTS.names(), default=None,
+                       help="Prompt template (default: the entry's template).")
+    commands.add_parser("stats", help="Print the size of the history.")
+    args = parser.parse_args()
+    setup_instrumentation()
+
+    if args.command == "rerun":
+        # Only re-running needs the model; the other commands just read the index
+        from src.cli.main import LLMAssistant
+        assistant = LLMAssistant()
+        try:
+            answer = assistant.rerun(args.id, args.query, on_token=write, template=args.template)
+            write("\n")
+        finally:
+            assistant.close()
+        sys.exit(0 if answer is not None else 1)
+
+    from src.core.config import AppConfig
+    from src.core.history import ScreenshotHistory
+    history = ScreenshotHistory(AppConfig.HISTORY_DIR, max_bytes=int(AppConfig.HISTORY_MAX_MB * 1024 * 1024),
+                                image_format=AppConfig.HISTORY_FORMAT, quality=AppConfig.HISTORY_QUALITY)
+    try:
+        if args.command == "list":
+            similar_to = None
+            if args.similar is not None:
+                similar_to = history.get(args.similar)
+                if similar_to is None or similar_to.perceptual is None:
+                    logger.error("History entry %s has no stored screenshot to compare with.", args.similar)
+                    sys.exit(1)
+            for entry in history.recent(args.limit, search=args.search, similar_to=similar_to):
+                print(format_entry(entry))
+        elif args.command == "show":
+            entry = history.get(args.id)
+            if entry is None:
+                logger.error("No history entry %s.", args.id)
+                sys.exit(1)
+            print(f"#{entry.id}  {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry.created_at))}  "
+                  f"model {entry.model}, template {entry.template or 'default'}")
+            print(f"Question: {entry.query or '-'}")
+            print(f"Screenshot: {entry.path or 'not stored'}")
+            print()
+            print(entry.response)
+        else:
+            stats = history.stats()
+            print(f"{stats['analyses']} analyses of {stats['frames']} screenshots, "
+                  f"{stats['bytes'] / 1e6:.1f} MB of {AppConfig.HISTORY_MAX_MB:g} MB")
+    finally:
+        history.close()
@@ -1,136 +1,118 @@
+import argparse
+import functools
+import logging
 import threading
 from pynput import keyboard
-import subprocess # subprocess is imported but not used in the provided snippet. If needed, ensure its usage.
-from collections import deque
 
 # Assuming these are available from your project structure
 from src.cli.main import LLMAssistant
 from src.cli.markdown_window import MarkdownWindow
+from src.core.config import AppConfig
+from src.core.hotkeys import HotkeyEngine, parse_bindings
+from src.core.scheduler import AnalysisScheduler
+from src.core.tracing import setup_instrumentation
 
-from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget,
-                             QVBoxLayout, QTextBrowser, QLabel) # Added QLabel
-from PyQt6.QtCore import QObject, pyqtSignal, QMetaObject, Qt
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtCore import QObject, pyqtSignal
 import sys
-import markdown # For robust Markdown to HTML conversion if needed
 
 
-# --- Configuration ---
-# Represents CTRL + ALT + K. Ensure these match pynput's string representation.
-HOTKEY_SEQUENCE = ['ctrl', 'alt', 'k']
-# Convert to a set for faster lookup of pressed keys, but maintain order for sequence
-HOTKEY_SEQUENCE_SET = set(HOTKEY_SEQUENCE)
-# Adjust max_len based on your sequence length and potential for false positives
-KEY_PRESS_HISTORY_MAX_LEN = len(HOTKEY_SEQUENCE) * 2
-
-# --- Global Variables ---
-# Use a deque for efficient appending and popping from both ends,
-# useful for maintaining a history of key presses.
-key_press_history = deque(maxlen=KEY_PRESS_HISTORY_MAX_LEN)
-current_pressed_keys = set()
-script_running_lock = threading.Lock() # To prevent multiple script executions
+logger = logging.getLogger(__name__)
 
 class HotKeyListener(QObject): # Inherit from QObject to enable Qt signals
 
     # Define a custom signal to update the Markdown window from the listener thread.
-    hotkey_triggered = pyqtSignal()
-    # New signal to send the analysis result back to the main thread
-    analysis_complete = pyqtSignal(str) # Signal to carry the response string
-
-    def __init__(self, assistant_instance, markdown_viewer_instance):
+    hotkey_triggered = pyqtSignal(object) # The HotkeyBinding that fired
+    # Signals from the scheduler worker; each carries the id of the job it belongs to,
+    # so output of a superseded job can be ignored.
+    analysis_started = pyqtSignal(int)
+    followup_started = pyqtSignal(int, str) # Job id and the follow-up question
+    analysis_complete = pyqtSignal(int, str) # Job id and the response string
+    analysis_chunk = pyqtSignal(int, str) # Job id and one streamed chunk of the response
+
+    def __init__(self, assistant_instance, markdown_viewer_instance, scheduler=None, bindings=None):
         """
         Initializes the HotKeyListener.
 
         Args:
             assistant_instance: An instance of LLMAssistant.
             markdown_viewer_instance: An instance of MarkdownWindow.
+            scheduler (AnalysisScheduler, optional): Runs the analyses. Defaults to one built from AppConfig.
+            bindings (list[HotkeyBinding], optional): Hotkeys to listen for. Defaults to HOTKEYS.
         """
         super().__init__()
         self.assistant = assistant_instance
         self.markdown_viewer = markdown_viewer_instance
+        self.scheduler = scheduler or AnalysisScheduler(policy=AppConfig.SCHEDULER_POLICY,
+                                                        max_queue=AppConfig.SCHEDULER_MAX_QUEUE,
+                                                        coalesce_window=AppConfig.SCHEDULER_COALESCE_WINDOW)
+        self.hotkeys = HotkeyEngine(bindings or parse_bindings(AppConfig.HOTKEYS))
+        self._active_job_id = None # Job whose output is currently shown
+        self._chord_completed = False # Whether the hotkey fired since the prefix was pressed
+        self._session = None # Follow-up session of the latest analyzed screen
 
         # Connect the custom hotkey signal to the main script execution slot
         self.hotkey_triggered.connect(self._execute_script_on_main_thread)
-        # Connect the analysis complete signal to the slot that updates the UI
+        # Connect the analysis signals to the slots that update the UI
+        self.analysis_started.connect(self._begin_response)
+        self.followup_started.connect(self._begin_followup)
+        # Follow-up questions typed into the window continue the session of the latest screen
+        self.markdown_viewer.followup_submitted.connect(self._submit_followup)
         self.analysis_complete.connect(self._display_response_and_hide_loading)
+        # Connect the streamed chunk signal to the slot that appends to the UI
+        self.analysis_chunk.connect(self._append_response_chunk)
 
 
     def on_press(self, key):
         """
         Callback function for when a key is pressed.
-        Adds the key to current_pressed_keys and key_press_history, then checks for hotkey.
+        Feeds the key to the hotkey engine; starts a speculative capture when a chord is one
+        key away from completing and triggers the analysis when it completes.
         """
-        key_name = None
-
         try:
-            # Handle character keys (like 'a', 'b', '1')
-            if hasattr(key, 'char') and key.char is not None:
-                key_name = key.char
-            # Handle special keys (like 'ctrl', 'alt', 'esc')
-            else:
-                key_name = str(key).replace("Key.", "")
-
-            if key_name: # Ensure a valid key name was obtained
-                current_pressed_keys.add(key_name)
-                key_press_history.append(key_name)
-                # print(f"Pressed: {key_name}, Current: {current_pressed_keys}, History: {list(key_press_history)}")
-                self.check_for_hotkey_sequence()
+            was_armed = self.hotkeys.armed
+            binding = self.hotkeys.press(key)
+            if binding is not None:
+                logger.info("Hotkey detected: %s", binding)
+                self._chord_completed = True # The analysis job takes the speculative capture
+                # Emit the signal to trigger the script execution on the main thread.
+                self.hotkey_triggered.emit(binding)
+            elif self.hotkeys.armed is not None and self.hotkeys.armed is not was_armed:
+                self._chord_completed = False
+                self.assistant.begin_precapture(capture_mode=self.hotkeys.armed.capture_mode)
 
         except Exception as e:
             # Catch any unexpected errors during key processing
-            print(f"Error in on_press for key {key}: {e}")
+            logger.error("Error in on_press for key %s: %s", key, e)
 
     def on_release(self, key):
         """
         Callback function for when a key is released.
-        Removes the key from current_pressed_keys. Stops the listener if 'Esc' is released.
+        Releases the key in the hotkey engine (normalized the same way as on press, so no
+        modifier stays stuck). Stops the listener if 'Esc' is released.
         """
         try:
-            key_name = str(key).replace("Key.", "")
-            if key_name in current_pressed_keys:
-                current_pressed_keys.remove(key_name)
-            # print(f"Released: {key_name}, Current: {current_pressed_keys}")
+            was_armed = self.hotkeys.armed
+            self.hotkeys.release(key)
+            if was_armed is not None and self.hotkeys.armed is None and not self._chord_completed:
+                # The prefix was let go without completing the chord
+                self.assistant.discard_precapture()
             if key == keyboard.Key.esc:
-                print("Escape key released. Stopping listener.")
+                logger.info("Escape key released. Stopping listener.")
                 return False  # Return False to stop the pynput listener
 
         except Exception as e:
-            print(f"Error in on_release for key {key}: {e}")
-
+            logger.error("Error in on_release for key %s: %s", key, e)
 
-    def check_for_hotkey_sequence(self):
-        """
-        Checks if the current set of pressed keys matches the hotkey sequence,
-        and if the sequence has been pressed in the correct order recently.
-        """
-        # First, quickly check if all required hotkey modifier/character keys are currently held down.
-        if not HOTKEY_SEQUENCE_SET.issubset(current_pressed_keys):
-            return
-
-        # Then, check if the specific sequence appeared in the history in the correct order.
-        history_list = list(key_press_history)
-        # Iterate backwards through history_list to find the most recent match efficiently.
-        for i in range(len(history_list) - len(HOTKEY_SEQUENCE) + 1):
-            if history_list[i : i + len(HOTKEY_SEQUENCE)] == HOTKEY_SEQUENCE:
-                print(f"Hotkey sequence detected: {HOTKEY_SEQUENCE}")
-                # Emit the signal to trigger the script execution on the main thread.
-                self.hotkey_triggered.emit()
-                # Clear history after execution to prevent immediate re-triggering
-                # and to avoid multiple triggers for a single long press.
-                key_press_history.clear()
-                return
-
-    def _execute_script_on_main_thread(self):
+    def _execute_script_on_main_thread(self, binding):
         """
         This method is a slot connected to hotkey_triggered signal.
-        It runs on the main GUI thread and safely prepares the UI for analysis.
+        It runs on the main GUI thread, prepares the UI and hands the analysis to the scheduler.
+        Presses made while an analysis is running are no longer dropped: depending on the
+        scheduler policy the newer capture supersedes the running one or waits in the queue.
         """
-        # Use a lock to ensure only one script execution runs at a time.
-        if not script_running_lock.acquire(blocking=False):
-            print("Script already running, ignoring hotkey.")
-            return
-
         try:
-            print("Hotkey script triggered. Preparing UI for analysis...")
+            logger.info("Hotkey script triggered. Preparing UI for analysis...")
             # Bring the window to the front and activate it
             self.markdown_viewer.showNormal() # Restore from minimized state if applicable
             self.markdown_viewer.activateWindow() # Bring to front and give focus
@@ -142,76 +124,153 @@ class HotKeyListener(QObject): # Inherit from QObject to enable Qt signals
             # Force the GUI to process events (like window show/paint events)
             QApplication.processEvents()
 
-            # Start the potentially long-running analyze_screen in a new thread
-            analysis_thread = threading.Thread(target=self._run_analysis_in_background, daemon=True)
-            analysis_thread.start()
+            # Follow-ups are about the latest screen only, so the previous session is freed
+            if self._session is not None:
+                self.assistant.close_session(self._session)
+            self._session = self.assistant.new_session()
+            self.markdown_viewer.set_followup_enabled(False)
+
+            job_id = self.scheduler.submit(functools.partial(self._run_analysis_job, binding=binding,
+                                                             session=self._session))
+            logger.info("Scheduled analysis job %s: %s", job_id, self.scheduler.stats())
+            if self.assistant.precapture is not None:
+                logger.info("Speculative capture: %s", self.assistant.precapture.stats())
 
         except Exception as e:
-            print(f"An error occurred while preparing script execution: {e}")
+            logger.error("An error occurred while preparing script execution: %s", e)
             self.markdown_viewer.hide_loading() # Ensure loading is hidden even on error
-            script_running_lock.release() # Release lock on error
 
-    def _run_analysis_in_background(self):
+    async def _run_analysis_job(self, job_id, binding, session):
         """
-        This method runs in a separate thread to perform the screen analysis.
-        It emits a signal upon completion.
+        Runs on the scheduler's worker thread to perform the screen analysis.
+        It emits signals as the response streams in and upon completion.
+        Cancellation (a newer capture superseding this one) propagates to the scheduler.
         """
+        self.analysis_started.emit(job_id)
         try:
-            print("Starting screen analysis in background thread...")
-            response = self.assistant.analyze_screen()
-            print("Screen analysis complete in background thread.")
+            logger.info("Starting screen analysis for job %s...", job_id)
+            response = await self.assistant.aanalyze_screen(
+                capture_mode=binding.capture_mode, template=binding.preset, session=session,
+                on_token=lambda chunk: self.analysis_chunk.emit(job_id, chunk))
+            logger.info("Screen analysis complete for job %s.", job_id)
             # Emit the signal with the response, which will be handled on the main thread
-            self.analysis_complete.emit(response)
+            self.analysis_complete.emit(job_id, response or "Error: the screen could not be analyzed.")
         except Exception as e:
-            print(f"An error occurred during background analysis: {e}")
-            # Consider emitting an error signal here if you need to handle errors in UI
-            self.analysis_complete.emit(f"Error: {e}") # Send error message to UI
-        finally:
-            script_running_lock.release() # Ensure the lock is always released
+            logger.error("An error occurred during background analysis: %s", e)
+            self.analysis_complete.emit(job_id, f"Error: {e}") # Send error message to UI
 
-    def _display_response_and_hide_loading(self, response):
+    def _submit_followup(self, question):
+        """
+        This slot receives a follow-up question from the window and schedules it. The answer
+        reuses the session of the latest screen; no new screenshot is taken.
+        """
+        if self._session is None:
+            return
+        self.markdown_viewer.set_followup_enabled(False)
+        job_id = self.scheduler.submit(functools.partial(self._run_followup_job, session=self._session,
+                                                         question=question))
+        logger.info("Scheduled follow-up job %s in %s", job_id, self._session)
+
+    async def _run_followup_job(self, job_id, session, question):
+        """Runs on the scheduler's worker thread and streams the follow-up answer like an analysis."""
+        self.followup_started.emit(job_id, question)
+        try:
+            response = await self.assistant.aask_followup(
+                session, question, on_token=lambda chunk: self.analysis_chunk.emit(job_id, chunk))
+            self.analysis_complete.emit(job_id, response)
+        except Exception as e:
+            logger.error("An error occurred while answering the follow-up: %s", e)
+            self.analysis_complete.emit(job_id, f"Error: {e}")
+
+    def _begin_followup(self, job_id, question):
+        """
+        This slot runs when the scheduler starts a follow-up job; the question and its answer
+        are added below the conversation so far.
+        """
+        self._active_job_id = job_id
+        self.markdown_viewer.begin_stream(question=question)
+        self.markdown_viewer.show_loading(keep_text=True)
+
+    def _begin_response(self, job_id):
+        """
+        This slot runs when the scheduler starts a job; from now on only its output is shown.
+        """
+        self._active_job_id = job_id
+        self.markdown_viewer.show_loading()
+        self.markdown_viewer.begin_stream() # Reset the streamed response buffer
+
+    def _append_response_chunk(self, job_id, chunk):
+        """
+        This slot receives streamed response chunks from the background thread
+        and appends them to the window on the main thread.
+        """
+        if job_id == self._active_job_id:
+            self.markdown_viewer.append_markdown(chunk)
+
+    def _display_response_and_hide_loading(self, job_id, response):
         """
         This slot receives the analysis result from the background thread
         and updates the UI on the main thread.
         """
-        print("Displaying response and hiding loading indicator.")
-        self.markdown_viewer.display_markdown(response) # Display the markdown content
+        if job_id != self._active_job_id:
+            return
+        logger.debug("Displaying response and hiding loading indicator.")
+        self.markdown_viewer.end_stream(response) # Finish rendering the streamed markdown content
         self.markdown_viewer.hide_loading() # Hide the loading indicator
+        self.markdown_viewer.set_followup_enabled(self._session is not None and self._session.can_follow_up)
 
     def run_listener_thread(self):
         """
         Starts the pynput keyboard listener in a separate thread.
         This method is designed to be the target for a threading.Thread.
         """
-        print(f"Starting hotkey listener thread. Listening for: {HOTKEY_SEQUENCE}")
-        print("Press 'Esc' to exit the listener.")
+        logger.info("Starting hotkey listener thread. Listening for: %s", self.hotkeys.bindings)
+        logger.info("Press 'Esc' to exit the listener.")
 
         listener = keyboard.Listener(on_press=self.on_press, on_release=self.on_release)
         listener.start() # Start the listener thread
         listener.join()  # Block this thread until the listener stops (e.g., by 'Esc')
-        print("Hotkey listener thread stopped.")
+        logger.info("Hotkey listener thread stopped.")
 
 
 if __name__ == "__main__":
     # --- Main Application Setup ---
+    # 0. Configure logging and (optional) per-stage tracing from the environment.
+    setup_instrumentation()
+
+    parser = argparse.ArgumentParser(description="Analyze the screen when a hotkey is pressed.")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Run the analyses in the Bambi daemon (python -m src.cli.daemon) instead of in this process.")
+    args, qt_args = parser.parse_known_args()
+
     # 1. Create the QApplication instance FIRST on the main thread.
-    app = QApplication(sys.argv)
+    app = QApplication(sys.argv[:1] + qt_args)
 
     # 2. Instantiate your LLMAssistant and MarkdownWindow.
-    # These will be managed by the QApplication's event loop.
-    assistant_instance = LLMAssistant()
+    # These will be managed by the QApplication's event loop. With --daemon the assistant is
+    # a client of the daemon, which holds the warm model, caches and sessions for all clients.
+    if args.daemon:
+        from src.cli.client import RemoteAssistant
+        assistant_instance = RemoteAssistant()
+    else:
+        assistant_instance = LLMAssistant()
     markdown_viewer_instance = MarkdownWindow(title="Bambi")
 
     # 3. Create the HotKeyListener instance, passing it references to the assistant
     # and markdown viewer so it can interact with them safely via signals.
     hotkey_listener_obj = HotKeyListener(assistant_instance, markdown_viewer_instance)
 
-    # 4. Start the pynput keyboard listener in a separate Python thread.
+    # 4. Warm up the model in the background so the first hotkey press doesn't pay the load time
+    # (with --daemon, check that the daemon is reachable).
+    warmup_thread = threading.Thread(target=assistant_instance.warm_up, daemon=True)
+    warmup_thread.start()
+
+    # 5. Start the pynput keyboard listener in a separate Python thread.
     # Set daemon=True so the thread automatically exits when the main application exits.
     listener_thread = threading.Thread(target=hotkey_listener_obj.run_listener_thread, daemon=True)
     listener_thread.start()
 
-    # 5. Start the PyQt application's event loop on the main thread.
+    # 6. Start the PyQt application's event loop on the main thread.
     # This keeps the GUI responsive and processes all Qt events and signals.
     # The application will exit when the last window is closed or app.quit() is called.
     sys.exit(app.exec())
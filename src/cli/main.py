@@ -1,57 +1,335 @@
 import os
 import argparse
-from src.core.screenshot_capture import ScreenshotCapture
+import logging
+import threading
+import time
+from src.core.screenshot_capture import CAPTURE_MODES, ScreenshotCapture, parse_region
 from src.core.llm_interface import LLMInterface
-from src.core.config import AppConfig # Assuming this is still used for configuration, though not explicitly in the main logic shown
+from src.core.prompts import MIN_ANSWER_TOKENS, PROMPTS
+from src.core.config import AppConfig
+from src.core.response_cache import frame_digest
+from src.core.session import SESSION_EXPIRED_MESSAGE, SessionStore
+from src.core.speculative import PrecapturedFrame, SpeculativeCapture
+from src.core.tracing import setup_instrumentation, tracer
+
+logger = logging.getLogger(__name__)
 
 class LLMAssistant:
-    def __init__(self):
+    def __init__(self, screenshot_tool=None, llm_interface=None, speculative=None):
         """
         Initializes the LLMAssistant with necessary tools.
+
+        Args:
+            screenshot_tool (ScreenshotCapture, optional): Capture tool, e.g. one with a fake backend for headless runs. Defaults to the real screen.
+            llm_interface (LLMInterface, optional): LLM client. Defaults to one built from AppConfig.
+            speculative (bool, optional): Enables speculative pre-capture (see begin_precapture). Defaults to SPECULATIVE_CAPTURE.
+        """
+        self.screenshot_tool = screenshot_tool or ScreenshotCapture()
+        self.llm_interface = llm_interface or LLMInterface()
+        # Serializes captures: speculative, regular and watcher captures share the capture tool and its buffers
+        self._capture_lock = threading.Lock()
+        if speculative is None:
+            speculative = AppConfig.SPECULATIVE_CAPTURE
+        self.precapture = None
+        if speculative:
+            self.precapture = SpeculativeCapture(self._precapture_frame, max_age=AppConfig.SPECULATIVE_MAX_AGE)
+        # Open follow-up conversations, one per analyzed screen. A context is only kept while it
+        # leaves room for an answer in the model's context window.
+        max_context = AppConfig.SESSION_MAX_CONTEXT
+        if AppConfig.MODEL_CONTEXT_LENGTH:
+            max_context = min(max_context, AppConfig.MODEL_CONTEXT_LENGTH - MIN_ANSWER_TOKENS)
+        self.sessions = SessionStore(max_sessions=AppConfig.SESSION_MAX_SESSIONS, ttl=AppConfig.SESSION_TTL,
+                                     max_context=max_context, max_turns=AppConfig.SESSION_MAX_TURNS)
+        self._history = None
+
+    @property
+    def history(self):
+        """The ScreenshotHistory that kept screenshots and their analyses go to, opened on first use."""
+        if self._history is None:
+            from src.core.history import ScreenshotHistory
+            self._history = ScreenshotHistory(AppConfig.HISTORY_DIR, max_bytes=int(AppConfig.HISTORY_MAX_MB * 1024 * 1024),
+                                              image_format=AppConfig.HISTORY_FORMAT, quality=AppConfig.HISTORY_QUALITY)
+        return self._history
+
+    def warm_up(self, start_heartbeat: bool = True):
         """
-        self.screenshot_tool = ScreenshotCapture()
-        self.llm_interface = LLMInterface()
+        Loads the model ahead of the first hotkey press and keeps it resident.
+
+        Args:
+            start_heartbeat (bool, optional): Whether to re-warm the model in the background after idle eviction. Defaults to True.
 
-    def analyze_screen(self, query: str = None, keep_screenshot: bool = False, screenshot_path: str = None) -> str | None:
+        Returns:
+            WarmupReport: Availability, pull and load-time details.
+        """
+        return self.llm_interface.warm_up(start_heartbeat=start_heartbeat)
+
+    def begin_precapture(self, capture_mode: str = None, monitor: int = None, region: dict = None):
+        """
+        Starts capturing and preparing the screen in the background, ahead of an analysis
+        that is likely to follow (e.g. while the hotkey modifiers are held). The next
+        analyze_screen call with the same capture arguments uses the frame if it is fresh.
+        Does nothing unless speculative capture is enabled.
+        """
+        if self.precapture is not None:
+            self.precapture.begin(capture_mode, monitor, region)
+
+    def discard_precapture(self):
+        """Drops a pending speculative capture that will not be used."""
+        if self.precapture is not None:
+            self.precapture.discard()
+
+    def _precapture_frame(self, capture_mode, monitor, region):
+        """Captures, hashes and prepares a frame on the speculation thread."""
+        captured_at = time.monotonic()
+        image, image_hash = self._capture(capture_mode, monitor, region)
+        prepared = self.llm_interface.image_preparer.prepare(image)
+        return PrecapturedFrame(image, prepared, image_hash, captured_at)
+
+    def new_session(self):
+        """
+        Opens a follow-up session. Pass it to analyze_screen, then ask more questions about
+        the same screen with ask_followup; they reuse the model context instead of sending
+        the screenshot again.
+
+        Returns:
+            AnalysisSession: The new session. Sessions expire after SESSION_TTL idle seconds.
+        """
+        return self.sessions.create()
+
+    def close_session(self, session):
+        """Closes a follow-up session that will not be continued, freeing its screenshot and context."""
+        self.sessions.discard(session)
+
+    def analyze_screen(self, query: str = None, keep_screenshot: bool = False, screenshot_path: str = None, on_token=None,
+                       capture_mode: str = None, monitor: int = None, region: dict = None, session=None,
+                       template: str = None) -> str | None:
         """
         Captures a screenshot, analyzes it with an LLM, and returns the response.
 
         Args:
             query (str, optional): Your question about the current screen content. Defaults to None.
-            keep_screenshot (bool, optional): Whether to keep the screenshot file after processing. Defaults to False.
+            keep_screenshot (bool, optional): Whether to record the captured screenshot and the analysis in the history (see rerun). Defaults to False.
             screenshot_path (str, optional): Path to a pre-existing screenshot file. If provided, a new screenshot won't be taken. Defaults to None.
+            on_token (callable, optional): Streams the response, calling this with each text chunk as it arrives. Defaults to None.
+            capture_mode (str, optional): "monitor", "cursor", "region" or "all". Defaults to the capture tool's mode.
+            monitor (int, optional): Monitor index for the "monitor" mode (1 = primary). Defaults to None.
+            region (dict, optional): left/top/width/height rectangle for the "region" mode. Defaults to None.
+            session (AnalysisSession, optional): Session from new_session that follow-ups will continue. Defaults to None.
+            template (str, optional): Prompt template name, see PROMPTS. Defaults to "describe", or "ask" with a query.
 
         Returns:
             str | None: The LLM's response as a string, or None if an error occurred.
         """
-        screenshot_file = None
-        response = None
-        try:
-            if screenshot_path:
-                screenshot_file = screenshot_path
-                if not os.path.exists(screenshot_file):
-                    print(f"Error: Provided screenshot file not found at {screenshot_file}")
-                    return None
-                print(f"Using pre-existing screenshot: {screenshot_file}")
-            else:
-                print("Taking screenshot...")
-                screenshot_file = self.screenshot_tool.take_screenshot()
-                if not screenshot_file:
-                    print("Failed to take screenshot. Exiting.")
-                    return None
-
-            print("Sending to LLM for analysis...")
-            response = self.llm_interface.get_llm_response(screenshot_file, query)
-            print("\n--- LLM Response ---")
-            print(response)
-            print("--------------------")
+        with tracer.span("analyze_screen"):
+            image, image_hash, screenshot = self._acquire_image(keep_screenshot, screenshot_path, capture_mode,
+                                                                monitor, region)
+            if image is None:
+                return None
+
+            logger.info("Sending to LLM for analysis...")
+            response = self.llm_interface.get_llm_response(image, query, on_token=on_token, image_hash=image_hash,
+                                                           session=session, template=template)
+            logger.debug("LLM response: %s", response)
+            self._keep(screenshot, image_hash, query, response, template)
+
+        return response
+
+    async def aanalyze_screen(self, query: str = None, keep_screenshot: bool = False, screenshot_path: str = None, on_token=None,
+                       capture_mode: str = None, monitor: int = None, region: dict = None, session=None,
+                       template: str = None) -> str | None:
+        """
+        asyncio variant of analyze_screen. Capture runs in a worker thread and the request goes
+        through the async transport, so cancelling the awaiting task aborts the Ollama request.
+
+        Args:
+            Same as analyze_screen.
+
+        Returns:
+            str | None: The LLM's response as a string, or None if an error occurred.
+        """
+        import asyncio
+        with tracer.span("analyze_screen"):
+            image, image_hash, screenshot = await asyncio.to_thread(self._acquire_image, keep_screenshot,
+                                                                    screenshot_path, capture_mode, monitor, region)
+            if image is None:
+                return None
 
+            logger.info("Sending to LLM for analysis...")
+            response = await self.llm_interface.aget_llm_response(image, query, on_token=on_token,
+                                                                  image_hash=image_hash, session=session,
+                                                                  template=template)
+            self._keep(screenshot, image_hash, query, response, template)
             return response
 
-        finally:
-            if screenshot_file and not keep_screenshot and not screenshot_path:
-                try:
-                    os.remove(screenshot_file)
-                    print(f"Cleaned up temporary screenshot: {screenshot_file}")
-                except OSError as e:
-                    print(f"Error cleaning up screenshot {screenshot_file}: {e}")
\ No newline at end of file
+    def rerun(self, entry_id: int, query: str = None, on_token=None, template: str = None) -> str | None:
+        """
+        Analyzes the screenshot of a history entry again, without capturing the screen.
+
+        Args:
+            entry_id (int): Id of the HistoryEntry (see history.recent).
+            query (str, optional): A new question. Defaults to the entry's question.
+            on_token (callable, optional): Streams the response, calling this with each text chunk as it arrives. Defaults to None.
+            template (str, optional): Prompt template name. Defaults to the entry's template.
+
+        Returns:
+            str | None: The LLM's response, or None if the entry or its screenshot is gone.
+        """
+        self.history.flush() # The frame of a just-recorded entry may still be being written
+        entry = self.history.get(entry_id)
+        image = self.history.load_image(entry) if entry is not None else None
+        if image is None:
+            logger.error("No stored screenshot for history entry %s.", entry_id)
+            return None
+        if query is None and template is None:
+            query, template = entry.query, entry.template
+        with tracer.span("rerun", entry=entry_id):
+            # The entry's digest is the frame_digest of the original capture, so a cached answer can still apply
+            response = self.llm_interface.get_llm_response(image, query, on_token=on_token, image_hash=entry.digest,
+                                                           template=template)
+        self._keep(image, entry.digest, query, response, template)
+        return response
+
+    def ask_followup(self, session, question: str, on_token=None) -> str:
+        """
+        Asks another question about the screen of a session. No new screenshot is taken.
+
+        Args:
+            session (AnalysisSession): Session passed to a previous analyze_screen call.
+            question (str): The follow-up question.
+            on_token (callable, optional): Streams the response, calling this with each text chunk as it arrives. Defaults to None.
+
+        Returns:
+            str: The LLM's response, or a message saying the session has expired.
+        """
+        if not self.sessions.touch(session):
+            return SESSION_EXPIRED_MESSAGE
+        with tracer.span("followup", session=session.id, turn=len(session.turns)):
+            return self.llm_interface.get_llm_response(None, question, on_token=on_token, session=session)
+
+    async def aask_followup(self, session, question: str, on_token=None) -> str:
+        """asyncio variant of ask_followup."""
+        if not self.sessions.touch(session):
+            return SESSION_EXPIRED_MESSAGE
+        with tracer.span("followup", session=session.id, turn=len(session.turns)):
+            return await self.llm_interface.aget_llm_response(None, question, on_token=on_token, session=session)
+
+    def new_watcher(self, on_change, capture_mode: str = None, monitor: int = None, region: dict = None):
+        """
+        Creates a ScreenWatcher over this assistant's capture tool, configured from WATCH_*.
+        Analyze the changes it reports with aanalyze_change. Call start() on it to begin.
+
+        Args:
+            on_change (callable): Called with each WatchEvent, on the watcher thread.
+            capture_mode, monitor, region: What to watch, as for analyze_screen.
+        """
+        from src.core.watch import ScreenWatcher
+        return ScreenWatcher(self.screenshot_tool, on_change, capture_mode=capture_mode, monitor=monitor,
+                             region=region, interval=AppConfig.WATCH_INTERVAL,
+                             max_interval=AppConfig.WATCH_MAX_INTERVAL, tile_size=AppConfig.WATCH_TILE_SIZE,
+                             min_change=AppConfig.WATCH_MIN_CHANGE, debounce=AppConfig.WATCH_DEBOUNCE,
+                             cpu_budget=AppConfig.WATCH_CPU_BUDGET, lock=self._capture_lock)
+
+    async def aanalyze_change(self, event, query: str = None, on_token=None, template: str = None) -> str:
+        """
+        Analyzes the changed region of a WatchEvent; only that region is sent to the model.
+
+        Args:
+            event (WatchEvent): A change reported by a watcher from new_watcher.
+            query, on_token, template: As for analyze_screen.
+
+        Returns:
+            str: The LLM's response, or an error message.
+        """
+        with tracer.span("analyze_change", width=event.region["width"], height=event.region["height"]):
+            return await self.llm_interface.aget_llm_response(event.image, query, on_token=on_token,
+                                                              template=template)
+
+    def _keep(self, screenshot, image_hash, query, response, template):
+        """Records a kept screenshot and its analysis in the history; the frame is written in the background."""
+        if screenshot is None or response is None:
+            return
+        try:
+            self.history.record(screenshot, response, self.llm_interface.model, query=query, template=template,
+                                image_hash=image_hash)
+        except Exception as e:
+            logger.error("Could not record the screenshot in the history: %s", e)
+
+    def _acquire_image(self, keep_screenshot, screenshot_path, capture_mode=None, monitor=None, region=None):
+        """
+        Returns (image, image_hash, screenshot) for the request: the given file, or a fresh in-memory
+        capture. screenshot is the captured PIL Image if keep_screenshot is set, to record in the
+        history once the response is in, and None otherwise. Returns (None, None, None) if no
+        image could be obtained.
+        """
+        if screenshot_path:
+            if not os.path.exists(screenshot_path):
+                logger.error("Provided screenshot file not found at %s", screenshot_path)
+                return None, None, None
+            logger.info("Using pre-existing screenshot: %s", screenshot_path)
+            # Files are hashed by LLMInterface if the response cache needs it
+            return screenshot_path, None, None
+
+        if self.precapture is not None:
+            frame = self.precapture.take(capture_mode, monitor, region)
+            if frame is not None:
+                logger.info("Using the speculative capture.")
+                # Already prepared; the LLM interface sends its bytes as they are
+                return frame.prepared, frame.image_hash, frame.image if keep_screenshot else None
+
+        logger.info("Taking screenshot...")
+        # The capture stays in memory and goes straight to the encoder;
+        # it only touches the disk when the caller asks to keep it.
+        try:
+            image, image_hash = self._capture(capture_mode, monitor, region)
+        except ValueError as e:
+            logger.error("Could not capture the screen: %s", e)
+            return None, None, None
+        if image is None:
+            logger.error("Failed to take screenshot.")
+            return None, None, None
+        return image, image_hash, image if keep_screenshot else None
+
+    def close(self):
+        """Closes the LLM client and the capture backend, and finishes writing the history."""
+        self.llm_interface.close()
+        self.screenshot_tool.close()
+        if self._history is not None:
+            self._history.close()
+
+    def _capture(self, capture_mode=None, monitor=None, region=None):
+        """
+        Captures the screen; returns (image, image_hash). The hash is only computed for the
+        response cache. It is the frame_digest of the RGB image, like the history's and
+        LLMInterface's own, so a screen has one content address whether the cache is on or not.
+        """
+        with self._capture_lock:
+            image = self.screenshot_tool.capture_image(capture_mode, monitor, region)
+        image_hash = None
+        if image is not None and self.llm_interface.response_cache is not None:
+            with tracer.span("frame_digest"):
+                image_hash = frame_digest(image)
+        return image, image_hash
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ask Bambi about your screen.")
+    parser.add_argument("query", nargs="?", default=None, help="Question about the screen (default: describe it).")
+    parser.add_argument("--mode", choices=CAPTURE_MODES, default=None, help="Capture mode (default: CAPTURE_MODE).")
+    parser.add_argument("--monitor", type=int, default=None, help="Monitor index for --mode monitor (1 = primary).")
+    parser.add_argument("--region", type=parse_region, default=None, help="left,top,width,height for --mode region.")
+    parser.add_argument("--screenshot", default=None, help="Analyze an existing screenshot file instead of capturing.")
+    parser.add_argument("--template", choices=PROMPTS.names(), default=None,
+                        help="Prompt template (default: describe, or ask with a query).")
+    parser.add_argument("--keep", action="store_true",
+                        help="Record the screenshot and the answer in the history (see src.cli.history).")
+    args = parser.parse_args()
+    setup_instrumentation()
+
+    assistant = LLMAssistant()
+    answer = assistant.analyze_screen(args.query, keep_screenshot=args.keep, screenshot_path=args.screenshot,
+                                      capture_mode=args.mode, monitor=args.monitor, region=args.region,
+                                      template=args.template)
+    print("\n--- LLM Response ---")
+    print(answer)
+    print("--------------------")
+    assistant.close()
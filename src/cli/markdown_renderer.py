@@ -0,0 +1,96 @@
+import re
+
+# A line starting a Markdown list item ("- a", "* a", "+ a", "1. a").
+_LIST_ITEM_RE = re.compile(r"^(?:[-*+]|\d+[.)])\s")
+_FENCE_MARKERS = ("```", "~~~")
+
+
+class IncrementalMarkdownRenderer:
+    """
+    Renders a growing Markdown text block by block.
+
+    The text is split at stable block boundaries: a blank line, outside a fenced code block,
+    that is followed by an unindented line which does not continue a list. Everything before
+    the last such boundary can no longer change, so its HTML is rendered once and cached.
+    Only the trailing open block is re-rendered on each update.
+    """
+
+    def __init__(self, extensions=("fenced_code",)):
+        import markdown # Imported here: only the UI and benchmarks render Markdown
+        self._md = markdown.Markdown(extensions=list(extensions))
+        self.reset()
+
+    def reset(self):
+        """Forgets all text and cached HTML."""
+        self._text = ""
+        self._stable_len = 0 # Length of the text prefix made of finished blocks
+        self._block_html = [] # Cached HTML of each finished block
+
+    @property
+    def text(self):
+        return self._text
+
+    @property
+    def finished_html(self):
+        """HTML of all finished blocks, in order."""
+        return "".join(self._block_html)
+
+    def _render(self, markdown_text):
+        self._md.reset()
+        return self._md.convert(markdown_text)
+
+    def _find_stable_boundary(self):
+        """
+        Returns the offset of the last stable block boundary in the open tail,
+        or the current stable length if the tail holds no finished block yet.
+        """
+        boundary = self._stable_len
+        offset = self._stable_len
+        blank_seen = False
+        fence = None
+
+        # The last element is a partial line that may still grow, so it is never inspected.
+        for line in self._text[self._stable_len:].split("\n")[:-1]:
+            line_start = offset
+            offset += len(line) + 1
+            stripped = line.strip()
+
+            if fence:
+                if stripped.startswith(fence):
+                    fence = None
+                continue
+            if not stripped:
+                blank_seen = True
+                continue
+            if blank_seen and not line[:1].isspace() and not _LIST_ITEM_RE.match(stripped):
+                boundary = line_start
+            blank_seen = False
+            if stripped.startswith(_FENCE_MARKERS):
+                fence = stripped[:3]
+
+        return boundary
+
+    def append(self, markdown_chunk):
+        """
+        Adds a chunk of Markdown text.
+
+        Returns:
+            tuple[list[str], str]: HTML of blocks that became finished with this chunk,
+            and the HTML of the current open block.
+        """
+        self._text += markdown_chunk
+        boundary = self._find_stable_boundary()
+
+        new_blocks = []
+        if boundary > self._stable_len:
+            new_blocks.append(self._render(self._text[self._stable_len:boundary]))
+            self._block_html.extend(new_blocks)
+            self._stable_len = boundary
+
+        return new_blocks, self._render(self._text[self._stable_len:])
+
+    def render_all(self, markdown_text):
+        """Replaces the text and returns the full HTML, reusing nothing. Used for one-shot renders."""
+        self.reset()
+        self._text = markdown_text
+        return self._render(markdown_text)
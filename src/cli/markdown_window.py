@@ -1,15 +1,23 @@
-import threading
-from pynput import keyboard
-import subprocess # subprocess is imported but not used in the provided snippet. If needed, ensure its usage.
-from collections import deque
+import html
+import logging
 
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget,
-                             QVBoxLayout, QTextBrowser, QLabel) # Added QLabel
-from PyQt6.QtCore import QObject, pyqtSignal, QMetaObject, Qt, QTimer
+                             QVBoxLayout, QTextBrowser, QLabel, QLineEdit)
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal
+from PyQt6.QtGui import QTextCursor
 import sys
-import markdown # For robust Markdown to HTML conversion if needed
+from src.cli.markdown_renderer import IncrementalMarkdownRenderer
+from src.core.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Streamed updates are batched and rendered at most once per display frame (~60 fps).
+STREAM_RENDER_INTERVAL_MS = 16
 
 class MarkdownWindow(QMainWindow):
+    # Emitted with the text of a follow-up question entered below the response
+    followup_submitted = pyqtSignal(str)
+
     def __init__(self, title="Markdown Viewer", initial_markdown=""):
         super().__init__()
         self.setWindowTitle(title)
@@ -62,6 +70,23 @@ class MarkdownWindow(QMainWindow):
         self._loading_label.hide() # Initially hidden
         self._layout.addWidget(self._loading_label)
 
+        # Follow-up question input, enabled once there is an answer to follow up on
+        self._followup_input = QLineEdit()
+        self._followup_input.setPlaceholderText("Ask a follow-up question about this screen...")
+        self._followup_input.setStyleSheet("""
+            QLineEdit {
+                background-color: #ffffff;
+                border: 1px solid #e0e0e0;
+                border-radius: 10px;
+                padding: 8px;
+                font-size: 14px;
+                color: #555555;
+            }
+        """)
+        self._followup_input.setEnabled(False)
+        self._followup_input.returnPressed.connect(self._submit_followup)
+        self._layout.addWidget(self._followup_input)
+
         # --- Loading Animation Timer ---
         self._animation_timer = QTimer(self)
         self._animation_timer.setInterval(400) # Update every 400ms
@@ -70,6 +95,16 @@ class MarkdownWindow(QMainWindow):
         # Connect the timer timeout signal to the animation update slot
         self._animation_timer.timeout.connect(self._update_loading_animation)
 
+        # --- Incremental rendering state for streamed responses ---
+        self._renderer = IncrementalMarkdownRenderer()
+        self._pending_markdown = "" # Chunks received since the last render
+        self._stable_end = 0 # Document position where the open (re-rendered) block starts
+        self._stream_start = 0 # Document position where the current response starts
+        self._render_timer = QTimer(self)
+        self._render_timer.setSingleShot(True)
+        self._render_timer.setInterval(STREAM_RENDER_INTERVAL_MS)
+        self._render_timer.timeout.connect(self._flush_pending_markdown)
+
         self.display_markdown(initial_markdown)
 
     def _update_loading_animation(self):
@@ -88,19 +123,130 @@ class MarkdownWindow(QMainWindow):
 
         # QTextBrowser can directly render some Markdown,
         # but for full Markdown spec support, convert to HTML first.
-        html_content = markdown.markdown(markdown_text)
-        self._text_browser.setHtml(html_content)
+        self._render_timer.stop()
+        self._pending_markdown = ""
+        with tracer.span("render", mode="full"):
+            html_content = self._renderer.render_all(markdown_text)
+            self._text_browser.setHtml(html_content)
+
+
+    def begin_stream(self, question=None):
+        """
+        Prepares the window for a streamed response; the first chunk replaces the loading indicator.
+        For a follow-up question the earlier answers stay, and the question is shown above the new answer.
+        """
+        self._render_timer.stop()
+        self._renderer.reset()
+        self._pending_markdown = ""
+        if question is None:
+            self._stable_end = 0
+            self._text_browser.clear()
+        else:
+            cursor = QTextCursor(self._text_browser.document())
+            cursor.movePosition(QTextCursor.MoveOperation.End)
+            cursor.insertBlock()
+            cursor.insertHtml(f"<p><i>{html.escape(question)}</i></p>")
+            cursor.insertBlock()
+            self._stable_end = cursor.position()
+            self._text_browser.verticalScrollBar().setValue(self._text_browser.verticalScrollBar().maximum())
+        self._stream_start = self._stable_end
+
+    def append_markdown(self, markdown_chunk):
+        """
+        Appends a streamed chunk of Markdown to the current response.
+        Rendering is deferred to the next display frame so bursts of chunks cost one update.
+        """
+        self._pending_markdown += markdown_chunk
+        if not self._render_timer.isActive():
+            self._render_timer.start()
+
+    def end_stream(self, markdown_text):
+        """
+        Finishes a streamed response. If the final text matches what was streamed only the
+        pending chunks are flushed, otherwise the final text is rendered from scratch.
+        """
+        if self._renderer.text + self._pending_markdown == markdown_text:
+            self._flush_pending_markdown()
+        elif self._stream_start:
+            # A follow-up answer: replace only this response, keeping the conversation above it
+            self._render_timer.stop()
+            self._pending_markdown = ""
+            cursor = QTextCursor(self._text_browser.document())
+            cursor.setPosition(self._stream_start)
+            cursor.movePosition(QTextCursor.MoveOperation.End, QTextCursor.MoveMode.KeepAnchor)
+            cursor.insertHtml(self._renderer.render_all(markdown_text))
+        else:
+            self.display_markdown(markdown_text)
+            return
+        self._animation_timer.stop()
+        self._loading_label.hide()
+        self._text_browser.show()
+
+    def set_followup_enabled(self, enabled):
+        """Enables the follow-up input (and focuses it) or disables it while no answer can be followed up."""
+        self._followup_input.setEnabled(enabled)
+        if enabled:
+            self._followup_input.setFocus()
+
+    def _submit_followup(self):
+        question = self._followup_input.text().strip()
+        if not question:
+            return
+        self._followup_input.clear()
+        self.followup_submitted.emit(question)
+
+    def _flush_pending_markdown(self):
+        """
+        Renders pending chunks into the document. Finished blocks are appended once;
+        only the trailing open block is replaced, so scroll position and selection are kept.
+        """
+        if not self._pending_markdown:
+            return
+        with tracer.span("render", mode="incremental"):
+            self._render_pending_markdown()
+
+    def _render_pending_markdown(self):
+        chunk, self._pending_markdown = self._pending_markdown, ""
+        new_blocks, open_block_html = self._renderer.append(chunk)
+
+        # The first chunk replaces the loading indicator
+        if self._loading_label.isVisible():
+            self._animation_timer.stop()
+            self._loading_label.hide()
+            self._text_browser.show()
+
+        scroll_bar = self._text_browser.verticalScrollBar()
+        follow_tail = scroll_bar.value() >= scroll_bar.maximum() - 4
+
+        cursor = QTextCursor(self._text_browser.document())
+        cursor.beginEditBlock()
+        # Drop the previous rendering of the open block
+        cursor.setPosition(self._stable_end)
+        cursor.movePosition(QTextCursor.MoveOperation.End, QTextCursor.MoveMode.KeepAnchor)
+        cursor.removeSelectedText()
+        for block_html in new_blocks:
+            cursor.insertHtml(block_html)
+            cursor.insertBlock()
+        self._stable_end = cursor.position()
+        cursor.insertHtml(open_block_html)
+        cursor.endEditBlock()
 
+        if follow_tail:
+            scroll_bar.setValue(scroll_bar.maximum())
 
-    def show_loading(self, message_base="Bambi is thinking"):
-        """Shows a loading indicator and hides the text browser. Starts the animation."""
-        self._text_browser.hide() # Hide the text browser
+    def show_loading(self, message_base="Bambi is thinking", keep_text=False):
+        """
+        Shows a loading indicator and hides the text browser (unless keep_text is set,
+        e.g. while a follow-up is answered). Starts the animation.
+        """
+        if not keep_text:
+            self._text_browser.hide() # Hide the text browser
         self._animation_text_base = message_base
         self._animation_step = 0 # Reset animation step
         self._update_loading_animation() # Set initial text
         self._loading_label.show() # Show the loading label
         self._animation_timer.start() # Start the animation timer
-        print(f"Showing loading indicator with message base: '{message_base}'")
+        logger.debug("Showing loading indicator with message base: '%s'", message_base)
 
 
     def hide_loading(self):
@@ -108,7 +254,7 @@ class MarkdownWindow(QMainWindow):
         self._animation_timer.stop() # Stop the animation timer
         self._loading_label.hide()
         self._text_browser.show() # Show the text browser again
-        print("Hiding loading indicator.")
+        logger.debug("Hiding loading indicator.")
 
 
 if __name__ == "__main__":
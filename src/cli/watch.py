@@ -0,0 +1,72 @@
+import argparse
+import asyncio
+import functools
+import logging
+import sys
+import threading
+import time
+from src.cli.main import LLMAssistant
+from src.core.prompts import PROMPTS
+from src.core.scheduler import LATEST_WINS, AnalysisScheduler
+from src.core.screenshot_capture import CAPTURE_MODES, parse_region
+from src.core.tracing import setup_instrumentation
+
+logger = logging.getLogger(__name__)
+
+
+def write(text):
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+
+async def analyze_event(job_id, assistant, watcher, event, query, template):
+    """
+    Streams the analysis of one change to stdout; a newer change cancels it. The terminal
+    may be on the watched screen, so the watcher ignores the changes this output makes.
+    """
+    watcher.begin_output()
+    try:
+        write(f"\n--- {time.strftime('%H:%M:%S')} change {event} ---\n")
+        await assistant.aanalyze_change(event, query, on_token=write, template=template)
+        write("\n")
+    except asyncio.CancelledError:
+        write("\n[superseded by a newer change]\n")
+        raise
+    finally:
+        watcher.end_output()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Watch the screen and analyze what changes.",
+        epilog="Changes while an answer is printed (and shortly after) are ignored, so this terminal can be on "
+               "the watched screen; to keep your own changes during answers, watch another --monitor or a --region.")
+    parser.add_argument("query", nargs="?", default=None, help="Question about each change (default: describe it).")
+    parser.add_argument("--mode", choices=CAPTURE_MODES, default=None, help="Capture mode (default: CAPTURE_MODE).")
+    parser.add_argument("--monitor", type=int, default=None, help="Monitor index for --mode monitor (1 = primary).")
+    parser.add_argument("--region", type=parse_region, default=None, help="left,top,width,height for --mode region.")
+    parser.add_argument("--template", choices=PROMPTS.names(), default=None,
+                        help="Prompt template (default: describe, or ask with a query).")
+    args = parser.parse_args()
+    setup_instrumentation()
+
+    assistant = LLMAssistant()
+    threading.Thread(target=assistant.warm_up, daemon=True).start()
+    # Only the latest change matters: a new one cancels the analysis in flight
+    scheduler = AnalysisScheduler(policy=LATEST_WINS, coalesce_window=0).start()
+
+    def on_change(event):
+        scheduler.submit(functools.partial(analyze_event, assistant=assistant, watcher=watcher, event=event,
+                                           query=args.query, template=args.template))
+
+    watcher = assistant.new_watcher(on_change, capture_mode=args.mode, monitor=args.monitor, region=args.region)
+    watcher.start()
+    logger.info("Watching the screen; press Ctrl+C to stop.")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop()
+        scheduler.stop()
+        logger.info("Watch stats: %s", watcher.stats())
@@ -0,0 +1,567 @@
+import logging
+import threading
+import time
+from src.core.model_manager import matches_model
+from src.core.tracing import tracer
+from src.core.transport import (AsyncOllamaTransport, OllamaConnectionError, OllamaTimeoutError,
+                                OllamaTransport, OllamaTransportError)
+
+logger = logging.getLogger(__name__)
+
+# Circuit breaker states
+CIRCUIT_CLOSED = "closed" # Requests flow normally
+CIRCUIT_OPEN = "open" # The host failed repeatedly; no requests until the reset timeout
+CIRCUIT_HALF_OPEN = "half_open" # The reset timeout passed; one trial request decides
+
+# Errors that say a host is unreachable or too slow, as opposed to a rejected request.
+_HOST_ERRORS = (OllamaConnectionError, OllamaTimeoutError)
+
+# Weight of the newest sample in the smoothed latency of a host.
+_LATENCY_SMOOTHING = 0.3
+
+
+def _start_thread(fn, *args):
+    """
+    Runs fn(*args) on a new daemon thread and returns a concurrent.futures.Future of its
+    result. Daemon threads, unlike an executor's, do not hold up interpreter exit while a
+    losing hedged request is still waiting for its host.
+    """
+    from concurrent.futures import Future
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="bambi-hedge", daemon=True).start()
+    return future
+
+
+def parse_hosts(value):
+    """Parses a comma-separated list of Ollama base URLs; returns an empty list for an empty value."""
+    return [host.strip() for host in (value or "").split(",") if host.strip()]
+
+
+class Backend:
+    """One Ollama host of a BackendPool, with its transports, health and load."""
+
+    def __init__(self, host, transport_options):
+        self.host = host.rstrip("/")
+        self.transport = OllamaTransport(host, **transport_options)
+        self.async_transport = AsyncOllamaTransport(host, **transport_options)
+        self.models = None # Model names from /api/tags; None until the first probe
+        self.outstanding = 0 # Requests in flight
+        self.consecutive_failures = 0
+        self.circuit = CIRCUIT_CLOSED
+        self.opened_at = None
+        self.trial_in_flight = False # A half-open circuit lets one request through
+        self.latency = None # Smoothed seconds to the first byte of an answer
+        self.requests = 0
+        self.failures = 0
+
+    def has_model(self, model):
+        if self.models is None:
+            return True # Not probed yet; let the request find out
+        return any(matches_model(name, model) for name in self.models)
+
+    def as_dict(self):
+        return {
+            "host": self.host,
+            "circuit": self.circuit,
+            "outstanding": self.outstanding,
+            "latency": self.latency,
+            "models": sorted(self.models) if self.models is not None else None,
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
+class BackendPool:
+    """
+    Spreads requests over several Ollama hosts.
+
+    Each request goes to the host with the fewest requests in flight (ties go to the one
+    that answered fastest lately) among the hosts that have the model and whose circuit
+    is not open. A host's circuit opens after failure_threshold connection errors or
+    timeouts in a row; after reset_timeout one trial request is let through, and its
+    outcome closes or re-opens the circuit. A request that fails to reach a host moves on
+    to the next one. With hedge_after set, requests that have not produced a first byte
+    after that many seconds are also sent to a second host, and the first answer wins.
+    """
+
+    def __init__(self, hosts, model, transport_options=None, failure_threshold=3,
+                 reset_timeout=30.0, probe_interval=15.0, hedge_after=None):
+        """
+        Args:
+            hosts (list[str]): Base URLs of the Ollama servers.
+            model (str): Model the requests need; hosts without it are skipped once probed.
+            transport_options (dict, optional): connect_timeout, read_timeout and pool_size
+                for each host's transports.
+            failure_threshold (int): Consecutive host errors that open a circuit.
+            reset_timeout (float): Seconds an open circuit waits before a trial request.
+            probe_interval (float): Seconds between background health probes. 0 disables them.
+            hedge_after (float, optional): Seconds before a request is hedged to a second
+                host. None or 0 disables hedging.
+        """
+        if not hosts:
+            raise ValueError("BackendPool needs at least one host.")
+        self.model = model
+        self.backends = [Backend(host, transport_options or {}) for host in hosts]
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe_interval = probe_interval
+        self.hedge_after = hedge_after or None
+        self.hedges = 0 # Requests that were hedged
+        self.hedge_wins = 0 # Hedged requests answered first by the second host
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._probe_thread = None
+
+    # --- Health ---
+
+    def _allows_request_locked(self, backend, now):
+        if backend.circuit == CIRCUIT_OPEN and now - backend.opened_at >= self.reset_timeout:
+            backend.circuit = CIRCUIT_HALF_OPEN
+        if backend.circuit == CIRCUIT_OPEN:
+            return False
+        if backend.circuit == CIRCUIT_HALF_OPEN:
+            return not backend.trial_in_flight
+        return True
+
+    def _record_success_locked(self, backend, latency=None):
+        backend.consecutive_failures = 0
+        if backend.circuit != CIRCUIT_CLOSED:
+            logger.info("Ollama host %s recovered; closing its circuit.", backend.host)
+            backend.circuit = CIRCUIT_CLOSED
+        if latency is not None:
+            if backend.latency is None:
+                backend.latency = latency
+            else:
+                backend.latency += _LATENCY_SMOOTHING * (latency - backend.latency)
+
+    def _record_failure_locked(self, backend):
+        backend.failures += 1
+        backend.consecutive_failures += 1
+        if backend.circuit == CIRCUIT_HALF_OPEN or (backend.circuit == CIRCUIT_CLOSED and
+                                                   backend.consecutive_failures >= self.failure_threshold):
+            logger.warning("Ollama host %s is failing; opening its circuit for %.0f s.",
+                           backend.host, self.reset_timeout)
+            backend.circuit = CIRCUIT_OPEN
+            backend.opened_at = time.monotonic()
+            tracer.increment("backend_circuit_opened")
+
+    def probe(self, backend):
+        """Checks a host with GET /api/tags and refreshes its model list. Returns True if it answered."""
+        start = time.perf_counter()
+        try:
+            models = backend.transport.get_json("tags", timeout=backend.transport.timeout[0])
+        except OllamaTransportError as e:
+            logger.debug("Health probe of %s failed: %s", backend.host, e)
+            with self._lock:
+                self._record_failure_locked(backend)
+            return False
+        with self._lock:
+            backend.models = {entry.get("name", "") for entry in models.get("models", [])}
+            # A probe is cheap, so its timing says little about generation speed.
+            self._record_success_locked(backend)
+        logger.debug("Health probe of %s took %.0f ms", backend.host, (time.perf_counter() - start) * 1e3)
+        return True
+
+    def probe_all(self):
+        """Probes every host once. Returns the number of hosts that answered."""
+        return sum(self.probe(backend) for backend in self.backends)
+
+    def _probe_loop(self):
+        while not self._stop_event.wait(self.probe_interval):
+            self.probe_all()
+
+    def start_health_checks(self):
+        """Starts background health probes (no-op if disabled or already running)."""
+        if self.probe_interval <= 0 or (self._probe_thread and self._probe_thread.is_alive()):
+            return
+        self._stop_event.clear()
+        self._probe_thread = threading.Thread(target=self._probe_loop, daemon=True)
+        self._probe_thread.start()
+
+    def stop_health_checks(self):
+        self._stop_event.set()
+        if self._probe_thread:
+            self._probe_thread.join(timeout=1.0)
+            self._probe_thread = None
+
+    # --- Routing ---
+
+    def acquire(self, exclude=()):
+        """
+        Picks a host for a request and counts the request as in flight.
+
+        Args:
+            exclude: Backends already tried for this request.
+
+        Raises:
+            OllamaConnectionError: If no host can take the request.
+        """
+        now = time.monotonic()
+        with self._lock:
+            best = None
+            for backend in self.backends:
+                if backend in exclude or not backend.has_model(self.model):
+                    continue
+                if not self._allows_request_locked(backend, now):
+                    continue
+                rank = (backend.outstanding, backend.latency if backend.latency is not None else 0.0)
+                if best is None or rank < best[0]:
+                    best = (rank, backend)
+            if best is None:
+                raise OllamaConnectionError(f"No healthy Ollama host has the model {self.model}.")
+            backend = best[1]
+            if backend.circuit == CIRCUIT_HALF_OPEN:
+                backend.trial_in_flight = True
+            backend.outstanding += 1
+            backend.requests += 1
+        return backend
+
+    def release(self, backend, error=None, latency=None):
+        """
+        Marks a request as finished. Connection errors and timeouts count against the host;
+        other errors mean the host is up and answering.
+        """
+        with self._lock:
+            backend.outstanding -= 1
+            backend.trial_in_flight = False
+            if isinstance(error, _HOST_ERRORS):
+                self._record_failure_locked(backend)
+            else:
+                self._record_success_locked(backend, latency)
+
+    def abandon(self, backend):
+        """Marks a request as finished without judging the host, e.g. a cancelled hedge."""
+        with self._lock:
+            backend.outstanding -= 1
+            backend.trial_in_flight = False
+
+    def _failover(self, tried, error):
+        """Logs a failed attempt; returns True if another host is left to try."""
+        logger.warning("Request to %s failed (%s); trying another host.", tried[-1].host, error)
+        tracer.increment("backend_failover")
+        return len(tried) < len(self.backends)
+
+    # --- Synchronous requests ---
+
+    def _hedges(self):
+        return bool(self.hedge_after) and len(self.backends) > 1
+
+    def _hedge(self, backend, first):
+        """Counts a hedge to backend after first was too slow."""
+        with self._lock:
+            self.hedges += 1
+        tracer.increment("backend_hedged")
+        logger.info("No answer from %s after %.2f s; hedging to %s.", first.host, self.hedge_after, backend.host)
+
+    def _race_sync(self, start_attempt, discard):
+        """
+        Synchronous counterpart of _race. start_attempt(backend) runs on a thread per host,
+        since a blocking request cannot be waited on with a timeout otherwise. Returns
+        (backend, result) of the first attempt that succeeds. A blocking call cannot be
+        cancelled, so a losing attempt finishes in the background; discard(result) is then
+        called with its result (e.g. to close its stream) and its host is released.
+        """
+        from concurrent.futures import FIRST_COMPLETED, wait
+        tried = []
+        attempts = {}
+        started = {}
+
+        def launch(backend):
+            tried.append(backend)
+            started[backend] = time.perf_counter()
+            attempts[_start_thread(start_attempt, backend)] = backend
+
+        launch(self.acquire())
+        first = tried[0]
+        hedged = False
+        try:
+            while attempts:
+                timeout = None
+                if not hedged and len(tried) < len(self.backends):
+                    timeout = self.hedge_after
+                done, _ = wait(attempts, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    try:
+                        extra = self.acquire(exclude=tried)
+                    except OllamaConnectionError:
+                        continue
+                    self._hedge(extra, first)
+                    launch(extra)
+                    continue
+                for future in done:
+                    backend = attempts.pop(future)
+                    error = future.exception()
+                    if error is None:
+                        self.release(backend, latency=time.perf_counter() - started[backend])
+                        if backend is not first:
+                            with self._lock:
+                                self.hedge_wins += 1
+                        return backend, future.result()
+                    self.release(backend, error)
+                    if not isinstance(error, _HOST_ERRORS):
+                        raise error
+                    # Replace the failed attempt with the next host, even while another one is still running
+                    if self._failover(tried, error):
+                        try:
+                            launch(self.acquire(exclude=tried))
+                        except OllamaConnectionError:
+                            if not attempts:
+                                raise
+                    elif not attempts:
+                        raise error
+            raise OllamaConnectionError("No Ollama host answered.")
+        finally:
+            for future, backend in attempts.items():
+                future.add_done_callback(lambda lost, backend=backend: self._discard(backend, lost, discard))
+
+    def _discard(self, backend, lost, discard):
+        self.abandon(backend)
+        if lost.exception() is None:
+            try:
+                discard(lost.result())
+            except Exception as e:
+                logger.debug("Closing the losing hedged request to %s failed: %s", backend.host, e)
+
+    def post_json(self, endpoint, payload, timeout=None):
+        """
+        Sends a POST request to the best host, failing over to the others on host errors,
+        and hedging to a second host after hedge_after seconds.
+        """
+        if self._hedges():
+            _, result = self._race_sync(
+                lambda backend: backend.transport.post_json(endpoint, payload, timeout=timeout),
+                discard=lambda result: None)
+            return result
+        tried = []
+        while True:
+            backend = self.acquire(exclude=tried)
+            tried.append(backend)
+            start = time.perf_counter()
+            try:
+                result = backend.transport.post_json(endpoint, payload, timeout=timeout)
+            except _HOST_ERRORS as e:
+                self.release(backend, e)
+                if not self._failover(tried, e):
+                    raise
+                continue
+            except Exception as e:
+                self.release(backend, e)
+                raise
+            self.release(backend, latency=time.perf_counter() - start)
+            return result
+
+    def iter_ndjson(self, endpoint, payload, timeout=None):
+        """
+        Streams newline-delimited JSON from the best host. Until the first object arrives the
+        request fails over to other hosts (and is hedged to a second one after hedge_after
+        seconds); after that the stream is committed to its host.
+        """
+        if self._hedges():
+            yield from self._iter_ndjson_hedged(endpoint, payload, timeout)
+            return
+        tried = []
+        while True:
+            backend = self.acquire(exclude=tried)
+            tried.append(backend)
+            start = time.perf_counter()
+            stream = backend.transport.iter_ndjson(endpoint, payload, timeout=timeout)
+            try:
+                first = next(stream, None)
+            except _HOST_ERRORS as e:
+                self.release(backend, e)
+                if not self._failover(tried, e):
+                    raise
+                continue
+            except Exception as e:
+                self.release(backend, e)
+                raise
+            latency = time.perf_counter() - start
+            error = None
+            try:
+                if first is not None:
+                    yield first
+                    yield from stream
+                return
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                stream.close()
+                self.release(backend, error, latency)
+
+    def _iter_ndjson_hedged(self, endpoint, payload, timeout):
+        """iter_ndjson with hedging: the hosts race to the first object; the losing stream is closed."""
+        def attempt(backend):
+            stream = backend.transport.iter_ndjson(endpoint, payload, timeout=timeout)
+            try:
+                return stream, next(stream, None)
+            except BaseException:
+                stream.close()
+                raise
+
+        winner, (stream, first) = self._race_sync(attempt, discard=lambda result: result[0].close())
+        if first is None:
+            stream.close()
+            return
+        with self._lock:
+            winner.outstanding += 1 # The rest of the stream is still in flight
+        error = None
+        try:
+            yield first
+            yield from stream
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            stream.close()
+            with self._lock:
+                winner.outstanding -= 1
+                if isinstance(error, _HOST_ERRORS):
+                    self._record_failure_locked(winner)
+
+    # --- asyncio requests ---
+
+    async def _race(self, start_attempt):
+        """
+        Runs start_attempt(backend) on the best host and, if hedging is on and it has not
+        finished after hedge_after seconds, on a second host too. Attempts that fail with a
+        host error move on to the next host. Returns (backend, result) of the first attempt
+        that succeeds; the other attempts are cancelled.
+        """
+        import asyncio
+        tried = []
+        attempts = {}
+        started = {}
+
+        def launch(backend):
+            tried.append(backend)
+            attempts[asyncio.ensure_future(start_attempt(backend))] = backend
+            started[backend] = time.perf_counter()
+
+        launch(self.acquire())
+        first = tried[0]
+        hedged = False
+        try:
+            while attempts:
+                timeout = None
+                if self.hedge_after and not hedged and len(tried) < len(self.backends):
+                    timeout = self.hedge_after
+                done, _ = await asyncio.wait(attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # The first host is slow: hedge to another one
+                    hedged = True
+                    try:
+                        extra = self.acquire(exclude=tried)
+                    except OllamaConnectionError:
+                        continue
+                    self._hedge(extra, first)
+                    launch(extra)
+                    continue
+                for task in done:
+                    backend = attempts.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        self.release(backend, latency=time.perf_counter() - started[backend])
+                        if backend is not first:
+                            with self._lock:
+                                self.hedge_wins += 1
+                        return backend, task.result()
+                    self.release(backend, error)
+                    if not isinstance(error, _HOST_ERRORS):
+                        raise error
+                    # Replace the failed attempt with the next host, even while another one is still running
+                    if self._failover(tried, error):
+                        try:
+                            launch(self.acquire(exclude=tried))
+                        except OllamaConnectionError:
+                            if not attempts:
+                                raise
+                    elif not attempts:
+                        raise error
+            raise OllamaConnectionError("No Ollama host answered.")
+        finally:
+            for task in attempts:
+                task.cancel()
+            if attempts:
+                # Let the cancelled attempts unwind (and close their connections)
+                await asyncio.gather(*attempts, return_exceptions=True)
+            for backend in attempts.values():
+                self.abandon(backend)
+
+    async def apost_json(self, endpoint, payload):
+        """asyncio variant of post_json, with hedging."""
+        async def attempt(backend):
+            return await backend.async_transport.post_json(endpoint, payload)
+        _, result = await self._race(attempt)
+        return result
+
+    async def aiter_ndjson(self, endpoint, payload):
+        """
+        asyncio variant of iter_ndjson. Hedging races the hosts to the first streamed object;
+        the losing stream is closed, which aborts its generation.
+        """
+        streams = {}
+
+        async def attempt(backend):
+            stream = streams[backend] = backend.async_transport.iter_ndjson(endpoint, payload)
+            try:
+                return await stream.__anext__()
+            except StopAsyncIteration:
+                return None # An empty response
+
+        winner = None
+        try:
+            winner, first = await self._race(attempt)
+        finally:
+            for backend, stream in streams.items():
+                if backend is not winner:
+                    await stream.aclose()
+        stream = streams[winner]
+        if first is None:
+            return
+        with self._lock:
+            winner.outstanding += 1 # The rest of the stream is still in flight
+        error = None
+        try:
+            yield first
+            async for chunk in stream:
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            await stream.aclose()
+            with self._lock:
+                winner.outstanding -= 1
+                if isinstance(error, _HOST_ERRORS):
+                    self._record_failure_locked(winner)
+
+    # --- Lifecycle ---
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backends": [backend.as_dict() for backend in self.backends],
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+            }
+
+    def close(self):
+        self.stop_health_checks()
+        for backend in self.backends:
+            backend.transport.close()
+
+    async def aclose(self):
+        self.close()
+        for backend in self.backends:
+            await backend.async_transport.aclose()
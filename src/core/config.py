@@ -1,17 +1,163 @@
 import os
-from dotenv import load_dotenv
+import threading
 
-load_dotenv() # Load environment variables from .env file
 
-class AppConfig:
-    OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
-    OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llava:7b-v1.5-q4_K_M") # Default VLM
-    TEMP_SCREENSHOT_DIR = os.getenv("TEMP_SCREENSHOT_DIR", "data/temp/")
-    # Add other configurations as needed (e.g., OCR language, image quality)
+def _env_bool(value):
+    return value.lower() in ("1", "true", "yes")
 
-    @classmethod
-    def get_ollama_api_url(cls, endpoint="generate"):
-        return f"{cls.OLLAMA_HOST}/api/{endpoint}"
 
-# Ensure temp directory exists
-os.makedirs(AppConfig.TEMP_SCREENSHOT_DIR, exist_ok=True)
\ No newline at end of file
+def _env_optional_int(value):
+    """Parses an integer setting where an empty value means "not set"."""
+    return int(value) if value.strip() else None
+
+
+class Settings:
+    """
+    Application settings, read from the environment once by load_settings().
+    Constructing a Settings object has no side effects.
+    """
+
+    def __init__(self, environ=None):
+        """
+        Args:
+            environ (dict, optional): Variables to read. Defaults to os.environ.
+        """
+        env = os.environ if environ is None else environ
+        self.OLLAMA_HOST = env.get("OLLAMA_HOST", "http://localhost:11434")
+        self.OLLAMA_MODEL = env.get("OLLAMA_MODEL", "llava:7b-v1.5-q4_K_M") # Default VLM
+        # Several Ollama hosts (comma-separated URLs) to spread requests over; empty = OLLAMA_HOST only.
+        # A host's circuit opens after FAILURE_THRESHOLD errors in a row and is retried after
+        # CIRCUIT_RESET seconds; HEALTH_INTERVAL is the probe period (0 = off); requests without
+        # a first byte after HEDGE_AFTER seconds are also sent to a second host (0 = off).
+        self.OLLAMA_HOSTS = env.get("OLLAMA_HOSTS", "")
+        self.OLLAMA_FAILURE_THRESHOLD = int(env.get("OLLAMA_FAILURE_THRESHOLD", "3"))
+        self.OLLAMA_CIRCUIT_RESET = float(env.get("OLLAMA_CIRCUIT_RESET", "30"))
+        self.OLLAMA_HEALTH_INTERVAL = float(env.get("OLLAMA_HEALTH_INTERVAL", "15"))
+        self.OLLAMA_HEDGE_AFTER = float(env.get("OLLAMA_HEDGE_AFTER", "0"))
+        # Context window (tokens) the model runs with on the server, i.e. its num_ctx / the
+        # server's OLLAMA_CONTEXT_LENGTH; used to budget prompts and follow-up contexts (0 = unknown).
+        self.MODEL_CONTEXT_LENGTH = int(env.get("MODEL_CONTEXT_LENGTH", "4096"))
+        # HTTP transport: separate connect/read timeouts (seconds) and keep-alive pool size
+        self.OLLAMA_CONNECT_TIMEOUT = float(env.get("OLLAMA_CONNECT_TIMEOUT", "5"))
+        self.OLLAMA_READ_TIMEOUT = float(env.get("OLLAMA_READ_TIMEOUT", "1000"))
+        self.OLLAMA_POOL_SIZE = int(env.get("OLLAMA_POOL_SIZE", "4"))
+        # Model residency: how long Ollama keeps the model loaded, and how often (seconds)
+        # the background heartbeat checks it is still resident. 0 disables the heartbeat.
+        self.OLLAMA_KEEP_ALIVE = env.get("OLLAMA_KEEP_ALIVE", "30m")
+        self.OLLAMA_HEARTBEAT_INTERVAL = float(env.get("OLLAMA_HEARTBEAT_INTERVAL", "240"))
+        # Response cache for repeated screens/queries (TTL in seconds; empty path = memory only).
+        # Keyed by an exact digest of the captured pixels, which costs ~30 ms per 4K capture, so it is opt-in.
+        self.RESPONSE_CACHE_ENABLED = _env_bool(env.get("RESPONSE_CACHE_ENABLED", "false"))
+        self.RESPONSE_CACHE_MAX_ENTRIES = int(env.get("RESPONSE_CACHE_MAX_ENTRIES", "128"))
+        self.RESPONSE_CACHE_TTL = float(env.get("RESPONSE_CACHE_TTL", "600"))
+        self.RESPONSE_CACHE_PATH = env.get("RESPONSE_CACHE_PATH", "")
+        # Analysis scheduling: "latest_wins" aborts the running analysis when the hotkey is pressed
+        # again, "queue" runs presses in order (bounded queue). Under latest_wins, a burst of presses
+        # within the coalesce window runs only the last one; under queue, every press runs.
+        self.SCHEDULER_POLICY = env.get("SCHEDULER_POLICY", "latest_wins")
+        self.SCHEDULER_MAX_QUEUE = int(env.get("SCHEDULER_MAX_QUEUE", "4"))
+        self.SCHEDULER_COALESCE_WINDOW = float(env.get("SCHEDULER_COALESCE_WINDOW", "0.15"))
+        # Screen capture: mode is monitor, cursor, region or all. CAPTURE_REGION is
+        # "left,top,width,height"; CAPTURE_ALL_MAX_DIM shrinks the all-monitors composite (0 = off).
+        self.CAPTURE_MODE = env.get("CAPTURE_MODE", "monitor")
+        self.CAPTURE_MONITOR = int(env.get("CAPTURE_MONITOR", "1"))
+        self.CAPTURE_REGION = env.get("CAPTURE_REGION", "")
+        self.CAPTURE_ALL_MAX_DIM = int(env.get("CAPTURE_ALL_MAX_DIM", "3000"))
+        # Diagnostics: log level, per-stage tracing, JSONL trace file and Prometheus port (0 = off)
+        self.LOG_LEVEL = env.get("LOG_LEVEL", "INFO")
+        self.TRACING_ENABLED = _env_bool(env.get("TRACING_ENABLED", "false"))
+        self.TRACE_FILE = env.get("TRACE_FILE", "")
+        self.METRICS_PORT = int(env.get("METRICS_PORT", "0"))
+        # Hotkeys: comma-separated chords, each optionally with a capture mode and a prompt
+        # template (see PROMPTS in src/core/prompts.py), e.g. "ctrl+alt+k, ctrl+alt+t:cursor:text".
+        self.HOTKEYS = env.get("HOTKEYS", "ctrl+alt+k")
+        # Speculative capture: start capturing and encoding as soon as the hotkey modifiers
+        # are held; the frame is used if the chord completes within SPECULATIVE_MAX_AGE seconds.
+        self.SPECULATIVE_CAPTURE = _env_bool(env.get("SPECULATIVE_CAPTURE", "false"))
+        self.SPECULATIVE_MAX_AGE = float(env.get("SPECULATIVE_MAX_AGE", "1.0"))
+        # Follow-up sessions: at most SESSION_MAX_SESSIONS are kept, each expires after SESSION_TTL
+        # idle seconds; a context longer than SESSION_MAX_CONTEXT tokens is dropped and the next
+        # follow-up re-sends the screenshot with a recap of the last SESSION_MAX_TURNS turns.
+        self.SESSION_TTL = float(env.get("SESSION_TTL", "600"))
+        self.SESSION_MAX_SESSIONS = int(env.get("SESSION_MAX_SESSIONS", "4"))
+        self.SESSION_MAX_CONTEXT = int(env.get("SESSION_MAX_CONTEXT", "8192"))
+        self.SESSION_MAX_TURNS = int(env.get("SESSION_MAX_TURNS", "6"))
+        # Watch mode: sample the screen every WATCH_INTERVAL seconds (slowing down to
+        # WATCH_MAX_INTERVAL while it is still) and analyze changes covering at least
+        # WATCH_MIN_CHANGE of the WATCH_TILE_SIZE tiles once the screen has been still for
+        # WATCH_DEBOUNCE seconds. Sampling uses at most WATCH_CPU_BUDGET of the time.
+        self.WATCH_INTERVAL = float(env.get("WATCH_INTERVAL", "0.5"))
+        self.WATCH_MAX_INTERVAL = float(env.get("WATCH_MAX_INTERVAL", "4"))
+        self.WATCH_TILE_SIZE = int(env.get("WATCH_TILE_SIZE", "32"))
+        self.WATCH_MIN_CHANGE = float(env.get("WATCH_MIN_CHANGE", "0.002"))
+        self.WATCH_DEBOUNCE = float(env.get("WATCH_DEBOUNCE", "1.0"))
+        self.WATCH_CPU_BUDGET = float(env.get("WATCH_CPU_BUDGET", "0.05"))
+        # Daemon mode: one long-running process holds the warm pipeline and serves analyses on
+        # http://DAEMON_HOST:DAEMON_PORT to the hotkey UI and CLI clients, at most
+        # DAEMON_MAX_CONCURRENT at a time. Clients authenticate with the token the daemon writes
+        # to DAEMON_TOKEN_FILE (readable by the user only; empty = no token).
+        self.DAEMON_HOST = env.get("DAEMON_HOST", "127.0.0.1")
+        self.DAEMON_PORT = int(env.get("DAEMON_PORT", "11500"))
+        self.DAEMON_TOKEN_FILE = env.get("DAEMON_TOKEN_FILE", "data/daemon.token")
+        self.DAEMON_MAX_CONCURRENT = int(env.get("DAEMON_MAX_CONCURRENT", "2"))
+        self.TEMP_SCREENSHOT_DIR = env.get("TEMP_SCREENSHOT_DIR", "data/temp/")
+        # History of kept screenshots (--keep): frames are stored once per exact pixel digest in
+        # HISTORY_DIR, compressed as HISTORY_FORMAT (WEBP, PNG or JPEG) at HISTORY_QUALITY, and the
+        # least recently used ones are evicted beyond HISTORY_MAX_MB (their analyses are kept).
+        # Their perceptual hash is only kept to group near-identical screens (history list --similar).
+        self.HISTORY_DIR = env.get("HISTORY_DIR", "data/history/")
+        self.HISTORY_MAX_MB = float(env.get("HISTORY_MAX_MB", "256"))
+        self.HISTORY_FORMAT = env.get("HISTORY_FORMAT", "WEBP")
+        self.HISTORY_QUALITY = int(env.get("HISTORY_QUALITY", "90"))
+        # Image preparation. Each model gets its policy from MODEL_IMAGE_POLICIES (or the
+        # generic default); the settings below override it where they are set (empty = keep
+        # the policy's value). IMAGE_FORMAT/IMAGE_QUALITY replace the first step of the quality
+        # ladder, and lower steps are only tried while the encoded image exceeds IMAGE_MAX_BYTES
+        # (0 = no size limit).
+        self.IMAGE_MAX_DIM = _env_optional_int(env.get("IMAGE_MAX_DIM", ""))
+        self.IMAGE_MAX_PIXELS = _env_optional_int(env.get("IMAGE_MAX_PIXELS", ""))
+        self.IMAGE_MAX_TOKENS = _env_optional_int(env.get("IMAGE_MAX_TOKENS", ""))
+        self.IMAGE_FORMAT = env.get("IMAGE_FORMAT", "").strip() or None
+        self.IMAGE_QUALITY = _env_optional_int(env.get("IMAGE_QUALITY", ""))
+        self.IMAGE_MAX_BYTES = _env_optional_int(env.get("IMAGE_MAX_BYTES", "400000"))
+        self.IMAGE_RESAMPLE = env.get("IMAGE_RESAMPLE", "").strip() or None
+        # Add other configurations as needed (e.g., OCR language)
+
+    def get_ollama_api_url(self, endpoint="generate", host=None):
+        return f"{host or self.OLLAMA_HOST}/api/{endpoint}"
+
+    def get_daemon_url(self):
+        return f"http://{self.DAEMON_HOST}:{self.DAEMON_PORT}"
+
+
+_settings = None
+_settings_lock = threading.Lock()
+
+
+def load_settings(env_file=None, reload=False):
+    """
+    Loads the settings from the .env file and the environment on first call and returns
+    the cached Settings object afterwards.
+
+    Args:
+        env_file (str, optional): Path of the .env file. Defaults to python-dotenv's lookup.
+        reload (bool, optional): Re-read the environment instead of returning the cached object.
+    """
+    global _settings
+    with _settings_lock:
+        if _settings is None or reload:
+            from dotenv import load_dotenv # Imported here: only needed once, at first load
+            load_dotenv(env_file)
+            _settings = Settings()
+        return _settings
+
+
+class _LazySettings:
+    """Attribute proxy for the cached settings; loads them on first attribute access."""
+
+    def __getattr__(self, name):
+        return getattr(load_settings(), name)
+
+
+# Backwards-compatible access point: AppConfig.OLLAMA_HOST etc. load the settings lazily.
+AppConfig = _LazySettings()
\ No newline at end of file
@@ -0,0 +1,284 @@
+import io
+import logging
+import os
+import threading
+import time
+from src.core.response_cache import frame_digest, frame_hash
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS frames (
+    digest TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    perceptual TEXT
+);
+CREATE TABLE IF NOT EXISTS analyses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    digest TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    query TEXT,
+    template TEXT,
+    response TEXT NOT NULL,
+    model TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS analyses_created_at ON analyses (created_at);
+CREATE INDEX IF NOT EXISTS analyses_digest ON analyses (digest);
+CREATE INDEX IF NOT EXISTS frames_last_used ON frames (last_used);
+"""
+
+_EXTENSIONS = {"WEBP": "webp", "PNG": "png", "JPEG": "jpg"}
+
+
+class HistoryEntry:
+    """One recorded analysis: the question, the answer and the frame it was about."""
+
+    def __init__(self, entry_id, digest, created_at, query, template, response, model, path=None,
+                 perceptual=None):
+        self.id = entry_id
+        self.digest = digest # Content address of the frame (frame_digest)
+        self.created_at = created_at # Unix time
+        self.query = query
+        self.template = template
+        self.response = response
+        self.model = model
+        self.path = path # Stored frame file, or None once it was evicted (or is still being written)
+        self.perceptual = perceptual # frame_hash of the stored frame: equal for near-identical screens
+
+    def __repr__(self):
+        when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.created_at))
+        return f"HistoryEntry({self.id} at {when}: {self.query or self.template or 'describe'!r})"
+
+
+class ScreenshotHistory:
+    """
+    Kept screenshots and the analyses of them, stored compactly and indexed.
+
+    Frames are content-addressed by frame_digest, an exact digest of their pixels, so an
+    identical screen is stored once however often it is analyzed, and an analysis always
+    points at the very frame it was about. Each frame also keeps its perceptual frame_hash,
+    which near-identical screens (a moved caret, a ticking clock) share, for grouping them.
+    Frames are written compressed (lossy WebP by default) under
+    objects/<2 hex digits>/<digest>.<ext>, so names never collide. A SQLite
+    index holds the frames and every analysis (time, query, template, response, model);
+    listing or re-running past analyses reads the index instead of scanning the directory.
+    When the stored frames exceed max_bytes, the least recently used ones are deleted; their
+    analyses are kept, without a frame to re-run.
+
+    Encoding a full-resolution frame takes a while, so frames are written on a background
+    thread; record() only hashes the frame and inserts the analysis.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024, image_format="WEBP", quality=90):
+        """
+        Args:
+            directory (str): Root directory of the store; created on first use.
+            max_bytes (int): Upper bound for the summed size of the stored frames.
+            image_format (str): WEBP, PNG (lossless) or JPEG.
+            quality (int): Quality of lossy formats.
+        """
+        image_format = image_format.upper()
+        if image_format not in _EXTENSIONS:
+            raise ValueError(f"Unsupported history image format: {image_format}")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.image_format = image_format
+        self.quality = quality
+        self.deduplicated = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._db = None
+        self._executor = None
+        self._pending = set() # Digests queued for writing
+
+    @property
+    def db(self):
+        """The SQLite index, opened (and created) on first use. Use under self._lock."""
+        if self._db is None:
+            import sqlite3
+            os.makedirs(self.directory, exist_ok=True)
+            self._db = sqlite3.connect(os.path.join(self.directory, "index.sqlite3"), check_same_thread=False)
+            self._db.executescript(_SCHEMA)
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(frames)")}
+            if "perceptual" not in columns: # An index from before the column existed
+                self._db.execute("ALTER TABLE frames ADD COLUMN perceptual TEXT")
+            self._db.execute("CREATE INDEX IF NOT EXISTS frames_perceptual ON frames (perceptual)")
+            self._db.commit()
+        return self._db
+
+    def _writer(self):
+        with self._lock:
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bambi-history")
+            return self._executor
+
+    def record(self, image, response, model, query=None, template=None, image_hash=None):
+        """
+        Records an analysis and stores its frame unless an equal one is stored already.
+
+        Args:
+            image: The analyzed PIL Image (not modified afterwards; it is encoded later).
+            response (str): The model's answer.
+            model (str): Model name.
+            query (str, optional): The user's question.
+            template (str, optional): Name of the prompt template.
+            image_hash (str, optional): frame_digest of the image, if already computed
+                (e.g. for the response cache).
+
+        Returns:
+            int: Id of the new HistoryEntry.
+        """
+        digest = image_hash or frame_digest(image)
+        now = time.time()
+        with self._lock, self.db:
+            stored = digest in self._pending or \
+                self.db.execute("UPDATE frames SET last_used = ? WHERE digest = ?", (now, digest)).rowcount
+            entry_id = self.db.execute(
+                "INSERT INTO analyses (digest, created_at, query, template, response, model) VALUES (?, ?, ?, ?, ?, ?)",
+                (digest, now, query, template, response, model)).lastrowid
+            if stored:
+                self.deduplicated += 1
+            else:
+                self._pending.add(digest)
+        if not stored:
+            self._writer().submit(self._store_frame, image, digest)
+        return entry_id
+
+    def _object_path(self, digest):
+        return os.path.join(self.directory, "objects", digest[:2], f"{digest}.{_EXTENSIONS[self.image_format]}")
+
+    def _store_frame(self, image, digest):
+        """
+        Runs on the writer thread: encodes and writes a frame, then enforces max_bytes.
+        Errors are logged, not raised (nobody waits on the future), and the digest always
+        leaves _pending, so a later record() of the same screen tries again.
+        """
+        path = self._object_path(digest)
+        options = {"quality": self.quality} if self.image_format != "PNG" else {"optimize": True}
+        if self.image_format == "WEBP":
+            options["method"] = 4
+        buffered = io.BytesIO()
+        try:
+            image.convert("RGB").save(buffered, format=self.image_format, **options)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first so a crash never leaves a truncated frame
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(buffered.getbuffer())
+            os.replace(tmp_path, path)
+            perceptual = frame_hash(image)
+            now = time.time()
+            with self._lock, self.db:
+                self.db.execute("INSERT OR REPLACE INTO frames (digest, path, bytes, width, height, created_at, "
+                                "last_used, perceptual) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                (digest, os.path.relpath(path, self.directory), buffered.tell(),
+                                 image.width, image.height, now, now, perceptual))
+                self._evict_locked()
+        except Exception as e:
+            logger.error("Could not store screenshot %s: %s", digest, e)
+        finally:
+            with self._lock:
+                self._pending.discard(digest)
+
+    def _evict_locked(self):
+        total = self.db.execute("SELECT COALESCE(SUM(bytes), 0) FROM frames").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for digest, path, size in self.db.execute(
+                "SELECT digest, path, bytes FROM frames ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            # The analyses stay: their text is small and searchable, and they report the frame as not stored
+            self.db.execute("DELETE FROM frames WHERE digest = ?", (digest,))
+            try:
+                os.remove(os.path.join(self.directory, path))
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evictions += 1
+
+    _ENTRY_QUERY = ("SELECT a.id, a.digest, a.created_at, a.query, a.template, a.response, a.model, f.path, "
+                    "f.perceptual "
+                    "FROM analyses a LEFT JOIN frames f ON f.digest = a.digest")
+
+    def _entry(self, row):
+        entry = HistoryEntry(*row)
+        if entry.path is not None:
+            entry.path = os.path.join(self.directory, entry.path)
+        return entry
+
+    def get(self, entry_id):
+        """Returns the HistoryEntry with this id, or None."""
+        with self._lock:
+            row = self.db.execute(f"{self._ENTRY_QUERY} WHERE a.id = ?", (entry_id,)).fetchone()
+        return self._entry(row) if row else None
+
+    def recent(self, limit=20, search=None, similar_to=None):
+        """
+        Returns the latest analyses, newest first.
+
+        Args:
+            limit (int): Maximum number of entries.
+            search (str, optional): Only entries whose query or response contains this text.
+            similar_to (HistoryEntry, optional): Only entries whose stored frame is
+                near-identical to this entry's (same perceptual hash).
+        """
+        sql, conditions, params = self._ENTRY_QUERY, [], []
+        if search:
+            conditions.append("(a.query LIKE ? OR a.response LIKE ?)")
+            params += [f"%{search}%"] * 2
+        if similar_to is not None:
+            conditions.append("f.perceptual = ?")
+            params.append(similar_to.perceptual)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        with self._lock:
+            rows = self.db.execute(f"{sql} ORDER BY a.id DESC LIMIT ?", params + [limit]).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def load_image(self, entry):
+        """Returns the frame of an entry as a PIL Image, or None if it is no longer stored."""
+        from PIL import Image
+        if entry.path is None:
+            return None
+        try:
+            with Image.open(entry.path) as img:
+                img.load()
+                return img
+        except FileNotFoundError:
+            return None
+
+    def flush(self):
+        """Waits until the queued frames are written."""
+        with self._lock:
+            executor = self._executor
+        if executor is not None:
+            executor.submit(lambda: None).result()
+
+    def stats(self):
+        with self._lock:
+            frames, size = self.db.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM frames").fetchone()
+            analyses = self.db.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+        return {
+            "frames": frames,
+            "bytes": size,
+            "analyses": analyses,
+            "deduplicated": self.deduplicated,
+            "evictions": self.evictions,
+        }
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
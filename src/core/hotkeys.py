@@ -0,0 +1,183 @@
+import itertools
+from src.core.prompts import PROMPTS
+from src.core.screenshot_capture import CAPTURE_MODES
+
+# Left/right variants of modifiers are matched as one key.
+_KEY_ALIASES = {
+    "ctrl_l": "ctrl", "ctrl_r": "ctrl",
+    "alt_l": "alt", "alt_r": "alt",
+    "shift_l": "shift", "shift_r": "shift",
+    "cmd_l": "cmd", "cmd_r": "cmd",
+    "control": "ctrl", "option": "alt", "super": "cmd", "win": "cmd",
+}
+
+
+def normalize_key(key):
+    """
+    Returns the canonical name of a key, so press and release events (and the configured
+    bindings) agree: characters are lowercased, control characters produced while ctrl is
+    held are mapped back to their letter, and left/right modifiers share one name.
+
+    Args:
+        key: A pynput Key/KeyCode, or a key name such as "ctrl" or "k".
+
+    Returns:
+        str | None: The key name, or None if the key has no usable name.
+    """
+    if isinstance(key, str):
+        name = key
+    elif getattr(key, "char", None) is not None:
+        name = key.char
+    elif getattr(key, "name", None) is not None:
+        name = key.name # A pynput Key, e.g. Key.ctrl_l -> "ctrl_l"
+    elif getattr(key, "vk", None) is not None:
+        name = f"<{key.vk}>" # A key without a character or name
+    else:
+        return None
+    if len(name) == 1 and ord(name) < 32:
+        name = chr(ord(name) + 96) # e.g. ctrl+k arrives as "\x0b" on some platforms
+    name = name.lower()
+    return _KEY_ALIASES.get(name, name)
+
+
+class HotkeyBinding:
+    """A key chord and what it triggers: a capture mode and a prompt template."""
+
+    def __init__(self, keys, capture_mode=None, preset="describe", name=None):
+        """
+        Args:
+            keys (sequence[str]): Keys held together, e.g. ("ctrl", "alt", "k"). The last key
+                triggers the binding; the keys before it may be pressed in any order.
+            capture_mode (str, optional): One of CAPTURE_MODES. Defaults to CAPTURE_MODE.
+            preset (str): Name of the prompt template in PROMPTS.
+            name (str, optional): Label for logs. Defaults to the chord, e.g. "ctrl+alt+k".
+        """
+        self.keys = tuple(normalize_key(key) for key in keys)
+        if not self.keys or None in self.keys:
+            raise ValueError(f"Invalid hotkey: {keys}")
+        if len(set(self.keys)) != len(self.keys):
+            raise ValueError(f"Hotkey repeats a key: {'+'.join(self.keys)}")
+        if capture_mode is not None and capture_mode not in CAPTURE_MODES:
+            raise ValueError(f"Unknown capture mode: {capture_mode}")
+        if preset not in PROMPTS:
+            raise ValueError(f"Unknown prompt template: {preset}")
+        self.capture_mode = capture_mode
+        self.preset = preset
+        self.name = name or "+".join(self.keys)
+
+    def __repr__(self):
+        return f"HotkeyBinding({self.name} -> {self.capture_mode or 'default'}:{self.preset})"
+
+
+def parse_bindings(value):
+    """
+    Parses bindings like "ctrl+alt+k, ctrl+alt+t:cursor:text": a comma-separated list of
+    chords, each optionally followed by a capture mode and a prompt template.
+    An empty mode keeps the default capture mode.
+    """
+    bindings = []
+    for spec in value.split(","):
+        spec = spec.strip()
+        if not spec:
+            continue
+        chord, _, rest = spec.partition(":")
+        mode, _, preset = rest.partition(":")
+        bindings.append(HotkeyBinding(chord.split("+"), capture_mode=mode.strip() or None,
+                                      preset=preset.strip() or "describe"))
+    return bindings
+
+
+class _Node:
+    __slots__ = ("key", "parent", "children", "binding", "next_binding")
+
+    def __init__(self, key=None, parent=None):
+        self.key = key
+        self.parent = parent
+        self.children = {}
+        self.binding = None # Binding completed at this node
+        self.next_binding = None # A binding completed by one more key from here
+
+
+class HotkeyEngine:
+    """
+    Matches key events against any number of bindings.
+
+    The bindings are compiled into a trie keyed by the press order, with one path for every
+    order of a chord's leading keys (modifiers are rarely pressed in a fixed order). The
+    engine keeps one pointer into it: a press follows the child edge (or restarts from the
+    root), a release of a held chord key moves back to the node before it. Each event
+    therefore costs a dict lookup and at most a walk up the (short) chord, independent of
+    how long keys were typed, and nothing is allocated per event.
+    """
+
+    def __init__(self, bindings):
+        """
+        Args:
+            bindings (list[HotkeyBinding]): Bindings to match. A chord must not be a prefix of another.
+        """
+        self.root = _Node()
+        self.bindings = list(bindings)
+        for binding in self.bindings:
+            for leading in itertools.permutations(binding.keys[:-1]):
+                self._insert(leading + binding.keys[-1:], binding)
+        self._node = self.root
+        self._held = set()
+        self._last = None # Last pressed key, to recognize auto-repeat
+
+    def _insert(self, keys, binding):
+        node = self.root
+        for key in keys:
+            if node.binding is not None:
+                raise ValueError(f"{node.binding.name} is a prefix of {binding.name}")
+            node = node.children.setdefault(key, _Node(key, node))
+        if node.binding is not None or node.children:
+            raise ValueError(f"Conflicting hotkeys: {binding.name}")
+        node.binding = binding
+        if node.parent is not self.root and node.parent.next_binding is None:
+            node.parent.next_binding = binding
+
+    @property
+    def armed(self):
+        """The binding one key away from firing given the keys held now, or None."""
+        return self._node.next_binding
+
+    @property
+    def held_keys(self):
+        return self._held
+
+    def press(self, key):
+        """
+        Feeds a key press (a pynput key or a normalized name).
+
+        Returns:
+            HotkeyBinding | None: The binding that fired with this press.
+        """
+        name = normalize_key(key)
+        if name is None or (name == self._last and name in self._held):
+            return None # Unknown key, or auto-repeat of the held key
+        self._last = name
+        self._held.add(name)
+        node = self._node.children.get(name)
+        if node is None:
+            node = self.root.children.get(name, self.root)
+        self._node = node
+        return node.binding
+
+    def release(self, key):
+        """Feeds a key release; returns the normalized key name."""
+        name = normalize_key(key)
+        self._held.discard(name)
+        if name == self._last:
+            self._last = None
+        node = self._node
+        while node is not self.root:
+            if node.key == name:
+                self._node = node.parent
+                break
+            node = node.parent
+        return name
+
+    def reset(self):
+        self._node = self.root
+        self._held.clear()
+        self._last = None
@@ -0,0 +1,283 @@
+import io
+import math
+import os
+
+# Pillow is imported where images are actually touched, so that importing this module
+# (e.g. for the policies) stays cheap.
+
+# Pillow resampling filters that can be selected by name (e.g. from the .env file),
+# mapped to their Image.Resampling member names.
+RESAMPLING_FILTERS = {
+    "nearest": "NEAREST",
+    "bilinear": "BILINEAR",
+    "bicubic": "BICUBIC",
+    "lanczos": "LANCZOS",
+    "box": "BOX",
+    "hamming": "HAMMING",
+}
+
+
+class ImagePrepPolicy:
+    """
+    Describes how a screenshot should be shrunk and encoded before it is sent to a model.
+    """
+
+    def __init__(self, max_long_edge=1500, max_pixels=None, max_image_tokens=None,
+                 patch_size=14, resample="lanczos", quality_ladder=(("JPEG", 85),),
+                 max_bytes=None):
+        """
+        Args:
+            max_long_edge (int, optional): Longest allowed side in pixels. None disables the limit.
+            max_pixels (int, optional): Total pixel budget (width * height). None disables the limit.
+            max_image_tokens (int, optional): Vision token budget. Converted to a pixel budget
+                using patch_size, since vision encoders emit one token per patch.
+            patch_size (int, optional): Side of one vision encoder patch in pixels.
+            resample (str, optional): Name of the resampling filter, see RESAMPLING_FILTERS.
+            quality_ladder (tuple, optional): (format, quality) steps tried in order. The first
+                encoding that fits in max_bytes wins; without max_bytes the first step is used.
+            max_bytes (int, optional): Target upper bound for the encoded image size.
+        """
+        if resample not in RESAMPLING_FILTERS:
+            raise ValueError(f"Unknown resampling filter: {resample}")
+        if not quality_ladder:
+            raise ValueError("quality_ladder needs at least one (format, quality) step.")
+        self.max_long_edge = max_long_edge
+        self.max_pixels = max_pixels
+        self.max_image_tokens = max_image_tokens
+        self.patch_size = patch_size
+        self.resample = resample
+        self.quality_ladder = tuple((fmt.upper(), quality) for fmt, quality in quality_ladder)
+        self.max_bytes = max_bytes
+
+    def with_overrides(self, max_long_edge=None, max_pixels=None, max_image_tokens=None, image_format=None,
+                       quality=None, max_bytes=None, resample=None):
+        """
+        Returns a copy of this policy with the given values replaced; None keeps the policy's own.
+
+        image_format and quality replace the first step of the quality ladder. The later
+        steps are kept, in the new format, where their quality is below the new first step.
+        max_bytes=0 removes the size limit.
+        """
+        ladder = self.quality_ladder
+        if image_format is not None or quality is not None:
+            first_format, first_quality = ladder[0]
+            image_format = (image_format or first_format).upper()
+            quality = first_quality if quality is None else quality
+            ladder = ((image_format, quality),) + tuple(
+                (image_format, step_quality) for _, step_quality in ladder[1:] if step_quality < quality)
+        return ImagePrepPolicy(
+            max_long_edge=self.max_long_edge if max_long_edge is None else max_long_edge,
+            max_pixels=self.max_pixels if max_pixels is None else max_pixels,
+            max_image_tokens=self.max_image_tokens if max_image_tokens is None else max_image_tokens,
+            patch_size=self.patch_size,
+            resample=resample or self.resample,
+            quality_ladder=ladder,
+            max_bytes=self.max_bytes if max_bytes is None else (max_bytes or None),
+        )
+
+    def pixel_budget(self):
+        """Returns the effective pixel budget, combining max_pixels and max_image_tokens."""
+        budgets = []
+        if self.max_pixels:
+            budgets.append(self.max_pixels)
+        if self.max_image_tokens:
+            budgets.append(self.max_image_tokens * self.patch_size * self.patch_size)
+        return min(budgets) if budgets else None
+
+    def image_tokens(self, width, height):
+        """Estimates the vision tokens of an image of this size: one per patch, capped at max_image_tokens."""
+        tokens = math.ceil(width / self.patch_size) * math.ceil(height / self.patch_size)
+        return min(tokens, self.max_image_tokens) if self.max_image_tokens else tokens
+
+    def target_size(self, width, height):
+        """
+        Computes the aspect-preserving output size for an image of the given size.
+        Images are never upscaled.
+        """
+        scale = 1.0
+        if self.max_long_edge and max(width, height) > self.max_long_edge:
+            scale = min(scale, self.max_long_edge / max(width, height))
+        budget = self.pixel_budget()
+        if budget and width * height > budget:
+            scale = min(scale, math.sqrt(budget / (width * height)))
+        if scale >= 1.0:
+            return width, height
+        return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+# Per-model policies, matched by model name prefix (longest prefix wins).
+# llava-style encoders work on 336px tiles, so sending much more than that
+# mostly costs transfer and encoder time without improving the answer.
+MODEL_IMAGE_POLICIES = {
+    "llava": ImagePrepPolicy(max_long_edge=1344, max_image_tokens=2880,
+                             quality_ladder=(("JPEG", 85), ("JPEG", 70), ("JPEG", 55))),
+    "llama3.2-vision": ImagePrepPolicy(max_long_edge=1120,
+                                       quality_ladder=(("JPEG", 85), ("JPEG", 70))),
+}
+
+
+# Policy for models without an entry in MODEL_IMAGE_POLICIES. The lower ladder steps are
+# only used when a max_bytes limit is set.
+DEFAULT_IMAGE_POLICY = ImagePrepPolicy(max_long_edge=1500,
+                                       quality_ladder=(("JPEG", 85), ("JPEG", 70), ("JPEG", 55)))
+
+
+def policy_for_model(model, default=None, **overrides):
+    """
+    Returns the ImagePrepPolicy registered for a model name, or the default policy,
+    with the given overrides applied (see ImagePrepPolicy.with_overrides).
+    """
+    matches = [prefix for prefix in MODEL_IMAGE_POLICIES if model and model.startswith(prefix)]
+    if matches:
+        policy = MODEL_IMAGE_POLICIES[max(matches, key=len)]
+    else:
+        policy = default if default is not None else DEFAULT_IMAGE_POLICY
+    return policy.with_overrides(**overrides) if overrides else policy
+
+
+class PreparedImage:
+    """
+    The encoded image together with the numbers needed to tune the preparation stage.
+    """
+
+    def __init__(self, data, original_size, final_size, image_format, quality, source_bytes):
+        self.data = data
+        self.original_size = original_size
+        self.final_size = final_size
+        self.format = image_format
+        self.quality = quality
+        # Bytes of the input: the encoded size for byte input, raw RGB size otherwise.
+        self.source_bytes = source_bytes
+
+    @property
+    def original_pixels(self):
+        return self.original_size[0] * self.original_size[1]
+
+    @property
+    def final_pixels(self):
+        return self.final_size[0] * self.final_size[1]
+
+    @property
+    def pixels_saved(self):
+        return self.original_pixels - self.final_pixels
+
+    @property
+    def bytes_saved(self):
+        return self.source_bytes - len(self.data)
+
+    def as_dict(self):
+        return {
+            "original_size": list(self.original_size),
+            "final_size": list(self.final_size),
+            "format": self.format,
+            "quality": self.quality,
+            "source_bytes": self.source_bytes,
+            "encoded_bytes": len(self.data),
+            "pixels_saved": self.pixels_saved,
+            "bytes_saved": self.bytes_saved,
+        }
+
+    def __repr__(self):
+        return (f"PreparedImage({self.original_size[0]}x{self.original_size[1]} -> "
+                f"{self.final_size[0]}x{self.final_size[1]} {self.format} q{self.quality}, "
+                f"{len(self.data)} bytes, saved {self.bytes_saved} bytes / {self.pixels_saved} px)")
+
+
+class ImagePreparer:
+    """
+    Downscales and encodes screenshots according to an ImagePrepPolicy.
+    """
+
+    def __init__(self, policy=None):
+        self.policy = policy or ImagePrepPolicy()
+
+    def load(self, image):
+        """Normalizes a file path, encoded bytes or a PIL Image into a PIL Image."""
+        from PIL import Image
+        if isinstance(image, Image.Image):
+            return image
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            return Image.open(io.BytesIO(image))
+        if not os.path.exists(image):
+            raise FileNotFoundError(f"Image not found at: {image}")
+        return Image.open(image)
+
+    @staticmethod
+    def _to_rgb(img):
+        """Flattens alpha onto a white background so the image can be saved as JPEG."""
+        if img.mode == "RGB":
+            return img
+        from PIL import Image
+        if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+            img = img.convert("RGBA")
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.split()[3]) # Use the alpha channel as a mask
+            return background
+        return img.convert("RGB")
+
+    def _encode(self, img, image_format, quality):
+        buffered = io.BytesIO()
+        if image_format == "WEBP":
+            img.save(buffered, format="WEBP", quality=quality, method=4)
+        elif image_format == "PNG":
+            img.save(buffered, format="PNG", compress_level=1)
+        else:
+            img.save(buffered, format="JPEG", quality=quality)
+        return buffered.getvalue()
+
+    def prepare(self, image):
+        """
+        Shrinks and encodes an image for the model.
+
+        Args:
+            image: A file path, encoded image bytes, or an in-memory PIL Image.
+
+        Returns:
+            PreparedImage: The encoded bytes along with pixel and byte savings.
+        """
+        policy = self.policy
+        img = self.load(image)
+        original_size = img.size
+        target_size = policy.target_size(*original_size)
+
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            source_bytes = len(image)
+            # Already-encoded input that fits every limit is passed through untouched,
+            # which avoids a pointless decode/re-encode round trip.
+            fits = policy.max_bytes is None or source_bytes <= policy.max_bytes
+            if target_size == original_size and fits and img.format in ("JPEG", "PNG", "WEBP"):
+                return PreparedImage(bytes(image), original_size, original_size,
+                                     img.format, None, source_bytes)
+        else:
+            source_bytes = original_size[0] * original_size[1] * 3
+
+        if target_size != original_size:
+            # reduce() does a cheap integer box downscale first so the expensive
+            # filter only runs on an image close to the final size.
+            factor = min(original_size[0] // target_size[0], original_size[1] // target_size[1])
+            if factor >= 2:
+                img = img.reduce(factor)
+            from PIL import Image
+            img = img.resize(target_size, Image.Resampling[RESAMPLING_FILTERS[policy.resample]])
+        img = self._to_rgb(img)
+
+        data = None
+        image_format, quality = policy.quality_ladder[0]
+        for image_format, quality in policy.quality_ladder:
+            data = self._encode(img, image_format, quality)
+            if policy.max_bytes is None or len(data) <= policy.max_bytes:
+                break
+
+        return PreparedImage(data, original_size, img.size, image_format, quality, source_bytes)
+
+
+def prepare_file(path, policy):
+    """
+    Prepares one image file with the given policy. A module-level function so it can run
+    in a process pool (batch mode).
+
+    Returns:
+        tuple[bytes, dict]: The encoded image and the PreparedImage report as a dict.
+    """
+    prepared = ImagePreparer(policy).prepare(path)
+    return prepared.data, prepared.as_dict()
@@ -1,135 +1,622 @@
-import requests
-import base64
-import os
+import logging
+import time
+from src.core.backend_pool import BackendPool, parse_hosts
 from src.core.config import AppConfig
-from PIL import Image # Import Pillow
-import io
+from src.core.image_processing import ImagePreparer, PreparedImage, policy_for_model
+from src.core.model_manager import ModelManager
+from src.core.prompts import MIN_ANSWER_TOKENS, PROMPTS
+from src.core.response_cache import ResponseCache, frame_digest
+from src.core.session import SESSION_EXPIRED_MESSAGE
+from src.core.tracing import tracer
+from src.core.transport import (OllamaConnectionError, OllamaTimeoutError,
+                                OllamaTransportError, StreamingJSONBody)
+
+logger = logging.getLogger(__name__)
+
+
+class StreamStats:
+    """
+    Timing measurements for one streamed generation.
+    """
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.first_token_time = None
+        self.end_time = None
+        self.chunk_count = 0
+        self.error = None # Set when the stream ended with an error message
+        self.done = False # Set when the server's final ("done") chunk arrived, i.e. the answer is complete
+        # Ollama reports these in the final chunk (durations are in nanoseconds).
+        self.prompt_eval_count = None # Prompt tokens evaluated; cached prefix tokens are not counted
+        self.eval_count = None
+        self.eval_duration_ns = None
+        self.load_duration_ns = None
+        self.total_duration_ns = None
+        self.context = None # Token ids of the processed prompt and answer, for follow-ups
+
+    def record_chunk(self):
+        if self.first_token_time is None:
+            self.first_token_time = time.perf_counter()
+        self.chunk_count += 1
+
+    def finish(self, final_chunk=None):
+        self.end_time = time.perf_counter()
+        if final_chunk:
+            self.prompt_eval_count = final_chunk.get("prompt_eval_count")
+            self.eval_count = final_chunk.get("eval_count")
+            self.eval_duration_ns = final_chunk.get("eval_duration")
+            self.load_duration_ns = final_chunk.get("load_duration")
+            self.total_duration_ns = final_chunk.get("total_duration")
+            self.context = final_chunk.get("context")
+
+    @property
+    def time_to_first_token(self):
+        """Seconds from sending the request to receiving the first token."""
+        if self.first_token_time is None:
+            return None
+        return self.first_token_time - self.start_time
+
+    @property
+    def load_seconds(self):
+        """Server-side model load time included in this request (0 when the model was resident)."""
+        return self.load_duration_ns / 1e9 if self.load_duration_ns is not None else None
+
+    @property
+    def inference_seconds(self):
+        """Server-side processing time excluding model load."""
+        if self.total_duration_ns is None:
+            return None
+        return (self.total_duration_ns - (self.load_duration_ns or 0)) / 1e9
+
+    @property
+    def tokens_per_second(self):
+        """Decode speed. Prefers the server's eval counters, falls back to wall-clock chunk rate."""
+        if self.eval_count and self.eval_duration_ns:
+            return self.eval_count / (self.eval_duration_ns / 1e9)
+        if self.first_token_time is None or self.end_time is None or self.chunk_count < 2:
+            return None
+        elapsed = self.end_time - self.first_token_time
+        return (self.chunk_count - 1) / elapsed if elapsed > 0 else None
+
+    def as_dict(self):
+        return {
+            "time_to_first_token": self.time_to_first_token,
+            "tokens_per_second": self.tokens_per_second,
+            "chunks": self.chunk_count,
+            "prompt_eval_count": self.prompt_eval_count,
+            "eval_count": self.eval_count,
+            "load_seconds": self.load_seconds,
+            "inference_seconds": self.inference_seconds,
+            "total_time": (self.end_time - self.start_time) if self.end_time else None,
+        }
+
+
+class RequestState:
+    """
+    Measurements of one request. Each request keeps its own, so concurrent requests on a
+    shared LLMInterface (e.g. in the daemon) never mix up their timings or image sizes.
+    """
+
+    def __init__(self):
+        self.timings = {} # Per-stage seconds: encode, serialize, http (which includes base64)
+        self.prepared_image = None
+        self.prompt_tokens = None # Estimated prompt tokens
+        self.stream_stats = None
+
 
 class LLMInterface:
-    def __init__(self, host=AppConfig.OLLAMA_HOST, model=AppConfig.OLLAMA_MODEL):
-        self.host = host
+    def __init__(self, host=None, model=None, image_policy=None, hosts=None):
+        """
+        Args:
+            host (str, optional): A single Ollama base URL to use instead of the configured hosts.
+            model (str, optional): Model name. Defaults to OLLAMA_MODEL.
+            image_policy (ImagePrepPolicy, optional): Overrides the per-model image policy.
+            hosts (list[str], optional): Ollama base URLs to spread requests over.
+                Defaults to OLLAMA_HOSTS, or OLLAMA_HOST when that is empty.
+        """
+        if host:
+            hosts = [host]
+        hosts = hosts or parse_hosts(AppConfig.OLLAMA_HOSTS) or [AppConfig.OLLAMA_HOST]
+        model = model or AppConfig.OLLAMA_MODEL
+        self.host = hosts[0]
         self.model = model
-        self.api_url = AppConfig.get_ollama_api_url("generate")
-        self.pull_url = AppConfig.get_ollama_api_url("pull")
-        self.tags_url = AppConfig.get_ollama_api_url("tags")
-        self.max_image_dim = 1500
-        
-    def _resize_image(self, image_path, max_dim): # max_dim will no longer be used for resizing
+        self.api_url = AppConfig.get_ollama_api_url("generate", self.host)
+        self.pull_url = AppConfig.get_ollama_api_url("pull", self.host)
+        self.tags_url = AppConfig.get_ollama_api_url("tags", self.host)
+        # Pooled keep-alive transports per host; the async ones only open their client on first use.
+        transport_options = dict(connect_timeout=AppConfig.OLLAMA_CONNECT_TIMEOUT,
+                                 read_timeout=AppConfig.OLLAMA_READ_TIMEOUT,
+                                 pool_size=AppConfig.OLLAMA_POOL_SIZE)
+        self.pool = BackendPool(hosts, model, transport_options,
+                                failure_threshold=AppConfig.OLLAMA_FAILURE_THRESHOLD,
+                                reset_timeout=AppConfig.OLLAMA_CIRCUIT_RESET,
+                                probe_interval=AppConfig.OLLAMA_HEALTH_INTERVAL,
+                                hedge_after=AppConfig.OLLAMA_HEDGE_AFTER)
+        # Transports of the first host, for callers that talk to a single server
+        self.transport = self.pool.backends[0].transport
+        self.async_transport = self.pool.backends[0].async_transport
+        self.keep_alive = AppConfig.OLLAMA_KEEP_ALIVE
+        # Context window of the model on the server, for budgeting prompts (0 = unknown)
+        self.context_length = AppConfig.MODEL_CONTEXT_LENGTH
+        # One model manager per host, so every host of the pool stays warm
+        self.model_managers = [ModelManager(backend.transport, model, keep_alive=self.keep_alive,
+                                            heartbeat_interval=AppConfig.OLLAMA_HEARTBEAT_INTERVAL)
+                               for backend in self.pool.backends]
+        self.model_manager = self.model_managers[0]
+        if image_policy is None:
+            image_policy = policy_for_model(
+                model, max_long_edge=AppConfig.IMAGE_MAX_DIM, max_pixels=AppConfig.IMAGE_MAX_PIXELS,
+                max_image_tokens=AppConfig.IMAGE_MAX_TOKENS, image_format=AppConfig.IMAGE_FORMAT,
+                quality=AppConfig.IMAGE_QUALITY, max_bytes=AppConfig.IMAGE_MAX_BYTES,
+                resample=AppConfig.IMAGE_RESAMPLE)
+        self.image_preparer = ImagePreparer(image_policy)
+        # Measurements of the latest finished request, for diagnostics and benchmarks. Requests
+        # work on their own RequestState and only publish it here when they finish.
+        self.last_prepared_image = None
+        self.last_stream_stats = None
+        self.last_timings = {}
+        self.last_prompt_tokens = None
+        # Responses for unchanged screens and queries are served from this cache
+        self.response_cache = None
+        if AppConfig.RESPONSE_CACHE_ENABLED:
+            self.response_cache = ResponseCache(max_entries=AppConfig.RESPONSE_CACHE_MAX_ENTRIES,
+                                                ttl=AppConfig.RESPONSE_CACHE_TTL,
+                                                persist_path=AppConfig.RESPONSE_CACHE_PATH or None)
+
+    def _publish(self, state):
+        """Makes a finished request's measurements available as the last_* attributes."""
+        self.last_timings = state.timings
+        self.last_prepared_image = state.prepared_image
+        self.last_prompt_tokens = state.prompt_tokens
+        self.last_stream_stats = state.stream_stats
+
+    def _prepare_image(self, image):
         """
-        Processes an image, handling RGBA to RGB conversion for JPEG saving,
-        and returns it as bytes. This function does NOT resize the image.
+        Runs the image preparation stage (downscaling and encoding) and returns the
+        PreparedImage, or None if it failed.
+
+        Args:
+            image: A file path, encoded image bytes, an in-memory PIL Image, or a
+                PreparedImage that was already prepared (e.g. by a speculative capture).
         """
+        if isinstance(image, PreparedImage):
+            return image
         try:
-            img = Image.open(image_path)
-            original_width, original_height = img.size
-            print(f"Original image resolution: {original_width}x{original_height}")
-
-            # --- Convert to RGB if the image is RGBA ---
-            if img.mode == 'RGBA':
-                # Create a new blank RGB image with a white background
-                # and paste the RGBA image onto it.
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                background.paste(img, mask=img.split()[3]) # Use the alpha channel as a mask
-                img = background
-                print("Converted RGBA image to RGB for JPEG saving.")
-            else:
-                print("Image is already RGB or non-RGBA, no conversion needed.")
-
-            # The image size is intentionally not changed.
-            # The 'max_dim' parameter is now redundant for its original purpose.
-            print("Image size will not be changed as per requirement.")
-
-            # Convert image to bytes in JPEG format for Ollama
-            buffered = io.BytesIO()
-            img.save(buffered, format="JPEG")
-            return buffered.getvalue()
+            prepared = self.image_preparer.prepare(image)
+        except FileNotFoundError:
+            raise
         except Exception as e:
-            print(f"Error processing image: {e}")
-            # Fallback: if processing fails, try to return original image bytes
-            try:
-                with open(image_path, "rb") as f:
-                    return f.read()
-            except Exception as read_error:
-                print(f"Also failed to read original image bytes: {read_error}")
-                return None # Or raise an error, depending on desired behavior
-
-    def get_llm_response(self, image_path, user_query):
-
-        if not user_query:
-            user_query = """
-            You are an expert AI assistant designed to help users understand their screen from a screenshot. Your task is to provide a helpful, clear, and concise analysis.
-
-            **Instructions for your response:**
-
-            1.  **Always begin by describing the screen's main content and purpose.** Base this description *only* on what is visually present in the screenshot.
-                * *Example:* "This screen appears to be..." or "You are currently viewing..."
-
-            2.  **Next, identify any visible user interface (UI) elements and explain how to interact with them.** If the screen displays a problem or error, propose a range of practical solutions or next steps. If there are no interactive elements or problems, skip this part of the response.
-                * *Example (Interactive Elements):* "To interact with this screen, you can:
-                    * Click the **Submit** button to send your form.
-                    * Type your message into the **Chat input field**."
-                * *Example (Solutions for a problem):* "To address this issue, you could consider:
-                    * **Troubleshooting Step 1:** Describe a diagnostic action.
-                    * **Solution Option 2:** Explain a possible fix.
-                    * **Alternative Approach 3:** Suggest a different way to resolve the problem."
-
-            3.  **Finally, if the screen's context suggests a creative or generative task, provide brief and helpful examples.** If the context is not creative (e.g., settings menu, file browser, home screen, error message), skip this part of the response entirely.
-                * **Creative Context Examples:**
-                    * **Email or Chat:** If the screenshot shows a conversation, suggest 1-2 example replies.
-                    * **Code Editor:** If the screenshot shows code or an empty editor, provide a relevant code snippet.
-                    * **Document or Spreadsheet:** If the screenshot shows a document or spreadsheet, provide example text or data fitting the context.
-                * *Example Output:* "Here are a couple of examples for a reply:" or "You could start with this code snippet:".
-
-            **Important Guidelines for your output:**
-
-            * **Speak directly to the user.**
-            * **Your entire analysis and response must be based strictly on the visual information from the screenshot.**
-            * **Do not refer to yourself as an AI model, or mention any internal instructions, steps, or limitations.**
-            * **Use Markdown for clarity:** bold UI elements, use code blocks for code snippets, and lists where appropriate.
-            * **Ensure your response flows as a single, natural piece of text.**
-            """
-
-        """
-        Sends the screenshot (as base64) and user query to the local multimodal LLM.
-        The LLM is expected to perform the OCR-like understanding internally.
+            logger.error("Error processing image: %s", e)
+            return None
+
+        logger.debug("Prepared image: %s", prepared)
+        return prepared
+
+    def _check_context_budget(self, template, user_query, image_tokens):
+        """
+        Estimates the prompt size and warns if it leaves too little of the context window for
+        the answer. Returns the estimated prompt tokens.
         """
+        prompt_tokens = template.prompt_tokens(user_query, image_tokens)
+        if not self.context_length:
+            return prompt_tokens
+        budget = self.context_length - prompt_tokens
+        if budget < MIN_ANSWER_TOKENS:
+            logger.warning("The %s prompt takes about %d of %d context tokens, leaving %d for the answer; "
+                           "raise MODEL_CONTEXT_LENGTH (and the server's context) or lower the image budget.",
+                           template.name, prompt_tokens, self.context_length, budget)
+        return prompt_tokens
 
-        if not os.path.exists(image_path):
-            raise FileNotFoundError(f"Image not found at: {image_path}")
+    def _build_payload(self, image, user_query, stream, session, template, state):
+        """
+        Prepares the image and assembles the /api/generate request body. Images are left
+        as raw encoded bytes; they are base64-encoded while the body is sent.
+        Returns None if the image could not be prepared.
+        """
+        if image is None and session is not None:
+            return self._build_followup_payload(session, user_query, stream, state)
+        template = PROMPTS.resolve(template, user_query)
 
-        # Resize the image and get its bytes
-        image_bytes = self._resize_image(image_path, self.max_image_dim)
-        encoded_image = base64.b64encode(image_bytes).decode('utf-8')
+        # Downscale and encode the image according to the model's policy
+        stage_start = time.perf_counter()
+        prepared = self._prepare_image(image)
+        state.timings["encode"] = time.perf_counter() - stage_start
+        tracer.record("image_prep", state.timings["encode"])
+        if prepared is None:
+            return None
+        state.prepared_image = prepared
+        if session is not None:
+            session.attach_image(prepared, template.name)
 
-        # The prompt is now simpler, as the LLM directly interprets the image
-        # You can prompt it more generally or ask it to describe visible text.
-        prompt = f"USER: <image>\nBased on this screen, '{user_query}'\nASSISTANT:"
+        # Static instructions first (a prefix the server can reuse), the user's part last
+        system, prompt = template.render(user_query)
+        state.prompt_tokens = self._check_context_budget(
+            template, user_query, self.image_preparer.policy.image_tokens(*prepared.final_size))
+        logger.debug("Model: %s\nTemplate: %s\nPrompt: %s", self.model, template.name, prompt)
 
-        print("\nModel: ", self.model)
-        print("\nPrompt: ", prompt)
+        return {
+            "model": self.model,
+            "system": system,
+            "prompt": prompt,
+            "images": [prepared.data],
+            "stream": stream,
+            # Keeps the model resident between hotkey presses
+            "keep_alive": self.keep_alive,
+        }
 
+    def _build_followup_payload(self, session, user_query, stream, state):
+        """
+        Assembles the /api/generate request body for a follow-up question in a session.
+
+        With the context of the previous answer the request carries only the new question;
+        Ollama continues from the already processed image and conversation. Without one
+        (the previous answer came from the response cache, or the context grew past the
+        session limit) the prepared image is sent again with a recap of the conversation.
+        """
+        if not session.can_follow_up:
+            return None
+        state.timings["encode"] = 0.0
         payload = {
             "model": self.model,
-            "prompt": prompt,
-            "images": [encoded_image],
-            "stream": False
+            "stream": stream,
+            "keep_alive": self.keep_alive,
         }
+        if session.context is not None:
+            # The context already holds the system prompt and image
+            payload["prompt"] = user_query
+            payload["context"] = session.context
+            tracer.increment("session_context_reused")
+        else:
+            payload["images"] = [session.image.data]
+            payload["system"] = PROMPTS.resolve(session.template).system
+            payload["prompt"] = f"Earlier questions about this screen:\n{session.recap()}\n\n{user_query}"
+            tracer.increment("session_image_resent")
+        logger.debug("Model: %s\nFollow-up prompt: %s", self.model, payload["prompt"])
+        return payload
+
+    def _build_body(self, image, user_query, stream, session, template, state):
+        """
+        Builds the /api/generate payload as a StreamingJSONBody: the JSON fields are
+        serialized now, the images are base64-encoded chunk by chunk as the body is sent,
+        so no full base64 or JSON copy of an image is ever held. Measurements go to state.
+        Returns None if the image could not be prepared.
+        """
+        payload = self._build_payload(image, user_query, stream, session, template, state)
+        if payload is None:
+            return None
+        stage_start = time.perf_counter()
+        body = StreamingJSONBody(payload, payload.pop("images", ()))
+        state.timings["serialize"] = time.perf_counter() - stage_start
+        tracer.record("request_build", state.timings["serialize"], body_bytes=len(body),
+                      image_bytes=len(state.prepared_image.data) if state.prepared_image else None)
+        return body
 
-        headers = {'Content-Type': 'application/json'}
+    def warm_up(self, start_heartbeat=True):
+        """
+        Makes sure the model is pulled and loaded on every host before the first real
+        request, and optionally starts the heartbeats that re-warm it after idle eviction
+        along with the pool's health checks.
 
-        try:
-            print("\nAPI URL: ", self.api_url)
-            print("\nAPI Headers: ", headers)
-            # print("\nPayload: ", payload)
-            response = requests.post(self.api_url, headers=headers, json=payload, timeout=1000)
-            response.raise_for_status()
-            result = response.json()
-            return result.get("response", "No response from LLM.")
-        except requests.exceptions.ConnectionError:
+        Returns:
+            WarmupReport: Availability, pull and load-time details of the first host that
+                could be warmed (or of the first host if none could).
+        """
+        self.pool.probe_all()
+        reports = [manager.warm_up() for manager in self.model_managers]
+        if start_heartbeat:
+            for manager in self.model_managers:
+                manager.start_heartbeat()
+            if len(self.pool.backends) > 1:
+                self.pool.start_health_checks()
+        return next((report for report in reports if report.loaded), reports[0])
+
+    def _trace_request(self, stats, state):
+        """Records network time and Ollama's own load/inference timings with the tracer."""
+        if not tracer.enabled:
+            return
+        tracer.record("network", state.timings.get("http"), model=self.model)
+        tracer.record("ttft", stats.time_to_first_token)
+        tracer.record("model_load", stats.load_seconds)
+        tracer.record("inference", stats.inference_seconds, eval_count=stats.eval_count,
+                      tokens_per_second=stats.tokens_per_second)
+        if stats.prompt_eval_count:
+            tracer.increment("prompt_eval_tokens", stats.prompt_eval_count)
+        if stats.eval_count:
+            tracer.increment("eval_tokens", stats.eval_count)
+        if stats.error:
+            tracer.increment("request_errors")
+
+    @staticmethod
+    def _error_message(e):
+        """Turns a transport error into the message shown to the user."""
+        if isinstance(e, OllamaConnectionError):
             return "Could not connect to Ollama server. Make sure it's running."
-        except requests.exceptions.Timeout:
+        if isinstance(e, OllamaTimeoutError):
             return "Ollama server timed out. Model inference might be slow."
-        except requests.exceptions.RequestException as e:
+        if isinstance(e, OllamaTransportError):
             return f"Error communicating with Ollama: {e}"
+        return f"An unexpected error occurred: {e}"
+
+    def _cache_key(self, image, user_query, image_hash=None, template=None):
+        """Returns the response cache key for a request, or None if caching is off or not possible."""
+        if self.response_cache is None:
+            return None
+        if image_hash is None:
+            try:
+                if isinstance(image, PreparedImage):
+                    image = image.data
+                if isinstance(image, (str, bytes, bytearray, memoryview)):
+                    image = self.image_preparer.load(image)
+                image_hash = frame_digest(image)
+            except Exception as e:
+                logger.warning("Could not hash image for the response cache: %s", e)
+                return None
+        return ResponseCache.make_key(image_hash, user_query, self.model, PROMPTS.resolve(template, user_query).name)
+
+    def _cached_response(self, cache_key, on_token=None):
+        """Returns the cached response for cache_key (passing it to on_token), or None."""
+        if cache_key is None:
+            return None
+        cached = self.response_cache.get(cache_key)
+        if cached is None:
+            tracer.increment("response_cache_miss")
+            return None
+        tracer.increment("response_cache_hit")
+        logger.info("Response cache hit: %s", self.response_cache.stats())
+        if on_token is not None:
+            on_token(cached)
+        return cached
+
+    def _record_cached_turn(self, session, image, user_query, response, template=None):
+        """Records a response served from the cache in session; prepares the image it will need for follow-ups."""
+        if session is None:
+            return
+        if session.image is None:
+            prepared = self._prepare_image(image)
+            if prepared is not None:
+                session.attach_image(prepared, PROMPTS.resolve(template, user_query).name)
+        session.record(user_query, response) # No context: the first follow-up sends the image
+
+    def get_llm_response(self, image, user_query, on_token=None, image_hash=None, session=None, template=None):
+        """
+        Sends the screenshot (base64-encoded while the request is sent) and user query to the local multimodal LLM.
+        The LLM is expected to perform the OCR-like understanding internally.
+
+        Args:
+            image: A screenshot file path, encoded image bytes, or an in-memory PIL Image.
+                None asks a follow-up question in session about the screen it already holds.
+            user_query (str): The question about the screen. Falls back to the template's question.
+            on_token (callable, optional): If given, the response is streamed and every text
+                chunk is passed to this callback as it arrives.
+            image_hash (str, optional): Precomputed frame_digest of the screen, e.g. from the raw
+                capture buffer. Computed from the image when the response cache needs it.
+            session (AnalysisSession, optional): Records the question, the answer and the
+                returned model context, so later follow-ups can skip the image.
+            template (str, optional): Name of the prompt template in PROMPTS. Defaults to
+                "describe" without a query and "ask" with one.
+
+        Returns:
+            str: The complete response text, or an error message.
+        """
+        if image is None and (session is None or not session.can_follow_up):
+            return SESSION_EXPIRED_MESSAGE
+        # Follow-ups depend on the conversation, so only first questions use the response cache
+        cache_key = self._cache_key(image, user_query, image_hash, template) if image is not None else None
+        cached = self._cached_response(cache_key, on_token)
+        if cached is not None:
+            self._record_cached_turn(session, image, user_query, cached, template)
+            return cached
+
+        if on_token is not None:
+            stats = StreamStats()
+            chunks = []
+            for chunk in self.stream_llm_response(image, user_query, stats=stats, session=session, template=template):
+                chunks.append(chunk)
+                on_token(chunk)
+            response = "".join(chunks)
+            # Only complete answers are cached, never error messages or a stream cut short
+            if cache_key is not None and stats.done and not stats.error:
+                self.response_cache.put(cache_key, response)
+            return response
+
+        state = RequestState()
+        body = self._build_body(image, user_query, False, session, template, state)
+        if body is None:
+            return "Could not prepare the screenshot for the LLM."
+
+        request_start = time.perf_counter()
+        try:
+            result = self.pool.post_json("generate", body)
+        except Exception as e:
+            return self._error_message(e)
+        finally:
+            state.timings["http"] = time.perf_counter() - request_start
+            self._publish(state)
+
+        stats = StreamStats()
+        stats.finish(result)
+        self._trace_request(stats, state)
+        response = result.get("response")
+        if response is None:
+            return "No response from LLM."
+        if cache_key is not None:
+            self.response_cache.put(cache_key, response)
+        if session is not None:
+            session.record(user_query, response, result.get("context"))
+        return response
+
+    def _consume_chunk(self, chunk, stats):
+        """
+        Handles one streamed /api/generate object.
+        Returns (text, done); text is an error message if the server reported one.
+        """
+        if chunk.get("error"):
+            stats.error = chunk["error"]
+            return f"Error from Ollama: {chunk['error']}", True
+        text = chunk.get("response", "")
+        if text:
+            stats.record_chunk()
+        if chunk.get("done"):
+            stats.done = True
+            stats.finish(chunk)
+            return text, True
+        return text, False
+
+    def stream_llm_response(self, image, user_query, stats=None, session=None, template=None):
+        """
+        Streams the LLM response as it is generated.
+
+        Ollama answers a streaming request with newline-delimited JSON objects, each holding
+        a "response" text fragment; the last one has "done": true plus the eval counters.
+        Time-to-first-token and tokens/sec are collected in stats (and self.last_stream_stats
+        once the stream ends).
+
+        Args:
+            image: A screenshot file path, encoded image bytes, or an in-memory PIL Image.
+            user_query (str): The question about the screen. Falls back to the template's question.
+            stats (StreamStats, optional): Collects the timings instead of a fresh StreamStats.
+            session (AnalysisSession, optional): Records the turn once the stream completes;
+                with image None the query is a follow-up in the session.
+            template (str, optional): Name of the prompt template, as for get_llm_response.
+
+        Yields:
+            str: Response text fragments. Errors are yielded as a single message fragment.
+        """
+        state = RequestState()
+        body = self._build_body(image, user_query, True, session, template, state)
+        if body is None:
+            if stats is not None:
+                stats.error = "Could not prepare the screenshot for the LLM."
+            yield "Could not prepare the screenshot for the LLM."
+            return
+
+        stats = state.stream_stats = stats or StreamStats()
+
+        texts = []
+        try:
+            for chunk in self.pool.iter_ndjson("generate", body):
+                text, done = self._consume_chunk(chunk, stats)
+                if text:
+                    texts.append(text)
+                    yield text
+                if done:
+                    if session is not None and not stats.error:
+                        session.record(user_query, "".join(texts), stats.context)
+                    break
+        except Exception as e:
+            stats.error = str(e)
+            yield self._error_message(e)
+        finally:
+            if stats.end_time is None:
+                stats.finish()
+            state.timings["http"] = stats.end_time - stats.start_time
+            self._publish(state)
+            self._trace_request(stats, state)
+            logger.info("Stream stats: %s", stats.as_dict())
+
+    async def aget_llm_response(self, image, user_query, on_token=None, image_hash=None, session=None, template=None):
+        """
+        asyncio variant of get_llm_response. Several calls can run concurrently on one
+        event loop, and cancelling the awaiting task aborts the HTTP request immediately,
+        which makes Ollama stop the generation. Image hashing and preparation run in a
+        worker thread so they do not block the loop.
+        """
+        import asyncio
+        if image is None and (session is None or not session.can_follow_up):
+            return SESSION_EXPIRED_MESSAGE
+        cache_key = None
+        if image is not None:
+            cache_key = await asyncio.to_thread(self._cache_key, image, user_query, image_hash, template)
+        cached = self._cached_response(cache_key, on_token)
+        if cached is not None:
+            await asyncio.to_thread(self._record_cached_turn, session, image, user_query, cached, template)
+            return cached
+
+        if on_token is not None:
+            stats = StreamStats()
+            chunks = []
+            async for chunk in self.astream_llm_response(image, user_query, stats=stats, session=session,
+                                                         template=template):
+                chunks.append(chunk)
+                on_token(chunk)
+            response = "".join(chunks)
+            # Only complete answers are cached, never error messages or a stream cut short
+            if cache_key is not None and stats.done and not stats.error:
+                self.response_cache.put(cache_key, response)
+            return response
+
+        state = RequestState()
+        body = await asyncio.to_thread(self._build_body, image, user_query, False, session, template, state)
+        if body is None:
+            return "Could not prepare the screenshot for the LLM."
+
+        request_start = time.perf_counter()
+        try:
+            result = await self.pool.apost_json("generate", body)
         except Exception as e:
-            return f"An unexpected error occurred: {e}"
+            return self._error_message(e)
+        finally:
+            state.timings["http"] = time.perf_counter() - request_start
+            self._publish(state)
+
+        stats = StreamStats()
+        stats.finish(result)
+        self._trace_request(stats, state)
+        response = result.get("response")
+        if response is None:
+            return "No response from LLM."
+        if cache_key is not None:
+            self.response_cache.put(cache_key, response)
+        if session is not None:
+            session.record(user_query, response, result.get("context"))
+        return response
+
+    async def astream_llm_response(self, image, user_query, stats=None, session=None, template=None):
+        """
+        asyncio variant of stream_llm_response; asynchronously yields response text fragments.
+        """
+        import asyncio
+        state = RequestState()
+        body = await asyncio.to_thread(self._build_body, image, user_query, True, session, template, state)
+        if body is None:
+            if stats is not None:
+                stats.error = "Could not prepare the screenshot for the LLM."
+            yield "Could not prepare the screenshot for the LLM."
+            return
+
+        stats = state.stream_stats = stats or StreamStats()
+
+        texts = []
+        stream = self.pool.aiter_ndjson("generate", body)
+        try:
+            async for chunk in stream:
+                text, done = self._consume_chunk(chunk, stats)
+                if text:
+                    texts.append(text)
+                    yield text
+                if done:
+                    if session is not None and not stats.error:
+                        session.record(user_query, "".join(texts), stats.context)
+                    break
+        except Exception as e:
+            stats.error = str(e)
+            yield self._error_message(e)
+        finally:
+            await stream.aclose() # Hands the connection back (or aborts the generation) right away
+            if stats.end_time is None:
+                stats.finish()
+            state.timings["http"] = stats.end_time - stats.start_time
+            self._publish(state)
+            self._trace_request(stats, state)
+
+    def close(self):
+        """Stops the heartbeats and health checks and closes the pooled connections of the synchronous transports."""
+        for manager in self.model_managers:
+            manager.stop_heartbeat()
+        self.pool.close()
+
+    async def aclose(self):
+        """Stops the heartbeats and health checks and closes the pooled connections of all transports."""
+        for manager in self.model_managers:
+            manager.stop_heartbeat()
+        await self.pool.aclose()
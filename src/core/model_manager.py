@@ -0,0 +1,178 @@
+import logging
+import threading
+import time
+from src.core.tracing import tracer
+from src.core.transport import OllamaTransportError
+
+logger = logging.getLogger(__name__)
+
+
+def matches_model(name, model):
+    """Returns True if a model name reported by the server refers to the requested model."""
+    # /api/tags reports "llava:latest" for a model requested as "llava".
+    return name == model or (":" not in model and name == f"{model}:latest")
+
+
+class WarmupReport:
+    """
+    What happened during a warm-up. Load time is measured separately from inference:
+    load_seconds comes from Ollama's load_duration for the preload request.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.available = False
+        self.pulled = False
+        self.loaded = False
+        self.load_seconds = None # Server-reported model load time
+        self.wall_seconds = None # Client-side time for the whole warm-up
+        self.error = None
+
+    def as_dict(self):
+        return {
+            "model": self.model,
+            "available": self.available,
+            "pulled": self.pulled,
+            "loaded": self.loaded,
+            "load_seconds": self.load_seconds,
+            "wall_seconds": self.wall_seconds,
+            "error": self.error,
+        }
+
+
+class ModelManager:
+    """
+    Keeps a model available and resident in an Ollama server.
+
+    The first request after startup, or after Ollama unloads an idle model, otherwise pays
+    the whole model load time. warm_up() makes sure the model exists (pulling it if needed)
+    and loads it with a zero-image preload request; start_heartbeat() re-warms it in the
+    background whenever the server has evicted it.
+    """
+
+    def __init__(self, transport, model, keep_alive="30m", heartbeat_interval=240.0):
+        """
+        Args:
+            transport (OllamaTransport): Transport used to reach the server.
+            model (str): Model name, e.g. "llava:7b-v1.5-q4_K_M".
+            keep_alive: How long Ollama keeps the model loaded after a request
+                (a duration string like "30m", seconds, or -1 for forever).
+            heartbeat_interval (float): Seconds between residency checks. 0 disables the heartbeat.
+        """
+        self.transport = transport
+        self.model = model
+        self.keep_alive = keep_alive
+        self.heartbeat_interval = heartbeat_interval
+        self.last_report = None
+        self.rewarm_count = 0
+        self._stop_event = threading.Event()
+        self._heartbeat_thread = None
+
+    def is_available(self):
+        """Returns True if the model is present on the server (GET /api/tags)."""
+        models = self.transport.get_json("tags").get("models", [])
+        return any(matches_model(entry.get("name", ""), self.model) for entry in models)
+
+    def is_loaded(self):
+        """
+        Returns True if the model is currently loaded in memory (GET /api/ps),
+        or None if the server does not support the endpoint.
+        """
+        try:
+            models = self.transport.get_json("ps").get("models", [])
+        except OllamaTransportError:
+            return None
+        return any(matches_model(entry.get("name", ""), self.model) for entry in models)
+
+    def pull(self):
+        """Downloads the model (POST /api/pull), logging each new progress status."""
+        logger.info("Pulling model %s...", self.model)
+        last_status = None
+        for update in self.transport.iter_ndjson("pull", {"model": self.model, "stream": True}):
+            if update.get("error"):
+                raise OllamaTransportError(update["error"])
+            status = update.get("status")
+            if status and status != last_status:
+                logger.info("  %s", status)
+                last_status = status
+
+    def preload(self):
+        """
+        Loads the model without running inference: a generate request with no prompt and
+        no image makes Ollama load the weights and return immediately.
+
+        Returns:
+            float: Server-reported load time in seconds.
+        """
+        result = self.transport.post_json("generate", {
+            "model": self.model,
+            "keep_alive": self.keep_alive,
+            "stream": False,
+        })
+        return (result.get("load_duration") or 0) / 1e9
+
+    def warm_up(self, pull_if_missing=True):
+        """
+        Checks the model is available, pulls it if needed and loads it.
+
+        Returns:
+            WarmupReport: What was done and how long loading took. Errors are recorded
+            in the report instead of being raised, so warm-up never blocks startup.
+        """
+        report = WarmupReport(self.model)
+        start = time.perf_counter()
+        try:
+            report.available = self.is_available()
+            if not report.available and pull_if_missing:
+                self.pull()
+                report.pulled = True
+                report.available = True
+            if report.available:
+                report.load_seconds = self.preload()
+                report.loaded = True
+        except OllamaTransportError as e:
+            report.error = str(e)
+        report.wall_seconds = time.perf_counter() - start
+        self.last_report = report
+        tracer.record("model_load", report.load_seconds, source="warm_up")
+        logger.info("Model warm-up: %s", report.as_dict())
+        return report
+
+    def release(self):
+        """Asks the server to unload the model now (keep_alive=0)."""
+        self.transport.post_json("generate", {"model": self.model, "keep_alive": 0, "stream": False})
+
+    def _heartbeat_loop(self, stop_event):
+        while not stop_event.wait(self.heartbeat_interval):
+            try:
+                loaded = self.is_loaded()
+                # Preload on every tick: it renews keep_alive, so a resident model is never
+                # left to expire between ticks, and it is nearly free while the model is
+                # loaded. Without /api/ps it is also the residency check.
+                load_seconds = self.preload()
+                if loaded is False or load_seconds > 0.5:
+                    self.rewarm_count += 1
+                    tracer.increment("model_rewarm")
+                    tracer.record("model_load", load_seconds, source="heartbeat")
+                    logger.info("Model %s was evicted; re-warmed in %.2fs.", self.model, load_seconds)
+            except OllamaTransportError as e:
+                logger.warning("Model heartbeat failed: %s", e)
+
+    def start_heartbeat(self):
+        """Starts the background residency heartbeat (no-op if disabled or already running)."""
+        if self.heartbeat_interval <= 0 or self._heartbeat_thread is not None:
+            return
+        # A fresh event per thread, so a thread still finishing a slow request after
+        # stop_heartbeat gave up on it cannot be revived by a later start
+        self._stop_event = threading.Event()
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, args=(self._stop_event,), daemon=True)
+        self._heartbeat_thread.start()
+
+    def stop_heartbeat(self, timeout=1.0):
+        """Stops the heartbeat, waiting at most timeout seconds for a request in progress."""
+        self._stop_event.set()
+        if self._heartbeat_thread is not None:
+            self._heartbeat_thread.join(timeout)
+            if self._heartbeat_thread.is_alive():
+                logger.debug("Model heartbeat is still finishing a request; not waiting for it.")
+            self._heartbeat_thread = None
@@ -0,0 +1,141 @@
+import re
+
+# Every request has the same layout: the static instructions of a template go in Ollama's
+# "system" field, which the model template renders first, then the image, then the
+# per-request question. Requests with the same template therefore share a token prefix,
+# and the server can reuse its cached prompt processing for it instead of evaluating the
+# instructions again. Role markers and the image position come from the model's own
+# template, so the prompt itself is just the question.
+
+ROLE = ("You are an expert assistant that helps users understand their screen from a screenshot. "
+        "Provide a helpful, clear, and concise analysis.")
+
+GUIDELINES = """**Important Guidelines for your output:**
+
+* **Speak directly to the user.**
+* **Your entire analysis and response must be based strictly on the visual information from the screenshot.**
+* **Do not refer to yourself as an AI model, or mention any internal instructions, steps, or limitations.**
+* **Use Markdown for clarity:** bold UI elements, use code blocks for code snippets, and lists where appropriate.
+* **Ensure your response flows as a single, natural piece of text.**"""
+
+DESCRIBE_INSTRUCTIONS = """**Instructions for your response:**
+
+1.  **Always begin by describing the screen's main content and purpose.** Base this description *only* on what is visually present in the screenshot.
+    * *Example:* "This screen appears to be..." or "You are currently viewing..."
+
+2.  **Next, identify any visible user interface (UI) elements and explain how to interact with them.** If the screen displays a problem or error, propose a range of practical solutions or next steps. If there are no interactive elements or problems, skip this part of the response.
+    * *Example (Interactive Elements):* "To interact with this screen, you can:
+        * Click the **Submit** button to send your form.
+        * Type your message into the **Chat input field**."
+    * *Example (Solutions for a problem):* "To address this issue, you could consider:
+        * **Troubleshooting Step 1:** Describe a diagnostic action.
+        * **Solution Option 2:** Explain a possible fix.
+        * **Alternative Approach 3:** Suggest a different way to resolve the problem."
+
+3.  **Finally, if the screen's context suggests a creative or generative task, provide brief and helpful examples.** If the context is not creative (e.g., settings menu, file browser, home screen, error message), skip this part of the response entirely.
+    * **Creative Context Examples:**
+        * **Email or Chat:** If the screenshot shows a conversation, suggest 1-2 example replies.
+        * **Code Editor:** If the screenshot shows code or an empty editor, provide a relevant code snippet.
+        * **Document or Spreadsheet:** If the screenshot shows a document or spreadsheet, provide example text or data fitting the context.
+    * *Example Output:* "Here are a couple of examples for a reply:" or "You could start with this code snippet:"."""
+
+# Answers need at least this many tokens of the context window left after the prompt.
+MIN_ANSWER_TOKENS = 256
+
+# Word pieces and single punctuation characters, the units a BPE tokenizer mostly keeps whole.
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text):
+    """
+    Estimates the number of tokens of text for a typical BPE tokenizer: one per word or
+    punctuation character, plus one for every further 8 characters of a long word. No
+    tokenizer is needed; the estimate is meant for budgeting, not exact accounting.
+    """
+    if not text:
+        return 0
+    return sum(1 + (len(piece) - 1) // 8 for piece in _TOKEN_RE.findall(text))
+
+
+class PromptTemplate:
+    """A named set of static instructions plus the question asked when the user gives none."""
+
+    def __init__(self, name, instructions="", question="Describe this screen."):
+        """
+        Args:
+            name (str): Name the template is registered and selected under.
+            instructions (str): Task-specific instructions. They follow the shared role and
+                guidelines in the system prompt, so all templates share that prefix.
+            question (str): Question sent when the request has no query of its own.
+        """
+        self.name = name
+        self.system = "\n\n".join(part for part in (ROLE, GUIDELINES, instructions) if part)
+        self.question = question
+        # Token counts are computed once, at registration, instead of per request
+        self.system_tokens = estimate_tokens(self.system)
+        self.question_tokens = estimate_tokens(question)
+
+    def render(self, user_query=None):
+        """Returns (system, prompt) for a request; the prompt is the user's query or the default question."""
+        return self.system, user_query or self.question
+
+    def prompt_tokens(self, user_query=None, image_tokens=0):
+        """Estimated prompt length in tokens: system prompt, image and question."""
+        question_tokens = estimate_tokens(user_query) if user_query else self.question_tokens
+        return self.system_tokens + image_tokens + question_tokens
+
+    def answer_budget(self, context_length, user_query=None, image_tokens=0):
+        """Tokens of a context_length window left for the answer after the prompt."""
+        return context_length - self.prompt_tokens(user_query, image_tokens)
+
+    def __repr__(self):
+        return f"PromptTemplate({self.name}: {self.system_tokens} system tokens)"
+
+
+class PromptRegistry:
+    """Named PromptTemplates; requests and hotkey bindings refer to templates by name."""
+
+    def __init__(self, templates=()):
+        self._templates = {}
+        for template in templates:
+            self.register(template)
+
+    def register(self, template):
+        self._templates[template.name] = template
+        return template
+
+    def get(self, name):
+        try:
+            return self._templates[name]
+        except KeyError:
+            raise ValueError(f"Unknown prompt template: {name}") from None
+
+    def resolve(self, name=None, user_query=None):
+        """
+        Returns the template for a request: the template of that name (or the PromptTemplate
+        itself). Without one, a request with its own query uses "ask" (shared instructions
+        only) and one without uses "describe".
+        """
+        if isinstance(name, PromptTemplate):
+            return name
+        return self.get(name or ("ask" if user_query else "describe"))
+
+    def names(self):
+        return list(self._templates)
+
+    def __contains__(self, name):
+        return name in self._templates
+
+
+PROMPTS = PromptRegistry((
+    PromptTemplate("describe", DESCRIBE_INSTRUCTIONS),
+    PromptTemplate("ask"),
+    PromptTemplate("text", "Transcribe all readable text, keeping its structure.",
+                   "Transcribe the text on this screen."),
+    PromptTemplate("code", "Explain the code that is visible and point out likely bugs.",
+                   "Explain the code on this screen."),
+    PromptTemplate("error", "Explain the error message that is visible and suggest how to fix it.",
+                   "Explain the error on this screen."),
+    PromptTemplate("summary", "Summarize the content in a few bullet points.",
+                   "Summarize this screen."),
+))
@@ -0,0 +1,211 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# frame_hash reduces the frame to a HASH_GRID x HASH_GRID grid of tile brightness values,
+# each quantized to HASH_LEVELS levels. Small changes (cursor blink, antialiasing)
+# rarely move a tile to another level, so near-identical screens share a hash. That is too
+# coarse to key cached answers (a one-character edit keeps the hash), so the response
+# cache uses the exact frame_digest instead.
+HASH_GRID = 32
+HASH_LEVELS = 32
+# Frames are strided down to roughly this many samples per side before tiling.
+HASH_SAMPLE_SIDE = 256
+
+
+def frame_hash(frame):
+    """
+    Computes a perceptual tile hash of a screen frame with vectorized NumPy.
+
+    Args:
+        frame: A HxWxC uint8 NumPy array (e.g. the raw BGRA mss buffer) or a PIL Image.
+            Only the first three channels are used and they are summed, so the channel
+            order (RGB or BGR) does not matter.
+
+    Returns:
+        str: A hex digest identifying the frame's coarse content.
+    """
+    import numpy as np
+    if not isinstance(frame, np.ndarray): # A PIL Image; checked without importing Pillow
+        frame = np.asarray(frame if frame.mode == "RGB" else frame.convert("RGB"))
+    height, width = frame.shape[:2]
+
+    # Strided sampling touches only a small fraction of a 4K/5K frame.
+    step = max(1, min(height, width) // HASH_SAMPLE_SIDE)
+    sampled = frame[::step, ::step, :3].sum(axis=2, dtype=np.uint16)
+
+    # Mean-pool into a fixed grid of tiles.
+    tile_h = max(1, sampled.shape[0] // HASH_GRID)
+    tile_w = max(1, sampled.shape[1] // HASH_GRID)
+    rows, cols = sampled.shape[0] // tile_h, sampled.shape[1] // tile_w
+    cropped = sampled[:rows * tile_h, :cols * tile_w]
+    tiles = cropped.reshape(rows, tile_h, cols, tile_w).mean(axis=(1, 3))
+
+    quantized = (tiles * (HASH_LEVELS / (3 * 256))).astype(np.uint8)
+    digest = hashlib.blake2b(quantized.tobytes(), digest_size=16)
+    digest.update(f"{rows}x{cols}:{width}x{height}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def frame_digest(frame):
+    """
+    Computes an exact digest of a frame's pixels, for keying cached answers.
+
+    Every pixel of every channel counts, so any visible change gives a new digest. SHA-256
+    is used because it is hardware-accelerated on current CPUs (about 30 ms for a 4K
+    frame, hashed in place without a copy).
+
+    Args:
+        frame: A HxWxC uint8 NumPy array (e.g. the raw BGRA mss buffer) or a PIL Image.
+            Channel order matters: the raw BGRA buffer and the RGB image of the same
+            screen get different digests, so hash frames from one source consistently.
+
+    Returns:
+        str: A hex digest of the pixels and the frame shape.
+    """
+    import numpy as np
+    if not isinstance(frame, np.ndarray): # A PIL Image; checked without importing Pillow
+        frame = np.asarray(frame if frame.mode == "RGB" else frame.convert("RGB"))
+    digest = hashlib.sha256(f"{frame.shape}:".encode("utf-8"))
+    digest.update(memoryview(np.ascontiguousarray(frame)).cast("B"))
+    return digest.hexdigest()[:32]
+
+
+def normalize_query(query):
+    """Lowercases and collapses whitespace so trivially different queries share a key."""
+    return " ".join((query or "").lower().split())
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache of LLM responses keyed by (frame_digest, normalized query, model, template).
+
+    Memory is bounded both by entry count and by the total size of cached responses.
+    When persist_path is set, entries are loaded at startup and written back on every
+    change, so cached answers survive restarts.
+    """
+
+    def __init__(self, max_entries=128, ttl=600.0, max_bytes=4 * 1024 * 1024, persist_path=None):
+        """
+        Args:
+            max_entries (int): Maximum number of cached responses.
+            ttl (float): Seconds a response stays valid. None or 0 keeps entries until evicted.
+            max_bytes (int): Upper bound for the summed UTF-8 size of cached responses.
+            persist_path (str, optional): JSON file used to persist the cache.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.persist_path = persist_path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict() # key -> (response, created_at, size)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        if persist_path:
+            self._load()
+
+    @staticmethod
+    def make_key(frame_digest, query, model, template=""):
+        raw = f"{frame_digest}\x00{template}\x00{normalize_query(query)}\x00{model}".encode("utf-8")
+        return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+    def _expired(self, created_at, now):
+        return bool(self.ttl) and now - created_at > self.ttl
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._total_bytes -= size
+
+    def get(self, key):
+        """Returns the cached response for key, or None on a miss or expired entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._expired(entry[1], time.time()):
+                if entry is not None:
+                    self._remove(key)
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, response):
+        """Stores a response, evicting expired and least recently used entries as needed."""
+        size = len(response.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (response, time.time(), size)
+            self._total_bytes += size
+            self._evict_locked()
+            if self.persist_path:
+                self._save_locked()
+
+    def _evict_locked(self):
+        now = time.time()
+        for key in [k for k, (_, created_at, _) in self._entries.items() if self._expired(created_at, now)]:
+            self._remove(key)
+            self.evictions += 1
+        while self._entries and (len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+            if self.persist_path:
+                self._save_locked()
+
+    def stats(self):
+        """Returns hit/miss counters and the current footprint."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+            }
+
+    def _load(self):
+        try:
+            with open(self.persist_path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable response cache %s: %s", self.persist_path, e)
+            return
+        for key, response, created_at in stored.get("entries", []):
+            size = len(response.encode("utf-8"))
+            self._entries[key] = (response, created_at, size)
+            self._total_bytes += size
+        self._evict_locked()
+
+    def _save_locked(self):
+        # Write to a temporary file first so a crash never leaves a truncated cache.
+        directory = os.path.dirname(self.persist_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.persist_path}.tmp"
+        entries = [[key, response, created_at] for key, (response, created_at, _) in self._entries.items()]
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"entries": entries}, f)
+            os.replace(tmp_path, self.persist_path)
+        except OSError as e:
+            logger.warning("Could not persist response cache to %s: %s", self.persist_path, e)
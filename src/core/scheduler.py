@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from src.core.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Scheduling policies
+LATEST_WINS = "latest_wins" # A new trigger cancels the running job and replaces queued ones
+QUEUE = "queue" # Triggers run in order; the oldest waiting job is dropped when the queue is full
+
+
+class _Job:
+    def __init__(self, job_id, job_fn):
+        self.job_id = job_id
+        self.job_fn = job_fn
+        self.submitted_at = time.perf_counter()
+
+
+class AnalysisScheduler:
+    """
+    Runs analysis jobs one at a time on a single worker thread with its own asyncio loop.
+
+    Jobs are coroutine functions taking the job id. The worker waits coalesce_window after a
+    trigger before starting, so a burst of triggers settles first. Under the latest-wins
+    policy only the newest trigger of the burst runs (the others count as coalesced), and a
+    new trigger also cancels the job in flight; since jobs await the async Ollama transport,
+    cancelling the task closes the HTTP connection and Ollama stops generating. Under the
+    queue policy every trigger runs, in order, so the window only delays the first job.
+    """
+
+    def __init__(self, policy=LATEST_WINS, max_queue=4, coalesce_window=0.15, wait_samples=256):
+        """
+        Args:
+            policy (str): LATEST_WINS or QUEUE.
+            max_queue (int): Maximum number of waiting jobs under the QUEUE policy.
+            coalesce_window (float): Seconds to wait for more triggers before starting a job
+                (merging them under LATEST_WINS).
+            wait_samples (int): Number of recent queue wait times kept for the metrics.
+        """
+        if policy not in (LATEST_WINS, QUEUE):
+            raise ValueError(f"Unknown scheduling policy: {policy}")
+        self.policy = policy
+        self.max_queue = max_queue
+        self.coalesce_window = coalesce_window
+        self.submitted = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.failed = 0
+        self._wait_times = deque(maxlen=wait_samples)
+        self._queue = deque()
+        self._next_id = 1
+        self._current = None # (job, asyncio.Task) of the job in flight
+        self._lock = threading.Lock()
+        self._loop = None
+        self._wakeup = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._stopping = False
+
+    def start(self):
+        """Starts the worker thread. Safe to call more than once."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run_loop, daemon=True)
+            self._thread.start()
+            self._ready.wait()
+        return self
+
+    def _run_loop(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._wakeup = asyncio.Event()
+        self._ready.set()
+        self._loop.run_until_complete(self._worker())
+        self._loop.close()
+
+    def submit(self, job_fn):
+        """
+        Schedules a job. Thread-safe; may be called from any thread (e.g. the hotkey listener).
+
+        Args:
+            job_fn: A coroutine function called as job_fn(job_id).
+
+        Returns:
+            int: The id of the scheduled job.
+        """
+        self.start()
+        with self._lock:
+            job = _Job(self._next_id, job_fn)
+            self._next_id += 1
+            self.submitted += 1
+        self._loop.call_soon_threadsafe(self._enqueue, job)
+        return job.job_id
+
+    def _enqueue(self, job):
+        # Runs on the worker loop. The lock only guards against stats() reading from another thread.
+        with self._lock:
+            if self.policy == LATEST_WINS:
+                self.coalesced += len(self._queue)
+                self._queue.clear()
+                if self._current is not None:
+                    self._current[1].cancel()
+            elif len(self._queue) >= self.max_queue:
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append(job)
+        self._wakeup.set()
+
+    def cancel_current(self):
+        """Cancels the job in flight, if any. Queued jobs are kept."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._cancel_current)
+
+    def _cancel_current(self):
+        if self._current is not None:
+            self._current[1].cancel()
+
+    async def _worker(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if self._stopping:
+                return
+            # Let a burst of triggers settle; LATEST_WINS keeps only the newest of them.
+            if self.coalesce_window:
+                await asyncio.sleep(self.coalesce_window)
+            while self._queue:
+                with self._lock:
+                    job = self._queue.popleft()
+                    wait = time.perf_counter() - job.submitted_at
+                    self._wait_times.append(wait)
+                    task = asyncio.ensure_future(job.job_fn(job.job_id))
+                    self._current = (job, task)
+                tracer.record("queue_wait", wait, job_id=job.job_id)
+                try:
+                    await task
+                    with self._lock:
+                        self.completed += 1
+                    tracer.increment("jobs_completed")
+                except asyncio.CancelledError:
+                    with self._lock:
+                        self.cancelled += 1
+                    tracer.increment("jobs_cancelled")
+                    logger.info("Analysis job %s was cancelled.", job.job_id)
+                except Exception as e:
+                    with self._lock:
+                        self.failed += 1
+                    tracer.increment("jobs_failed")
+                    logger.error("Analysis job %s failed: %s", job.job_id, e)
+                finally:
+                    with self._lock:
+                        self._current = None
+                if self._stopping:
+                    return
+
+    def stop(self):
+        """Cancels the job in flight, drops queued jobs and stops the worker thread."""
+        if self._thread is None:
+            return
+
+        def _shutdown():
+            self._stopping = True
+            with self._lock:
+                self._queue.clear()
+            self._cancel_current()
+            self._wakeup.set()
+
+        self._loop.call_soon_threadsafe(_shutdown)
+        self._thread.join()
+        self._thread = None
+
+    @property
+    def queue_depth(self):
+        return len(self._queue)
+
+    def stats(self):
+        """Returns queue depth, job counters and queue wait-time statistics (seconds)."""
+        # Copy under the lock; the worker loop appends to the deques concurrently
+        with self._lock:
+            waits = list(self._wait_times)
+            counters = {
+                "policy": self.policy,
+                "queue_depth": len(self._queue),
+                "in_flight": self._current is not None,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "cancelled": self.cancelled,
+                "coalesced": self.coalesced,
+                "dropped": self.dropped,
+                "failed": self.failed,
+            }
+        waits.sort()
+        return {
+            **counters,
+            "wait_avg": sum(waits) / len(waits) if waits else None,
+            "wait_p95": waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else None,
+            "wait_max": waits[-1] if waits else None,
+        }
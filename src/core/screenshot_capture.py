@@ -1,40 +1,383 @@
-import mss
-import mss.tools
+import logging
 import os
-from PIL import Image
+import threading
 import time
 from datetime import datetime
 from src.core.config import AppConfig
+from src.core.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Capture modes
+MODE_MONITOR = "monitor" # One monitor, chosen by index (1 = primary, like mss)
+MODE_CURSOR = "cursor" # The monitor the mouse cursor is on
+MODE_REGION = "region" # An explicit (left, top, width, height) rectangle in desktop coordinates
+MODE_ALL = "all" # A composite of all monitors (their bounding box), optionally downscaled
+CAPTURE_MODES = (MODE_MONITOR, MODE_CURSOR, MODE_REGION, MODE_ALL)
+
+
+def parse_region(value):
+    """Parses "left,top,width,height" into a region dict, or returns None for an empty value."""
+    if not value:
+        return None
+    left, top, width, height = (int(part) for part in value.split(","))
+    return {"left": left, "top": top, "width": width, "height": height}
+
+
+class CaptureBackend:
+    """
+    Source of screen pixels. Monitors follow the mss convention: index 0 is the bounding
+    box of all monitors and 1..n are the individual monitors, all as dicts with
+    left/top/width/height in desktop coordinates.
+    """
+
+    def monitors(self):
+        raise NotImplementedError
+
+    def grab(self, region):
+        """Returns the pixels of region as a HxWx4 BGRA uint8 NumPy array."""
+        raise NotImplementedError
+
+    def cursor_position(self):
+        """Returns the (x, y) cursor position in desktop coordinates, or None if unknown."""
+        return None
+
+    def close(self):
+        """Releases the handles the backend keeps open between captures."""
+
+
+class MssBackend(CaptureBackend):
+    """
+    Captures the real screen with one long-lived mss instance.
+
+    Opening an mss context connects to the display server and enumerates the monitors,
+    which used to happen twice per capture. mss keeps its display handles per thread,
+    while captures come from several threads (hotkey jobs, speculative captures, daemon
+    requests), so the instance lives on a dedicated grabber thread and each grab is handed
+    to it. Captures are serialized by that thread. mss is imported on first use.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._sct = None # Only touched on the grabber thread
+        self._monitors = None
+        self._lock = threading.Lock()
+
+    def _call(self, fn, *args):
+        """Runs fn on the grabber thread and returns its result."""
+        with self._lock:
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bambi-grabber")
+            executor = self._executor
+        return executor.submit(fn, *args).result()
+
+    def _grabber(self):
+        if self._sct is None:
+            import mss
+            self._sct = mss.mss()
+        return self._sct
+
+    def _grab(self, region):
+        try:
+            return self._grabber().grab(region)
+        except Exception:
+            # The display may have changed (e.g. a monitor was unplugged); reconnect once
+            self._close_grabber()
+            self._monitors = None
+            return self._grabber().grab(region)
+
+    def _close_grabber(self):
+        if self._sct is not None:
+            self._sct.close()
+            self._sct = None
+
+    def monitors(self):
+        # mss enumerates the monitors once per instance; refresh_monitors() re-reads them
+        if self._monitors is None:
+            self._monitors = self._call(lambda: [dict(monitor) for monitor in self._grabber().monitors])
+        return [dict(monitor) for monitor in self._monitors]
+
+    def refresh_monitors(self):
+        """Re-reads the monitor layout on the next capture, e.g. after a display change."""
+        self._call(self._close_grabber)
+        self._monitors = None
+
+    def grab(self, region):
+        import numpy as np
+        sct_img = self._call(self._grab, region)
+        # View over the raw BGRA buffer; no copy is made.
+        return np.frombuffer(sct_img.raw, dtype=np.uint8).reshape(sct_img.height, sct_img.width, 4)
+
+    def cursor_position(self):
+        try:
+            from pynput.mouse import Controller # Imported here: needs a display server
+            return Controller().position
+        except Exception as e:
+            logger.warning("Could not read the cursor position: %s", e)
+            return None
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.submit(self._close_grabber)
+            executor.shutdown(wait=True)
+        self._monitors = None
+
+
+class FrameBuffer:
+    """
+    A reusable RGBX frame that captures are converted into.
+
+    The NumPy array and the PIL image share one preallocated buffer, which is replaced only
+    when the frame size changes. Pillow's raw decoder converts BGRA to RGBX straight into
+    it in one pass, so repeated captures of the same size allocate nothing. The contents
+    are overwritten by the next conversion; callers that keep a frame must copy it.
+    """
+
+    def __init__(self):
+        self.array = None # HxWx4 uint8 RGBX; the X channel is 255
+        self.image = None # PIL "RGBX" image over the same memory
+
+    def convert(self, bgra):
+        """Converts a C-contiguous HxWx4 BGRA array into the buffer and returns the buffer's array."""
+        height, width = bgra.shape[:2]
+        if self.array is None or self.array.shape[:2] != (height, width):
+            import numpy as np
+            from PIL import Image
+            self.array = np.empty((height, width, 4), dtype=np.uint8)
+            self.image = Image.frombuffer("RGBX", (width, height), self.array, "raw", "RGBX", 0, 1)
+        # Decodes into the image's memory, i.e. into self.array
+        self.image.frombytes(bgra, "raw", "BGRX")
+        return self.array
+
+
+class FakeFramebufferBackend(CaptureBackend):
+    """
+    Serves captures from an in-memory virtual desktop instead of the screen, for headless
+    runs, demos and benchmarks.
+    """
+
+    def __init__(self, monitors=({"left": 0, "top": 0, "width": 1920, "height": 1080},),
+                 desktop=None, cursor=None):
+        """
+        Args:
+            monitors: Individual monitor rectangles in desktop coordinates.
+            desktop (numpy.ndarray, optional): HxWx4 BGRA pixels covering the bounding box of
+                all monitors. A deterministic test pattern is generated when omitted.
+            cursor (tuple, optional): The (x, y) position reported as the cursor.
+        """
+        left = min(m["left"] for m in monitors)
+        top = min(m["top"] for m in monitors)
+        right = max(m["left"] + m["width"] for m in monitors)
+        bottom = max(m["top"] + m["height"] for m in monitors)
+        self._monitors = [{"left": left, "top": top, "width": right - left, "height": bottom - top}]
+        self._monitors.extend(dict(m) for m in monitors)
+        if desktop is None:
+            desktop = self.test_pattern(right - left, bottom - top)
+        if desktop.shape[:2] != (bottom - top, right - left):
+            raise ValueError("desktop must cover the bounding box of all monitors.")
+        self.desktop = desktop
+        self.cursor = cursor
+
+    @staticmethod
+    def test_pattern(width, height):
+        """Generates a BGRA gradient with a grid, so every region looks different."""
+        import numpy as np
+        ys, xs = np.mgrid[0:height, 0:width]
+        frame = np.empty((height, width, 4), dtype=np.uint8)
+        frame[..., 0] = (xs * 255 // max(1, width - 1)).astype(np.uint8)
+        frame[..., 1] = (ys * 255 // max(1, height - 1)).astype(np.uint8)
+        frame[..., 2] = np.where((xs % 64 == 0) | (ys % 64 == 0), 255, 32).astype(np.uint8)
+        frame[..., 3] = 255
+        return frame
+
+    def monitors(self):
+        return [dict(m) for m in self._monitors]
+
+    def grab(self, region):
+        origin = self._monitors[0]
+        x = region["left"] - origin["left"]
+        y = region["top"] - origin["top"]
+        return self.desktop[y:y + region["height"], x:x + region["width"]]
+
+    def cursor_position(self):
+        return self.cursor
+
 
 class ScreenshotCapture:
-    def __init__(self, output_dir=AppConfig.TEMP_SCREENSHOT_DIR):
-        self.output_dir = output_dir
-        os.makedirs(self.output_dir, exist_ok=True) # Ensure dir exists
+    def __init__(self, output_dir=None, backend=None, mode=None, monitor=None,
+                 region=None, all_monitors_max_dim=None):
+        """
+        Args:
+            output_dir (str, optional): Directory for screenshots that are kept on disk.
+                Defaults to TEMP_SCREENSHOT_DIR; it is created on the first save.
+            backend (CaptureBackend, optional): Pixel source. Defaults to the real screen (mss).
+            mode (str, optional): Default capture mode, one of CAPTURE_MODES. Defaults to CAPTURE_MODE.
+            monitor (int, optional): Default monitor index for MODE_MONITOR. Defaults to CAPTURE_MONITOR.
+            region (dict, optional): Default rectangle for MODE_REGION. Defaults to CAPTURE_REGION.
+            all_monitors_max_dim (int, optional): Longest side of the MODE_ALL composite; 0 keeps
+                full size. Defaults to CAPTURE_ALL_MAX_DIM.
+        """
+        mode = mode or AppConfig.CAPTURE_MODE
+        if mode not in CAPTURE_MODES:
+            raise ValueError(f"Unknown capture mode: {mode}")
+        self.output_dir = output_dir or AppConfig.TEMP_SCREENSHOT_DIR
+        self.backend = backend or MssBackend()
+        self.mode = mode
+        self.monitor = monitor if monitor is not None else AppConfig.CAPTURE_MONITOR
+        self.region = region or parse_region(AppConfig.CAPTURE_REGION)
+        self.all_monitors_max_dim = (all_monitors_max_dim if all_monitors_max_dim is not None
+                                     else AppConfig.CAPTURE_ALL_MAX_DIM)
+        # HxWx4 BGRA NumPy array of the latest capture (a view over the grab buffer when possible)
+        self.last_raw_frame = None
+        self.last_bounds = None # Desktop rectangle of the latest capture
+        # Reused by capture_frame, so repeated captures do not allocate new frames
+        self.frame_buffer = FrameBuffer()
+        # Seconds spent in the stages of the latest capture: capture (grab) and convert
+        self.last_timings = {}
+
+    @staticmethod
+    def _clip(region, bounds):
+        """Clips region to bounds; raises ValueError if nothing is left."""
+        left = max(region["left"], bounds["left"])
+        top = max(region["top"], bounds["top"])
+        right = min(region["left"] + region["width"], bounds["left"] + bounds["width"])
+        bottom = min(region["top"] + region["height"], bounds["top"] + bounds["height"])
+        if right <= left or bottom <= top:
+            raise ValueError(f"Capture region {region} is outside the desktop.")
+        return {"left": left, "top": top, "width": right - left, "height": bottom - top}
+
+    def resolve_region(self, mode=None, monitor=None, region=None):
+        """
+        Returns the desktop rectangle a capture mode refers to.
+
+        Args:
+            mode (str, optional): One of CAPTURE_MODES. Defaults to the instance's mode.
+            monitor (int, optional): Monitor index for MODE_MONITOR.
+            region (dict, optional): Rectangle for MODE_REGION.
+        """
+        mode = mode or self.mode
+        monitors = self.backend.monitors()
+
+        if mode == MODE_ALL:
+            return monitors[0]
+        if mode == MODE_REGION:
+            region = region or self.region
+            if not region:
+                raise ValueError("Region capture needs a region (left, top, width, height).")
+            return self._clip(region, monitors[0])
+        if mode == MODE_CURSOR:
+            position = self.backend.cursor_position()
+            if position is not None:
+                x, y = position
+                for candidate in monitors[1:]:
+                    if (candidate["left"] <= x < candidate["left"] + candidate["width"]
+                            and candidate["top"] <= y < candidate["top"] + candidate["height"]):
+                        return candidate
+            logger.warning("Cursor monitor unknown; falling back to the primary monitor.")
+            return monitors[1]
+        if mode == MODE_MONITOR:
+            index = monitor if monitor is not None else self.monitor
+            if not 1 <= index < len(monitors):
+                raise ValueError(f"Monitor {index} does not exist; {len(monitors) - 1} monitor(s) found.")
+            return monitors[index]
+        raise ValueError(f"Unknown capture mode: {mode}")
+
+    def _grab(self, mode, monitor, region):
+        """Grabs the raw BGRA frame of a capture mode into last_raw_frame and times it."""
+        import numpy as np
+        stage_start = time.perf_counter()
+        bounds = self.resolve_region(mode, monitor, region)
+        frame = self.backend.grab(bounds)
+        if not frame.flags["C_CONTIGUOUS"]:
+            frame = np.ascontiguousarray(frame)
+        self.last_raw_frame = frame
+        self.last_bounds = bounds
+        self.last_timings = {"capture": time.perf_counter() - stage_start}
+        tracer.record("capture", self.last_timings["capture"], mode=mode, width=frame.shape[1], height=frame.shape[0])
+        return frame
+
+    def capture_frame(self, mode=None, monitor=None, region=None):
+        """
+        Takes a screenshot into the reusable frame buffer, for callers that capture
+        repeatedly (watching the screen, benchmarks). Unlike capture_image, no image is
+        allocated and MODE_ALL composites are not downscaled.
 
-    def take_screenshot(self, filename=None):
+        Args:
+            mode (str, optional): One of CAPTURE_MODES. Defaults to the instance's mode.
+            monitor (int, optional): Monitor index for MODE_MONITOR.
+            region (dict, optional): Rectangle for MODE_REGION.
+
+        Returns:
+            numpy.ndarray: HxWx4 RGBX view of frame_buffer (frame.data is a memoryview of it;
+                frame_buffer.image is a PIL image of it). Valid until the next capture_frame call.
+        """
+        frame = self._grab(mode or self.mode, monitor, region)
+        convert_start = time.perf_counter()
+        rgbx = self.frame_buffer.convert(frame)
+        self.last_timings["convert"] = time.perf_counter() - convert_start
+        tracer.record("convert", self.last_timings["convert"])
+        return rgbx
+
+    def capture_image(self, mode=None, monitor=None, region=None):
+        """
+        Takes a screenshot and returns it as an in-memory PIL Image. Nothing is written to disk.
+        The image owns its pixels, so it stays valid while later captures are taken.
+
+        Args:
+            mode (str, optional): One of CAPTURE_MODES. Defaults to the instance's mode.
+            monitor (int, optional): Monitor index for MODE_MONITOR.
+            region (dict, optional): Rectangle for MODE_REGION.
+        """
+        from PIL import Image
+        mode = mode or self.mode
+        frame = self._grab(mode, monitor, region)
+        convert_start = time.perf_counter()
+
+        height, width = frame.shape[:2]
+        # Decode the raw BGRA buffer straight into an RGB image. This skips the
+        # intermediate BGRA->RGB bytes copy that sct_img.rgb would make.
+        img = Image.frombytes("RGB", (width, height), frame, "raw", "BGRX")
+
+        if mode == MODE_ALL and self.all_monitors_max_dim and max(width, height) > self.all_monitors_max_dim:
+            # A multi-monitor composite is huge; shrink it here so later stages stay cheap.
+            img.thumbnail((self.all_monitors_max_dim, self.all_monitors_max_dim), Image.Resampling.BILINEAR)
+
+        self.last_timings["convert"] = time.perf_counter() - convert_start
+        tracer.record("convert", self.last_timings["convert"])
+        return img
+
+    def save_image(self, img, filename=None):
         """
-        Takes a screenshot of the primary monitor and saves it to a file.
+        Saves an already captured PIL Image into the output directory.
         Returns the path to the saved screenshot.
         """
         if filename is None:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f") # Microseconds: rapid captures do not collide
             filename = f"screenshot_{timestamp}.png"
 
+        os.makedirs(self.output_dir, exist_ok=True)
         filepath = os.path.join(self.output_dir, filename)
+        img.save(filepath)
 
-        with mss.mss() as sct:
-            # Get information of monitor 1 (primary monitor)
-            monitor = sct.monitors[1]
-            sct_img = sct.grab(monitor)
-            # Convert to PIL Image for easier processing
-            img = Image.frombytes("RGB", sct_img.size, sct_img.rgb)
-            img.save(filepath)
-
-        print(f"Screenshot saved to: {filepath}")
+        logger.info("Screenshot saved to: %s", filepath)
         return filepath
 
+    def take_screenshot(self, filename=None, mode=None, monitor=None, region=None):
+        """
+        Takes a screenshot and saves it to a file.
+        Returns the path to the saved screenshot.
+        """
+        return self.save_image(self.capture_image(mode, monitor, region), filename)
+
+    def close(self):
+        """Closes the capture backend's long-lived handles."""
+        self.backend.close()
+
 # Example usage (for testing)
 if __name__ == "__main__":
     screenshot_tool = ScreenshotCapture()
     path = screenshot_tool.take_screenshot()
-    print(f"Screenshot taken: {path}")
\ No newline at end of file
+    print(f"Screenshot taken: {path}")
@@ -0,0 +1,182 @@
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Shown instead of an answer when a follow-up refers to a session that is gone.
+SESSION_EXPIRED_MESSAGE = "This conversation has expired. Press the hotkey to analyze the screen again."
+
+
+class AnalysisSession:
+    """
+    A conversation about one captured screen.
+
+    Ollama returns the processed prompt of every /api/generate request, image included, as a
+    list of token ids ("context"). Sending it back with the next prompt lets a follow-up
+    question continue from there, so it pays neither the image upload nor the vision
+    encoding and prefill again. The session keeps that context, plus the prepared image and
+    the question/answer turns as a fallback for when the context is not available.
+    """
+
+    def __init__(self, session_id, max_context=8192, max_turns=6):
+        """
+        Args:
+            session_id (int): Identifier within its SessionStore.
+            max_context (int): Longest context (in tokens) kept for follow-ups. A longer one is
+                dropped and the next follow-up re-sends the image with a recap instead. 0 = no limit.
+            max_turns (int): Number of recent turns kept for that recap.
+        """
+        self.id = session_id
+        self.max_context = max_context
+        self.max_turns = max_turns
+        self.context = None # Token ids returned with the latest answer
+        self.image = None # PreparedImage of the screen, for follow-ups without a context
+        self.template = None # Name of the prompt template of the first question
+        self.turns = [] # (question, answer) pairs, oldest first
+        self.created_at = self.last_used = time.monotonic()
+        self.closed = False
+
+    @property
+    def can_follow_up(self):
+        """Whether a follow-up question can be asked: the session is open and has a context or image."""
+        return not self.closed and (self.context is not None or self.image is not None)
+
+    def attach_image(self, prepared, template=None):
+        """Keeps the prepared image of the screen the session is about and its prompt template (only the first ones)."""
+        if self.image is None and not self.closed:
+            self.image = prepared
+            self.template = template
+
+    def record(self, question, answer, context=None):
+        """
+        Records a completed turn and the context Ollama returned with its answer.
+        A missing or too long context is dropped, so the next follow-up falls back to the image.
+        """
+        if self.closed:
+            return
+        self.turns.append((question, answer))
+        del self.turns[:-self.max_turns]
+        if context and self.max_context and len(context) > self.max_context:
+            logger.info("Session %s context reached %d tokens; the next follow-up re-sends the screenshot.",
+                        self.id, len(context))
+            context = None
+        self.context = list(context) if context else None
+        self.last_used = time.monotonic()
+
+    def recap(self):
+        """The recent turns as text, for a follow-up that has to start over from the image."""
+        return "\n".join(f"Question: {question or 'Describe this screen.'}\nAnswer: {answer}"
+                         for question, answer in self.turns)
+
+    def size(self):
+        """Approximate memory held by the session in bytes."""
+        size = len(self.image.data) if self.image is not None else 0
+        size += 8 * len(self.context) if self.context else 0
+        return size + sum(len(question or "") + len(answer) for question, answer in self.turns)
+
+    def close(self):
+        """Releases the image and context; the session cannot be continued afterwards."""
+        self.closed = True
+        self.image = None
+        self.context = None
+        self.turns = []
+
+    def __repr__(self):
+        return (f"AnalysisSession({self.id}: {len(self.turns)} turns, "
+                f"context={len(self.context) if self.context else 0} tokens, {self.size() / 1024:.0f} KB)")
+
+
+class SessionStore:
+    """
+    Keeps the open AnalysisSessions, bounded by count, idle time and total memory.
+    Sessions leaving the store are closed, so their image and context are freed even if a
+    caller still holds a reference.
+    """
+
+    def __init__(self, max_sessions=4, ttl=600.0, max_bytes=32 * 1024 * 1024, max_context=8192, max_turns=6):
+        """
+        Args:
+            max_sessions (int): Maximum number of open sessions; the least recently used is closed first.
+            ttl (float): Seconds a session may stay idle before it expires. None or 0 = no expiry.
+            max_bytes (int): Upper bound for the summed size of all sessions.
+            max_context (int): Passed to every AnalysisSession.
+            max_turns (int): Passed to every AnalysisSession.
+        """
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_context = max_context
+        self.max_turns = max_turns
+        self.expirations = 0
+        self.evictions = 0
+        self._sessions = OrderedDict() # id -> AnalysisSession, least recently used first
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _expired(self, session, now):
+        return bool(self.ttl) and now - session.last_used > self.ttl
+
+    def _prune_locked(self, now):
+        for session in [s for s in self._sessions.values() if self._expired(s, now)]:
+            del self._sessions[session.id]
+            session.close()
+            self.expirations += 1
+        total = sum(session.size() for session in self._sessions.values())
+        while self._sessions and (len(self._sessions) > self.max_sessions or total > self.max_bytes):
+            _, session = self._sessions.popitem(last=False)
+            total -= session.size()
+            session.close()
+            self.evictions += 1
+
+    def create(self):
+        """Opens a new session, closing expired and least recently used ones to make room."""
+        with self._lock:
+            session = AnalysisSession(next(self._ids), max_context=self.max_context, max_turns=self.max_turns)
+            self._sessions[session.id] = session
+            # The new session is empty, so it is only evicted if max_sessions is 0.
+            self._prune_locked(time.monotonic())
+            return session
+
+    def get(self, session_id):
+        """Returns the open session with this id, or None if it expired or was evicted."""
+        with self._lock:
+            self._prune_locked(time.monotonic())
+            return self._sessions.get(session_id)
+
+    def touch(self, session):
+        """
+        Marks a session as used now. Returns False if it already expired or was evicted.
+        Also enforces the memory bound, since the session may have grown since it was created.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._prune_locked(now)
+            if self._sessions.get(session.id) is not session:
+                return False
+            session.last_used = now
+            self._sessions.move_to_end(session.id)
+            return True
+
+    def discard(self, session):
+        """Closes a session and removes it from the store."""
+        with self._lock:
+            self._sessions.pop(session.id, None)
+        session.close()
+
+    def clear(self):
+        with self._lock:
+            sessions, self._sessions = list(self._sessions.values()), OrderedDict()
+        for session in sessions:
+            session.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "bytes": sum(session.size() for session in self._sessions.values()),
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,154 @@
+import logging
+import threading
+import time
+from src.core.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+
+class PrecapturedFrame:
+    """
+    A screen capture that was taken, hashed and encoded ahead of the request that uses it.
+    """
+
+    def __init__(self, image, prepared, image_hash, captured_at):
+        """
+        Args:
+            image (PIL.Image.Image): The captured screen.
+            prepared (PreparedImage): The image encoded for the model.
+            image_hash (str, optional): frame_digest for the response cache.
+            captured_at (float): time.monotonic() when the capture started.
+        """
+        self.image = image
+        self.prepared = prepared
+        self.image_hash = image_hash
+        self.captured_at = captured_at
+        self.seconds = 0.0 # Time spent capturing and preparing, set by SpeculativeCapture
+
+    def age(self, now=None):
+        return (now if now is not None else time.monotonic()) - self.captured_at
+
+
+class _Speculation:
+    __slots__ = ("key", "result", "discarded", "done")
+
+    def __init__(self, key):
+        self.key = key # Capture arguments (mode, monitor, region)
+        self.result = None
+        self.discarded = False
+        self.done = threading.Event()
+
+
+class SpeculativeCapture:
+    """
+    Captures and prepares the screen in the background while a hotkey chord is being
+    pressed, so the work is already done when the chord completes.
+
+    begin() starts a speculation when the chord prefix is held, take() hands its result
+    to the request once the chord completes, and discard() drops it when the prefix is
+    released without completing the chord. At most one speculation runs at a time.
+    """
+
+    def __init__(self, capture_fn, max_age=1.0):
+        """
+        Args:
+            capture_fn (callable): Called as capture_fn(mode, monitor, region) on a worker
+                thread; returns a PrecapturedFrame.
+            max_age (float): Seconds after which a speculative frame is too old to use.
+        """
+        self.capture_fn = capture_fn
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._pending = None # The speculation not yet taken or discarded
+        # Counters: hits used a speculative frame, stale ones were too old or taken with
+        # other capture arguments, wasted ones were never used (stale or discarded).
+        self.started = 0
+        self.hits = 0
+        self.stale = 0
+        self.wasted = 0
+        self.failed = 0
+        self.wasted_seconds = 0.0
+
+    def _run(self, speculation):
+        start = time.monotonic()
+        try:
+            result = self.capture_fn(*speculation.key)
+            result.seconds = time.monotonic() - start
+            tracer.record("speculative_capture", result.seconds)
+        except Exception as e:
+            logger.warning("Speculative capture failed: %s", e)
+            result = None
+        with self._lock:
+            speculation.result = result
+            if result is None:
+                self.failed += 1
+            discarded = speculation.discarded
+        speculation.done.set()
+        if discarded and result is not None:
+            self._waste(result)
+
+    def begin(self, mode=None, monitor=None, region=None):
+        """Starts a speculative capture unless one is already pending. Returns True if one was started."""
+        with self._lock:
+            if self._pending is not None:
+                return False
+            speculation = self._pending = _Speculation((mode, monitor, region))
+            self.started += 1
+        tracer.increment("speculative_started")
+        threading.Thread(target=self._run, args=(speculation,), daemon=True).start()
+        return True
+
+    def _waste(self, result):
+        with self._lock:
+            self.wasted += 1
+            self.wasted_seconds += result.seconds
+        tracer.increment("speculative_wasted")
+
+    def take(self, mode=None, monitor=None, region=None):
+        """
+        Returns the pending speculative frame if it matches the capture arguments and is
+        fresh, or None. Waits for a capture that is still running, since it began before
+        the request and will finish sooner than a new one.
+        """
+        with self._lock:
+            speculation, self._pending = self._pending, None
+        if speculation is None:
+            return None
+        speculation.done.wait()
+        result = speculation.result
+        if result is None:
+            return None # The capture failed
+        if speculation.key != (mode, monitor, region) or result.age() > self.max_age:
+            with self._lock:
+                self.stale += 1
+            tracer.increment("speculative_stale")
+            self._waste(result)
+            return None
+        with self._lock:
+            self.hits += 1
+        tracer.increment("speculative_hit")
+        logger.debug("Using speculative capture taken %.0f ms ago", result.age() * 1e3)
+        return result
+
+    def discard(self):
+        """Drops the pending speculation; its work counts as wasted once it has finished."""
+        with self._lock:
+            speculation, self._pending = self._pending, None
+            if speculation is None:
+                return
+            speculation.discarded = True
+            result = speculation.result
+        if result is not None:
+            self._waste(result)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "started": self.started,
+                "hits": self.hits,
+                "stale": self.stale,
+                "wasted": self.wasted,
+                "failed": self.failed,
+                "hit_rate": self.hits / self.started if self.started else 0.0,
+                "wasted_seconds": self.wasted_seconds,
+            }
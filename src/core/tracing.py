@@ -0,0 +1,223 @@
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in seconds, from sub-millisecond stages to long generations.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram of durations, in the shape Prometheus expects."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # The last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """Yields (upper bound, cumulative count) pairs, ending with +Inf."""
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield bound, total
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "attrs", "start", "duration")
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.duration = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer.record(self.name, self.duration, **self.attrs)
+        return False
+
+
+class _NoopSpan:
+    """Returned by a disabled tracer: entering and leaving it does nothing."""
+    __slots__ = ()
+    duration = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """
+    Lightweight per-stage instrumentation.
+
+    Stage durations are recorded either with the span() context manager or, when the code
+    already measured them, with record(). They go into in-memory histograms and, if a trace
+    file is set, into a JSONL trace (one object per span). Counters track events such as
+    cache hits. A disabled tracer returns a shared no-op span and record()/increment()
+    return right away, so instrumentation stays in place at close to zero cost.
+    """
+
+    def __init__(self, enabled=False, trace_path=None):
+        self.enabled = enabled
+        self.histograms = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._trace_file = None
+        self._metrics_server = None
+        if trace_path:
+            self.set_trace_file(trace_path)
+
+    def set_trace_file(self, trace_path):
+        """Starts appending spans to a JSONL trace file (None stops it)."""
+        with self._lock:
+            if self._trace_file is not None:
+                self._trace_file.close()
+            self._trace_file = open(trace_path, "a", encoding="utf-8", buffering=1) if trace_path else None
+
+    def span(self, name, **attrs):
+        """Times the enclosed block as stage name."""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, name, attrs)
+
+    def record(self, name, seconds, **attrs):
+        """Records an already measured duration for stage name."""
+        if not self.enabled or seconds is None:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+            if self._trace_file is not None:
+                event = {"ts": time.time(), "span": name, "seconds": seconds}
+                if attrs:
+                    event["attrs"] = attrs
+                self._trace_file.write(json.dumps(event, default=str) + "\n")
+
+    def increment(self, name, value=1):
+        """Adds value to counter name."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self):
+        """Returns count, sum and mean per stage plus the counters, as plain dicts."""
+        with self._lock:
+            stages = {name: {"count": h.count, "sum": h.sum, "mean": h.sum / h.count if h.count else None}
+                      for name, h in self.histograms.items()}
+            return {"stages": stages, "counters": dict(self.counters)}
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def prometheus_text(self):
+        """Renders the histograms and counters in the Prometheus text exposition format."""
+        lines = [
+            "# HELP bambi_stage_seconds Time spent per pipeline stage.",
+            "# TYPE bambi_stage_seconds histogram",
+        ]
+        with self._lock:
+            for name in sorted(self.histograms):
+                histogram = self.histograms[name]
+                for bound, count in histogram.cumulative():
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'bambi_stage_seconds_bucket{{stage="{name}",le="{le}"}} {count}')
+                lines.append(f'bambi_stage_seconds_sum{{stage="{name}"}} {histogram.sum}')
+                lines.append(f'bambi_stage_seconds_count{{stage="{name}"}} {histogram.count}')
+            lines.append("# HELP bambi_events_total Counted pipeline events.")
+            lines.append("# TYPE bambi_events_total counter")
+            for name in sorted(self.counters):
+                lines.append(f'bambi_events_total{{event="{name}"}} {self.counters[name]}')
+        return "\n".join(lines) + "\n"
+
+    def serve_metrics(self, port, host="127.0.0.1"):
+        """Serves prometheus_text() at http://host:port/metrics from a background thread."""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        tracer = self
+
+        class _MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = tracer.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        self._metrics_server.daemon_threads = True
+        threading.Thread(target=self._metrics_server.serve_forever, daemon=True).start()
+        logger.info("Serving metrics at http://%s:%s/metrics", host, self._metrics_server.server_address[1])
+        return self._metrics_server.server_address[1]
+
+    def close(self):
+        if self._metrics_server is not None:
+            self._metrics_server.shutdown()
+            self._metrics_server.server_close()
+            self._metrics_server = None
+        self.set_trace_file(None)
+
+
+# Process-wide tracer; entry points enable it with configure_tracing().
+tracer = Tracer()
+
+
+def configure_tracing(enabled, trace_path=None, metrics_port=0):
+    """Enables or disables the process-wide tracer and its exporters."""
+    tracer.enabled = enabled
+    if enabled and trace_path:
+        tracer.set_trace_file(trace_path)
+    if enabled and metrics_port:
+        tracer.serve_metrics(metrics_port)
+    return tracer
+
+
+def setup_instrumentation(settings=None):
+    """
+    Configures logging and the tracer. Called once by each entry point.
+
+    Args:
+        settings (Settings, optional): Settings to use. Defaults to load_settings(), so this
+            is also where entry points load the .env file.
+    """
+    from src.core.config import load_settings
+    settings = settings or load_settings()
+    logging.basicConfig(level=settings.LOG_LEVEL.upper(),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    return configure_tracing(settings.TRACING_ENABLED, settings.TRACE_FILE or None, settings.METRICS_PORT)
@@ -0,0 +1,274 @@
+import base64
+import json
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Raw bytes base64-encoded per body chunk; a multiple of 3, so chunks encode without padding.
+BODY_CHUNK_SIZE = 3 * 64 * 1024
+
+
+class StreamingJSONBody:
+    """
+    A JSON request body with base64 image fields that are encoded chunk by chunk while the
+    body is sent.
+
+    Building the body the usual way holds several full copies of every image at once: the
+    base64 bytes, the decoded str, the serialized JSON str and its encoded bytes. Here only
+    the encoded images are kept; the JSON around them is serialized once (it is small), and
+    iterating yields that prefix, then BODY_CHUNK_SIZE pieces of each image encoded on the
+    fly, then the closing bytes. The length is known in advance, so the body goes out with
+    a Content-Length header instead of chunked transfer encoding. It can be iterated more
+    than once, e.g. when a request is retried on another host.
+    """
+
+    def __init__(self, payload, images=(), chunk_size=BODY_CHUNK_SIZE):
+        """
+        Args:
+            payload (dict): The JSON object without its "images" field.
+            images (sequence): Encoded images (bytes-like), sent base64-encoded as "images".
+            chunk_size (int): Raw image bytes encoded per chunk, rounded down to a multiple of 3.
+        """
+        self.images = [memoryview(image) for image in images]
+        self.chunk_size = max(3, chunk_size - chunk_size % 3)
+        head = json.dumps(payload)
+        if self.images:
+            # Base64 needs no JSON escaping, so the encoded chunks go between plain quotes.
+            head = head[:-1] + (", " if payload else "") + '"images": ['
+            self._head = head.encode("utf-8")
+            self._tail = b"]}"
+        else:
+            self._head, self._tail = head.encode("utf-8"), b""
+        self._length = (len(self._head) + len(self._tail) + 2 * max(0, len(self.images) - 1)
+                        + sum(2 + 4 * ((len(image) + 2) // 3) for image in self.images))
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        yield self._head
+        for index, image in enumerate(self.images):
+            yield b', "' if index else b'"'
+            for start in range(0, len(image), self.chunk_size):
+                yield base64.b64encode(image[start:start + self.chunk_size])
+            yield b'"'
+        if self._tail:
+            yield self._tail
+
+    async def aiter(self):
+        """The same chunks as an async iterator, for httpx's AsyncClient."""
+        for chunk in self:
+            yield chunk
+
+    def __bytes__(self):
+        return b"".join(self)
+
+
+def _body_options(payload, raw_key, asynchronous=False):
+    """
+    Keyword arguments sending payload as the request body. Payloads may arrive already
+    serialized (JSON bytes, or a StreamingJSONBody) so callers can control, and time, the encoding.
+
+    Args:
+        raw_key (str): The client's argument for a raw body ("data" for requests, "content" for httpx).
+        asynchronous (bool): Whether the client expects an async iterator for streamed bodies.
+    """
+    if isinstance(payload, StreamingJSONBody):
+        headers = dict(JSON_HEADERS, **{"Content-Length": str(len(payload))})
+        return {raw_key: payload.aiter() if asynchronous else payload, "headers": headers}
+    if isinstance(payload, (bytes, bytearray)):
+        return {raw_key: bytes(payload), "headers": JSON_HEADERS}
+    return {"json": payload}
+
+
+class OllamaTransportError(Exception):
+    """Base class for errors raised while talking to an Ollama server."""
+
+
+class OllamaConnectionError(OllamaTransportError):
+    """The server could not be reached."""
+
+
+class OllamaTimeoutError(OllamaTransportError):
+    """The server accepted the connection but did not answer in time."""
+
+
+class OllamaRequestError(OllamaTransportError):
+    """The server answered with an error status or an unreadable body."""
+
+
+class OllamaTransport:
+    """
+    Synchronous HTTP transport for the Ollama API built on a persistent requests.Session.
+
+    Connections are kept alive in a pool and reused across requests, so only the first
+    request to a host pays for the TCP handshake. requests is imported and the session
+    created on the first request.
+    """
+
+    def __init__(self, host, connect_timeout=5.0, read_timeout=1000.0, pool_size=4, headers=None):
+        """
+        Args:
+            host (str): Base URL of the Ollama server, e.g. "http://localhost:11434".
+            connect_timeout (float): Seconds allowed to establish a connection.
+            read_timeout (float): Seconds allowed between bytes of the response. Generations
+                on slow hardware can be long, so this is much larger than connect_timeout.
+            pool_size (int): Maximum number of kept-alive connections to the host.
+            headers (dict, optional): Extra headers sent with every request, e.g. credentials.
+        """
+        self.host = host.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_size = pool_size
+        self.headers = headers or {}
+        self._session = None
+
+    def url(self, endpoint):
+        return f"{self.host}/api/{endpoint}"
+
+    @property
+    def session(self):
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            self._session = requests.Session()
+            self._session.headers.update(self.headers)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+        return self._session
+
+    def _send(self, method, endpoint, payload=None, stream=False, timeout=None):
+        import requests
+        try:
+            response = self.session.request(method, self.url(endpoint), stream=stream,
+                                            timeout=timeout or self.timeout,
+                                            **_body_options(payload, "data"))
+            response.raise_for_status()
+            return response
+        except requests.exceptions.ConnectionError as e:
+            raise OllamaConnectionError(str(e)) from e
+        except requests.exceptions.Timeout as e:
+            raise OllamaTimeoutError(str(e)) from e
+        except requests.exceptions.RequestException as e:
+            raise OllamaRequestError(str(e)) from e
+
+    def get_json(self, endpoint, timeout=None):
+        """Sends a GET request and returns the decoded JSON body."""
+        return self._send("GET", endpoint, timeout=timeout).json()
+
+    def post_json(self, endpoint, payload, timeout=None):
+        """
+        Sends a POST request with a JSON body and returns the decoded JSON body.
+        payload is a dict, bytes that are already JSON-encoded, or a StreamingJSONBody.
+        """
+        return self._send("POST", endpoint, payload, timeout=timeout).json()
+
+    def iter_ndjson(self, endpoint, payload, timeout=None):
+        """
+        Sends a POST request and yields each object of the newline-delimited JSON response
+        as soon as its line arrives. The connection goes back to the pool when the
+        generator is exhausted or closed.
+        """
+        import requests
+        with self._send("POST", endpoint, payload, stream=True, timeout=timeout) as response:
+            try:
+                # chunk_size=None hands over each line as soon as it arrives instead of
+                # waiting for a 512 byte read buffer to fill up.
+                for line in response.iter_lines(chunk_size=None):
+                    if line:
+                        yield json.loads(line)
+            except requests.exceptions.ConnectionError as e:
+                raise OllamaConnectionError(str(e)) from e
+            except requests.exceptions.Timeout as e:
+                raise OllamaTimeoutError(str(e)) from e
+            except (requests.exceptions.RequestException, ValueError) as e:
+                raise OllamaRequestError(str(e)) from e
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+
+
+class AsyncOllamaTransport:
+    """
+    asyncio HTTP transport for the Ollama API built on a pooled httpx.AsyncClient.
+
+    Requests can run concurrently on one event loop and are cancelled by cancelling the
+    awaiting task, which also closes the underlying connection. httpx is only imported
+    when the first async request is made.
+    """
+
+    def __init__(self, host, connect_timeout=5.0, read_timeout=1000.0, pool_size=4, headers=None):
+        self.host = host.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_size = pool_size
+        self.headers = headers or {}
+        self._client = None
+
+    def url(self, endpoint):
+        return f"{self.host}/api/{endpoint}"
+
+    def _get_client(self):
+        if self._client is None:
+            try:
+                import httpx
+            except ImportError as e:
+                raise OllamaTransportError("The async client requires the 'httpx' package.") from e
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=self.pool_size,
+                                    max_keepalive_connections=self.pool_size),
+            )
+        return self._client
+
+    @staticmethod
+    def _translate(e):
+        import httpx
+        # A connect timeout means the server could not be reached, as with requests
+        if isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout)):
+            return OllamaConnectionError(str(e))
+        if isinstance(e, httpx.TimeoutException):
+            return OllamaTimeoutError(str(e))
+        return OllamaRequestError(str(e))
+
+    async def get_json(self, endpoint):
+        """Sends a GET request and returns the decoded JSON body."""
+        import httpx
+        client = self._get_client()
+        try:
+            response = await client.get(self.url(endpoint))
+            response.raise_for_status()
+            return response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            raise self._translate(e) from e
+
+    async def post_json(self, endpoint, payload):
+        """Sends a POST request with a JSON body and returns the decoded JSON body."""
+        import httpx
+        client = self._get_client()
+        try:
+            response = await client.post(self.url(endpoint), **_body_options(payload, "content", asynchronous=True))
+            response.raise_for_status()
+            return response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            raise self._translate(e) from e
+
+    async def iter_ndjson(self, endpoint, payload):
+        """Sends a POST request and asynchronously yields each object of the NDJSON response."""
+        import httpx
+        client = self._get_client()
+        try:
+            async with client.stream("POST", self.url(endpoint),
+                                     **_body_options(payload, "content", asynchronous=True)) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if line:
+                        yield json.loads(line)
+        except (httpx.HTTPError, ValueError) as e:
+            raise self._translate(e) from e
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,329 @@
+import logging
+import threading
+import time
+from src.core.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+
+def tiles_bounding_box(tiles, tile_size, frame_size, padding=0):
+    """
+    Returns the pixel box (left, top, right, bottom) around the set tiles of a tile mask,
+    grown by padding pixels and clipped to the frame, or None if no tile is set.
+    """
+    import numpy as np
+    rows = np.flatnonzero(tiles.any(axis=1))
+    cols = np.flatnonzero(tiles.any(axis=0))
+    if not len(rows):
+        return None
+    width, height = frame_size
+    return (max(0, int(cols[0]) * tile_size - padding),
+            max(0, int(rows[0]) * tile_size - padding),
+            min(width, (int(cols[-1]) + 1) * tile_size + padding),
+            min(height, (int(rows[-1]) + 1) * tile_size + padding))
+
+
+class FrameChange:
+    """The tiles of a frame that differ from the previous frame."""
+
+    def __init__(self, tiles, tile_size, frame_size):
+        """
+        Args:
+            tiles (numpy.ndarray): rows x cols bool mask, True for tiles with a changed pixel.
+            tile_size (int): Side of a tile in pixels.
+            frame_size (tuple): (width, height) of the frame.
+        """
+        self.tiles = tiles
+        self.tile_size = tile_size
+        self.frame_size = frame_size
+        self.changed_tiles = int(tiles.sum())
+        self.fraction = self.changed_tiles / tiles.size
+
+    def bounding_box(self, padding=0):
+        return tiles_bounding_box(self.tiles, self.tile_size, self.frame_size, padding)
+
+    def __repr__(self):
+        return f"FrameChange({self.changed_tiles}/{self.tiles.size} tiles)"
+
+
+class ChangeDetector:
+    """
+    Compares each frame with the previous one, tile by tile, with vectorized NumPy.
+
+    Pixels are compared as whole 32-bit words, on a grid of every pixel_step-th row and
+    column, so a 4K frame costs a few million word comparisons rather than a per-channel
+    difference. The sampled previous frame and the difference mask are preallocated and
+    reused, and the mask is reduced to tiles with logical_or.reduceat, which also handles
+    partial tiles at the right and bottom edges.
+    """
+
+    def __init__(self, tile_size=32, pixel_step=2):
+        """
+        Args:
+            tile_size (int): Side of a tile in pixels; a multiple of pixel_step.
+            pixel_step (int): Compare every pixel_step-th pixel of every pixel_step-th row.
+                Changes smaller than the step (e.g. a one-pixel caret) can be missed.
+        """
+        if tile_size % pixel_step:
+            raise ValueError("tile_size must be a multiple of pixel_step.")
+        self.tile_size = tile_size
+        self.pixel_step = pixel_step
+        self._previous = None
+        self._diff = None
+        self._row_starts = self._col_starts = None
+
+    def reset(self):
+        """Forgets the previous frame; the next update starts over."""
+        self._previous = None
+
+    def update(self, frame):
+        """
+        Compares frame with the previous one and keeps it for the next call.
+
+        Args:
+            frame (numpy.ndarray): C-contiguous HxWx4 uint8 frame (RGBX or BGRA).
+
+        Returns:
+            FrameChange | None: The changed tiles, or None for the first frame or a new frame size.
+        """
+        import numpy as np
+        height, width = frame.shape[:2]
+        pixels = frame.view(np.uint32)[::self.pixel_step, ::self.pixel_step, 0]
+        if self._previous is None or self._previous.shape != pixels.shape:
+            self._previous = np.empty(pixels.shape, dtype=np.uint32)
+            self._diff = np.empty(pixels.shape, dtype=bool)
+            step = self.tile_size // self.pixel_step
+            self._row_starts = np.arange(0, pixels.shape[0], step)
+            self._col_starts = np.arange(0, pixels.shape[1], step)
+            np.copyto(self._previous, pixels)
+            return None
+        np.not_equal(pixels, self._previous, out=self._diff)
+        np.copyto(self._previous, pixels)
+        tiles = np.logical_or.reduceat(self._diff, self._row_starts, axis=0)
+        tiles = np.logical_or.reduceat(tiles, self._col_starts, axis=1)
+        return FrameChange(tiles, self.tile_size, (width, height))
+
+
+class WatchEvent:
+    """A settled change of the watched screen, ready to be analyzed."""
+
+    def __init__(self, image, region, fraction, frame_size):
+        self.image = image # PIL RGB image of the changed region (owns its pixels)
+        self.region = region # left/top/width/height of the image in desktop coordinates
+        self.fraction = fraction # Fraction of the frame's tiles that changed during the burst
+        self.frame_size = frame_size # (width, height) of the whole watched frame
+        self.created_at = time.monotonic()
+
+    @property
+    def is_full_frame(self):
+        return (self.region["width"], self.region["height"]) == self.frame_size
+
+    def __repr__(self):
+        region = self.region
+        return (f"WatchEvent({region['width']}x{region['height']}+{region['left']}+{region['top']}, "
+                f"{self.fraction:.1%} of tiles)")
+
+
+class ScreenWatcher:
+    """
+    Samples the screen on a background thread and reports significant changes.
+
+    Each sample captures into the capture tool's reusable frame buffer and compares it with
+    the previous one (ChangeDetector). Changed tiles are collected into a burst until the
+    screen has been still for debounce seconds (or max_delay has passed since the burst
+    began). A burst is significant when its tiles cover at least min_change of the frame,
+    so typing adds up to a change while a blinking caret or a ticking clock does not. For a
+    significant burst on_change receives the box around its tiles cropped from the settled
+    frame, or the whole frame when that box covers most of it; other bursts are dropped.
+
+    A consumer that draws on the watched screen (e.g. a terminal streaming the answers)
+    would otherwise report its own output as a change, forever. It brackets that output
+    with begin_output() and end_output(): changes seen in between, and within debounce
+    after it, are not collected (and no event is reported meanwhile), while the detector
+    keeps following the screen so the output becomes part of the baseline.
+
+    CPU use is bounded twice. The sampling interval doubles, up to max_interval, unless
+    a significant burst is in progress, which resets it to interval. And the time spent sampling
+    never exceeds cpu_budget of the wall time: after a sample that took t seconds, the next
+    one waits at least t * (1 / cpu_budget - 1). Sampling time is measured in wall-clock
+    seconds, which also counts the grab on mss' thread, so the bound is conservative.
+    """
+
+    def __init__(self, capture, on_change, capture_mode=None, monitor=None, region=None, interval=0.5,
+                 max_interval=4.0, tile_size=32, pixel_step=2, min_change=0.002, debounce=1.0,
+                 max_delay=None, cpu_budget=0.05, full_frame_fraction=0.5, lock=None):
+        """
+        Args:
+            capture (ScreenshotCapture): Capture tool to sample with.
+            on_change (callable): Called with a WatchEvent on the watcher thread.
+            capture_mode, monitor, region: What to watch, as for ScreenshotCapture.capture_frame.
+            interval (float): Seconds between samples while the screen changes.
+            max_interval (float): Longest interval the sampling slows down to while it is still.
+            tile_size (int): Side of the change detection tiles in pixels.
+            pixel_step (int): Pixel sampling step of the change detection.
+            min_change (float): Fraction of tiles a burst of changes must cover to be reported.
+            debounce (float): Seconds the screen must be still before a change is reported.
+            max_delay (float, optional): Longest time a change waits for the screen to settle.
+                Defaults to 4 * debounce.
+            cpu_budget (float): Largest fraction of wall time spent sampling (0 = unbounded).
+            full_frame_fraction (float): Send the whole frame when the changed box covers more
+                than this fraction of it.
+            lock (threading.Lock, optional): Held while capturing, to share the capture tool.
+        """
+        self.capture = capture
+        self.on_change = on_change
+        self.capture_mode = capture_mode
+        self.monitor = monitor
+        self.region = region
+        self.base_interval = interval
+        self.max_interval = max(interval, max_interval)
+        self.interval = interval
+        self.min_change = min_change
+        self.debounce = debounce
+        self.max_delay = 4 * debounce if max_delay is None else max_delay
+        self.cpu_budget = cpu_budget
+        self.full_frame_fraction = full_frame_fraction
+        self.detector = ChangeDetector(tile_size, pixel_step)
+        self._lock = lock or threading.Lock()
+        self._pending = None # Union of the changed tiles of the current burst
+        self._first_change = self._last_change = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.samples = 0
+        self.changes = 0 # Samples that differed from the previous one
+        self.events = 0
+        self.dropped = 0 # Bursts too small to report
+        self.ignored = 0 # Changed samples during or right after the consumer's own output
+        self._outputs = 0 # begin_output calls without their end_output
+        self._ignore_until = 0.0
+        self.throttled = 0 # Samples delayed by the CPU budget rather than the interval
+        self.sample_seconds = 0.0
+        self.started_at = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self.started_at = time.monotonic()
+            self._thread = threading.Thread(target=self._run, name="bambi-watch", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def begin_output(self):
+        """Marks the start of output that may appear on the watched screen; its changes are ignored."""
+        with self._lock:
+            self._outputs += 1
+
+    def end_output(self):
+        """Marks the end of that output; changes within debounce after it are still ignored."""
+        with self._lock:
+            self._outputs = max(0, self._outputs - 1)
+            self._ignore_until = time.monotonic() + self.debounce
+
+    def _run(self):
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            try:
+                event = self.sample()
+            except Exception as e:
+                logger.error("Watch sample failed: %s", e)
+                event = None
+            work = time.perf_counter() - start
+            if event is not None:
+                try:
+                    self.on_change(event)
+                except Exception as e:
+                    logger.error("Watch change handler failed: %s", e)
+            self._stop.wait(self._next_delay(work))
+
+    def _next_delay(self, work):
+        """Seconds to wait before the next sample, given the seconds the last one took."""
+        delay = self.interval - work
+        if self.cpu_budget:
+            budget_delay = work * (1 / self.cpu_budget - 1)
+            if budget_delay > delay:
+                self.throttled += 1
+                delay = budget_delay
+        return max(0.0, delay)
+
+    def sample(self):
+        """
+        Takes and compares one sample. Called by the watcher thread; can also be driven
+        directly (e.g. by a benchmark) instead of start().
+
+        Returns:
+            WatchEvent | None: The settled change to analyze, if one is due.
+        """
+        start = time.perf_counter()
+        with self._lock:
+            frame = self.capture.capture_frame(self.capture_mode, self.monitor, self.region)
+            bounds = self.capture.last_bounds
+            change = self.detector.update(frame)
+            now = time.monotonic()
+            self.samples += 1
+            if self._pending is not None and (change is None or change.tiles.shape != self._pending.shape):
+                # A new frame size (another monitor, a layout change): the burst's tiles no longer apply
+                self._pending = self._first_change = self._last_change = None
+            changed = change is not None and change.changed_tiles > 0
+            muted = self._outputs > 0 or now < self._ignore_until
+            if changed and muted:
+                # Most likely the consumer's own output; the detector has already taken it in
+                self.changes += 1
+                self.ignored += 1
+                changed = False
+            elif changed:
+                self.changes += 1
+                self._pending = change.tiles if self._pending is None else self._pending | change.tiles
+                self._first_change = self._first_change or now
+                self._last_change = now
+            significant = self._pending is not None and self._pending.mean() >= self.min_change
+            if changed and significant:
+                self.interval = self.base_interval
+            else:
+                self.interval = min(self.max_interval, self.interval * 2)
+            event = None
+            if not muted and self._pending is not None and (now - self._last_change >= self.debounce
+                                                            or now - self._first_change >= self.max_delay):
+                if significant:
+                    event = self._make_event(frame, bounds)
+                else:
+                    self.dropped += 1
+                self._pending = self._first_change = self._last_change = None
+        elapsed = time.perf_counter() - start
+        self.sample_seconds += elapsed
+        tracer.record("watch_sample", elapsed, changed=event is not None)
+        return event
+
+    def _make_event(self, frame, bounds):
+        """Crops the changed tiles of the burst from the settled frame; the frame buffer is reused, so this copies."""
+        import numpy as np
+        height, width = frame.shape[:2]
+        tile_size = self.detector.tile_size
+        left, top, right, bottom = tiles_bounding_box(self._pending, tile_size, (width, height), padding=tile_size)
+        if (right - left) * (bottom - top) > self.full_frame_fraction * width * height:
+            left, top, right, bottom = 0, 0, width, height
+        fraction = float(np.mean(self._pending))
+        self.events += 1
+        image = self.capture.frame_buffer.image.crop((left, top, right, bottom)).convert("RGB")
+        region = {"left": bounds["left"] + left, "top": bounds["top"] + top,
+                  "width": right - left, "height": bottom - top}
+        return WatchEvent(image, region, fraction, (width, height))
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started_at if self.started_at else None
+        return {
+            "samples": self.samples,
+            "changes": self.changes,
+            "events": self.events,
+            "dropped": self.dropped,
+            "ignored": self.ignored,
+            "throttled": self.throttled,
+            "interval": self.interval,
+            "mean_sample_seconds": self.sample_seconds / self.samples if self.samples else None,
+            "sampling_share": self.sample_seconds / elapsed if elapsed else None,
+        }
@@ -0,0 +1,300 @@
+import argparse
+import json
+import select
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.core.prompts import estimate_tokens
+
+# Tokens an image adds to the context (LLaVA encodes an image as 576 tokens).
+IMAGE_TOKENS = 576
+
+
+class _MockOllamaHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections alive and allows chunked streaming, like the real server.
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.mock.record_connection()
+
+    def log_message(self, format, *args):
+        pass # Keep benchmark and demo output clean
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        return json.loads(body) if body else {}
+
+    def _send_json(self, status, obj):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_chunked(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _client_gone(self):
+        """
+        Returns True if the client closed the connection. Ollama notices disconnects the
+        same way and aborts the generation, so the mock stops producing tokens too.
+        """
+        readable, _, _ = select.select([self.connection], [], [], 0)
+        if not readable:
+            return False
+        try:
+            return self.connection.recv(1, socket.MSG_PEEK) == b""
+        except OSError:
+            return True
+
+    def _write_chunk(self, obj):
+        data = (json.dumps(obj) + "\n").encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        mock = self.server.mock
+        mock.record_request(self.path, None)
+        if self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": name, "model": name} for name in sorted(mock.models)]})
+        elif self.path == "/api/ps":
+            self._send_json(200, {"models": [{"name": name, "model": name} for name in sorted(mock.loaded_models)]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        mock = self.server.mock
+        payload = self._read_json()
+        mock.record_request(self.path, payload)
+        if self.path == "/api/generate":
+            self._generate(payload)
+        elif self.path == "/api/pull":
+            self._pull(payload)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def _generate(self, payload):
+        mock = self.server.mock
+        model = payload.get("model")
+        if model not in mock.models:
+            self._send_json(404, {"error": f"model '{model}' not found, try pulling it first"})
+            return
+
+        start = time.perf_counter_ns()
+        load_ns = mock.simulate_load(model)
+        if not payload.get("prompt") and not payload.get("images"):
+            # An empty request only loads the model, like Ollama's preload behaviour.
+            self._send_json(200, mock.final_chunk(model, "", start, load_ns, 0))
+            return
+        # A follow-up that reuses a context only has its new text to process
+        time.sleep(mock.prefill_delay if payload.get("images") or mock.text_prefill_delay is None
+                   else mock.text_prefill_delay)
+        if self._client_gone():
+            mock.record_cancelled()
+            self.close_connection = True
+            return
+        tokens = mock.tokens_for(payload)
+        if payload.get("stream", True):
+            self._start_chunked()
+            try:
+                for token in tokens:
+                    time.sleep(mock.token_delay)
+                    if self._client_gone():
+                        raise BrokenPipeError("client disconnected")
+                    self._write_chunk({"model": model, "response": token, "done": False})
+                self._write_chunk(mock.final_chunk(model, "", start, load_ns, len(tokens), payload))
+                self._end_chunked()
+            except (BrokenPipeError, ConnectionResetError):
+                mock.record_cancelled()
+                self.close_connection = True
+        else:
+            time.sleep(mock.token_delay * len(tokens))
+            try:
+                self._send_json(200, mock.final_chunk(model, "".join(tokens), start, load_ns, len(tokens), payload))
+            except (BrokenPipeError, ConnectionResetError):
+                mock.record_cancelled()
+
+    def _pull(self, payload):
+        mock = self.server.mock
+        model = payload.get("model") or payload.get("name")
+        if payload.get("stream", True):
+            self._start_chunked()
+            for status in ("pulling manifest", "verifying sha256 digest", "success"):
+                self._write_chunk({"status": status})
+            self._end_chunked()
+        else:
+            self._send_json(200, {"status": "success"})
+        mock.models.add(model)
+
+
+class MockOllamaServer:
+    """
+    A local stand-in for the Ollama HTTP API, used for demos, benchmarks and manual testing
+    without a GPU. It implements /api/generate (streaming and non-streaming), /api/tags, /api/ps
+    and /api/pull, with configurable prefill and per-token decode latency. Generations return
+    a "context" that later requests can pass back, like Ollama's.
+
+    Example:
+        with MockOllamaServer(models=["llava"]) as server:
+            interface = LLMInterface(host=server.url, model="llava")
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, models=("llava:7b-v1.5-q4_K_M",),
+                 response_text="This screen appears to be a **mock** response.",
+                 prefill_delay=0.0, token_delay=0.0, load_delay=0.0, text_prefill_delay=None):
+        """
+        Args:
+            host (str): Interface to bind to.
+            port (int): Port to bind to; 0 picks a free port.
+            models: Model names reported by /api/tags and accepted by /api/generate.
+            response_text (str): Text returned for every generation, split into word tokens.
+            prefill_delay (float): Seconds slept before the first token (prompt processing).
+            token_delay (float): Seconds slept before each generated token (decoding).
+            load_delay (float): Seconds slept the first time a model is used (model load).
+            text_prefill_delay (float, optional): Prefill of a request without images, e.g. a
+                follow-up that passes a context. Defaults to prefill_delay.
+        """
+        self.models = set(models)
+        self.response_text = response_text
+        self.prefill_delay = prefill_delay
+        self.token_delay = token_delay
+        self.load_delay = load_delay
+        self.text_prefill_delay = text_prefill_delay
+        self.loaded_models = set()
+        self._last_system = {} # model -> system prompt of its latest request (the cached prefix)
+        self.requests = [] # (path, payload) for every request received
+        self.connection_count = 0
+        self.cancelled_count = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _MockOllamaHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.mock = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record_connection(self):
+        with self._lock:
+            self.connection_count += 1
+
+    def record_request(self, path, payload):
+        with self._lock:
+            self.requests.append((path, payload))
+
+    def record_cancelled(self):
+        with self._lock:
+            self.cancelled_count += 1
+
+    def simulate_load(self, model):
+        """Sleeps for load_delay the first time a model is used. Returns the load time in ns."""
+        with self._lock:
+            first_use = model not in self.loaded_models
+            self.loaded_models.add(model)
+        if first_use and self.load_delay:
+            time.sleep(self.load_delay)
+            return int(self.load_delay * 1e9)
+        return 0
+
+    def evict(self, model):
+        """Simulates the server unloading an idle model."""
+        with self._lock:
+            self.loaded_models.discard(model)
+
+    def tokens_for(self, payload):
+        words = self.response_text.split(" ")
+        return [word if i == 0 else " " + word for i, word in enumerate(words)]
+
+    @staticmethod
+    def prompt_tokens(payload):
+        """Estimated tokens of a request's new input: system prompt (unless continuing a context), images and prompt."""
+        tokens = estimate_tokens(payload.get("prompt")) + IMAGE_TOKENS * len(payload.get("images") or ())
+        if not payload.get("context"):
+            tokens += estimate_tokens(payload.get("system"))
+        return tokens
+
+    def prompt_eval_count(self, payload):
+        """
+        Tokens the server evaluates for a request. Like Ollama's prompt cache, a system prompt
+        identical to the previous request's for the model is a cached prefix and not counted.
+        """
+        system = payload.get("system") or ""
+        with self._lock:
+            cached = bool(system) and self._last_system.get(payload.get("model")) == system
+            self._last_system[payload.get("model")] = system
+        tokens = self.prompt_tokens(payload)
+        return tokens - estimate_tokens(system) if cached and not payload.get("context") else tokens
+
+    def context_for(self, payload, token_count):
+        """Returns the context of a generation: the context passed in, plus fake ids for the new prompt and answer."""
+        context = list(payload.get("context") or [])
+        new_tokens = self.prompt_tokens(payload) + token_count
+        return context + list(range(len(context), len(context) + new_tokens))
+
+    def final_chunk(self, model, text, start_ns, load_ns, token_count, payload=None):
+        total_ns = time.perf_counter_ns() - start_ns
+        chunk = {
+            "model": model,
+            "response": text,
+            "done": True,
+            "total_duration": total_ns,
+            "load_duration": load_ns,
+            "prompt_eval_count": 1,
+            "prompt_eval_duration": int(self.prefill_delay * 1e9),
+            "eval_count": token_count,
+            "eval_duration": max(1, int(self.token_delay * token_count * 1e9)),
+        }
+        if payload is not None:
+            chunk["prompt_eval_count"] = self.prompt_eval_count(payload)
+            chunk["context"] = self.context_for(payload, token_count)
+        return chunk
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the Ollama API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--model", action="append", help="Model name to serve (repeatable).")
+    parser.add_argument("--prefill-delay", type=float, default=0.2)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--load-delay", type=float, default=0.0)
+    parser.add_argument("--text-prefill-delay", type=float, default=None)
+    args = parser.parse_args()
+
+    server = MockOllamaServer(host=args.host, port=args.port,
+                              models=args.model or ["llava:7b-v1.5-q4_K_M"],
+                              prefill_delay=args.prefill_delay, token_delay=args.token_delay,
+                              load_delay=args.load_delay, text_prefill_delay=args.text_prefill_delay)
+    print(f"Mock Ollama server listening on {server.url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopping mock Ollama server.")
@@ -0,0 +1,19 @@
+import socket
+import time
+
+MODEL = "llava:7b-v1.5-q4_K_M"
+
+
+def free_port_url():
+    """URL of a local port nothing listens on, i.e. a dead host."""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{probe.getsockname()[1]}"
+
+
+def wait_for(condition, timeout=2.0):
+    """Polls condition until it holds or timeout seconds pass; returns its last value."""
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
@@ -0,0 +1,198 @@
+import asyncio
+import time
+import pytest
+from src.core.backend_pool import CIRCUIT_CLOSED, CIRCUIT_HALF_OPEN, CIRCUIT_OPEN, BackendPool
+from src.core.transport import OllamaConnectionError, OllamaRequestError
+from src.devtools.mock_ollama import MockOllamaServer
+from tests.support import MODEL, free_port_url, wait_for
+
+ANSWER = "Hello from the healthy host."
+
+
+@pytest.fixture
+def healthy():
+    with MockOllamaServer(models=[MODEL], response_text=ANSWER) as server:
+        yield server
+
+
+@pytest.fixture
+def slow():
+    # Slow to start, then streams slowly enough for a close to be noticed mid-answer
+    with MockOllamaServer(models=[MODEL], response_text="Slow one two three four five six.",
+                          prefill_delay=0.6, token_delay=0.05) as server:
+        yield server
+
+
+def make_pool(*urls, **options):
+    options.setdefault("probe_interval", 0)
+    return BackendPool(list(urls), MODEL, {"connect_timeout": 1.0, "read_timeout": 10.0}, **options)
+
+
+def payload(stream):
+    return {"model": MODEL, "prompt": "Describe the screen.", "stream": stream}
+
+
+def generations(server):
+    return sum(1 for path, _ in server.requests if path == "/api/generate")
+
+
+def test_fails_over_from_a_dead_host(healthy):
+    pool = make_pool(free_port_url(), healthy.url)
+    try:
+        assert pool.post_json("generate", payload(False))["response"] == ANSWER
+        chunks = list(pool.iter_ndjson("generate", payload(True)))
+        assert "".join(chunk["response"] for chunk in chunks) == ANSWER
+        dead, live = pool.backends
+        assert dead.failures == 2 and dead.consecutive_failures == 2
+        assert live.failures == 0 and live.outstanding == 0 and dead.outstanding == 0
+    finally:
+        pool.close()
+
+
+def test_all_hosts_dead():
+    pool = make_pool(free_port_url(), free_port_url())
+    try:
+        with pytest.raises(OllamaConnectionError):
+            pool.post_json("generate", payload(False))
+    finally:
+        pool.close()
+
+
+def test_request_errors_do_not_fail_over(healthy):
+    other = MockOllamaServer(models=[MODEL]).start()
+    pool = make_pool(healthy.url, other.url)
+    try:
+        with pytest.raises(OllamaRequestError):
+            pool.post_json("generate", {"model": "missing", "prompt": "Hi", "stream": False})
+        assert generations(other) == 0 # The host answered, so the request is not retried elsewhere
+        assert pool.backends[0].consecutive_failures == 0
+    finally:
+        pool.close()
+        other.stop()
+
+
+def test_routes_to_the_least_outstanding_host():
+    pool = make_pool("http://a.invalid", "http://b.invalid", "http://c.invalid")
+    first = pool.acquire()
+    second = pool.acquire()
+    third = pool.acquire()
+    assert len({first, second, third}) == 3
+    pool.release(second, latency=0.5)
+    pool.release(third, latency=0.1)
+    # Both are idle now; the one that answered faster lately wins the tie
+    assert pool.acquire() is third
+    assert first.outstanding == 1 and second.outstanding == 0 and third.outstanding == 1
+
+
+def test_skips_hosts_without_the_model(healthy):
+    other = MockOllamaServer(models=["moondream"]).start()
+    pool = make_pool(other.url, healthy.url)
+    try:
+        assert pool.probe_all() == 2
+        assert pool.post_json("generate", payload(False))["response"] == ANSWER
+        assert generations(other) == 0
+    finally:
+        pool.close()
+        other.stop()
+
+
+def test_circuit_opens_and_recovers_through_half_open(healthy):
+    pool = make_pool(free_port_url(), healthy.url, failure_threshold=2, reset_timeout=0.2)
+    dead, live = pool.backends
+    try:
+        for _ in range(2):
+            pool.post_json("generate", payload(False))
+        assert dead.circuit == CIRCUIT_OPEN
+        pool.post_json("generate", payload(False))
+        assert dead.failures == 2 # The open circuit keeps requests away from the host
+        with pytest.raises(OllamaConnectionError):
+            pool.acquire(exclude=[live])
+
+        time.sleep(0.25)
+        # After the reset timeout one trial request goes through, and its failure re-opens the circuit
+        pool.post_json("generate", payload(False))
+        assert dead.failures == 3 and dead.circuit == CIRCUIT_OPEN
+
+        time.sleep(0.25)
+        trial = pool.acquire()
+        assert trial is dead and dead.circuit == CIRCUIT_HALF_OPEN
+        assert pool.acquire() is live # Only one trial at a time
+        pool.release(live)
+        pool.release(trial) # The trial succeeded
+        assert dead.circuit == CIRCUIT_CLOSED and dead.consecutive_failures == 0
+    finally:
+        pool.close()
+
+
+def test_sync_hedging_with_dead_slow_and_healthy_hosts(slow, healthy):
+    pool = make_pool(free_port_url(), slow.url, healthy.url, hedge_after=0.1)
+    dead, lagging, live = pool.backends
+    try:
+        start = time.perf_counter()
+        assert pool.post_json("generate", payload(False))["response"] == ANSWER
+        assert time.perf_counter() - start < 0.5
+        assert dead.failures == 1 and pool.hedges == 1 and pool.hedge_wins == 1
+        # The losing request cannot be cancelled; its host is released once it finishes
+        assert wait_for(lambda: lagging.outstanding == 0)
+        assert lagging.failures == 0 and live.outstanding == 0
+    finally:
+        pool.close()
+
+
+def test_sync_hedged_stream_closes_the_loser(slow, healthy):
+    pool = make_pool(slow.url, healthy.url, hedge_after=0.1)
+    lagging, live = pool.backends
+    try:
+        start = time.perf_counter()
+        chunks = list(pool.iter_ndjson("generate", payload(True)))
+        assert time.perf_counter() - start < 0.5
+        assert "".join(chunk["response"] for chunk in chunks) == ANSWER
+        assert pool.hedge_wins == 1
+        assert wait_for(lambda: slow.cancelled_count == 1) # The losing generation was aborted
+        assert wait_for(lambda: lagging.outstanding == 0) and live.outstanding == 0
+    finally:
+        pool.close()
+
+
+def test_no_hedge_when_the_first_host_is_fast(healthy, slow):
+    pool = make_pool(healthy.url, slow.url, hedge_after=0.3)
+    try:
+        assert pool.post_json("generate", payload(False))["response"] == ANSWER
+        assert pool.hedges == 0 and generations(slow) == 0
+    finally:
+        pool.close()
+
+
+def test_async_hedging_with_dead_slow_and_healthy_hosts(slow, healthy):
+    pool = make_pool(free_port_url(), slow.url, healthy.url, hedge_after=0.1)
+    dead, lagging, live = pool.backends
+
+    async def run():
+        try:
+            start = time.perf_counter()
+            result = await pool.apost_json("generate", payload(False))
+            assert result["response"] == ANSWER
+            chunks = [chunk async for chunk in pool.aiter_ndjson("generate", payload(True))]
+            assert "".join(chunk["response"] for chunk in chunks) == ANSWER
+            return time.perf_counter() - start
+        finally:
+            await pool.aclose()
+
+    assert asyncio.run(run()) < 1.0
+    assert pool.hedges == 2 and pool.hedge_wins == 2
+    assert dead.failures == 2
+    # Cancelling the losing attempts closes their connections, which aborts the generations
+    assert wait_for(lambda: slow.cancelled_count == 2)
+    assert lagging.outstanding == 0 and live.outstanding == 0
+
+
+def test_failed_hedge_is_replaced_while_the_first_host_is_still_running(slow, healthy):
+    # The hedge goes to the dead host; its failure hands the request on to the healthy one
+    pool = make_pool(slow.url, free_port_url(), healthy.url, hedge_after=0.1)
+    try:
+        start = time.perf_counter()
+        assert pool.post_json("generate", payload(False))["response"] == ANSWER
+        assert time.perf_counter() - start < 0.5
+        assert pool.backends[1].failures == 1
+    finally:
+        pool.close()
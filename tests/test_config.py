@@ -0,0 +1,20 @@
+from src.core.config import Settings
+
+
+def test_defaults():
+    settings = Settings({})
+    assert settings.IMAGE_MAX_BYTES == 400000
+    assert settings.IMAGE_MAX_DIM is None and settings.IMAGE_FORMAT is None
+    assert settings.RESPONSE_CACHE_ENABLED is False
+
+
+def test_blank_image_overrides_keep_the_policy():
+    blank = {name: " " for name in ("IMAGE_MAX_DIM", "IMAGE_MAX_PIXELS", "IMAGE_MAX_TOKENS", "IMAGE_FORMAT",
+                                   "IMAGE_QUALITY", "IMAGE_MAX_BYTES", "IMAGE_RESAMPLE")}
+    settings = Settings(blank)
+    assert all(getattr(settings, name) is None for name in blank)
+
+
+def test_image_overrides():
+    settings = Settings({"IMAGE_MAX_BYTES": "0", "IMAGE_MAX_DIM": "1024", "IMAGE_FORMAT": "WEBP"})
+    assert settings.IMAGE_MAX_BYTES == 0 and settings.IMAGE_MAX_DIM == 1024 and settings.IMAGE_FORMAT == "WEBP"
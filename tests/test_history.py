@@ -0,0 +1,66 @@
+import pytest
+from PIL import Image
+from src.cli.main import LLMAssistant
+from src.core.history import ScreenshotHistory
+from src.core.llm_interface import LLMInterface
+from src.core.response_cache import ResponseCache, frame_digest
+from src.core.screenshot_capture import MODE_MONITOR, FakeFramebufferBackend, ScreenshotCapture
+from src.devtools.mock_ollama import MockOllamaServer
+from tests.support import MODEL
+
+
+@pytest.fixture
+def server():
+    with MockOllamaServer(models=[MODEL], response_text="A window.") as server:
+        yield server
+
+
+@pytest.fixture
+def assistant(server, tmp_path):
+    capture = ScreenshotCapture(backend=FakeFramebufferBackend(({"left": 0, "top": 0, "width": 320, "height": 200},)),
+                                mode=MODE_MONITOR, monitor=1)
+    assistant = LLMAssistant(capture, LLMInterface(host=server.url, model=MODEL), speculative=False)
+    assistant._history = ScreenshotHistory(str(tmp_path / "history"))
+    yield assistant
+    assistant.close()
+
+
+def test_digest_does_not_depend_on_the_response_cache(assistant):
+    assistant.analyze_screen("What is this?", keep_screenshot=True)
+    assistant.llm_interface.response_cache = ResponseCache()
+    assistant.analyze_screen("What is this?", keep_screenshot=True)
+    assistant.history.flush()
+    second, first = assistant.history.recent()
+    assert first.digest == second.digest
+    stats = assistant.history.stats()
+    assert stats["frames"] == 1 and stats["deduplicated"] == 1
+
+
+def test_rerun_uses_the_stored_frame_and_the_cache(assistant, server):
+    assistant.llm_interface.response_cache = ResponseCache()
+    assistant.analyze_screen("What is this?", keep_screenshot=True)
+    entry = assistant.history.recent()[0]
+    assert assistant.rerun(entry.id) == "A window."
+    # The stored frame is lossy, but the rerun is keyed by the entry's digest, so the answer comes from the cache
+    assert sum(1 for path, _ in server.requests if path == "/api/generate") == 1
+    assert len(assistant.history.recent()) == 2
+
+
+def test_record_deduplicates_and_evicts_frames_but_keeps_analyses(tmp_path):
+    history = ScreenshotHistory(str(tmp_path), max_bytes=1, image_format="PNG")
+    try:
+        red, green = Image.new("RGB", (64, 64), "red"), Image.new("RGB", (64, 64), "green")
+        history.record(red, "Red.", MODEL, query="Color?")
+        history.record(red.copy(), "Still red.", MODEL, query="Color?")
+        history.flush()
+        assert history.stats()["deduplicated"] == 1
+        history.record(green, "Green.", MODEL)
+        history.flush()
+        stats = history.stats()
+        assert stats["analyses"] == 3 and stats["frames"] == 0 and stats["evictions"] == 2
+        entries = history.recent(search="red")
+        assert [entry.response for entry in entries] == ["Still red.", "Red."]
+        assert all(entry.path is None and history.load_image(entry) is None for entry in entries)
+        assert entries[0].digest == frame_digest(red)
+    finally:
+        history.close()
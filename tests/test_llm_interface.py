@@ -0,0 +1,70 @@
+import asyncio
+import pytest
+from PIL import Image
+from src.core.llm_interface import LLMInterface
+from src.core.response_cache import ResponseCache
+from src.devtools.mock_ollama import MockOllamaServer
+from tests.support import MODEL
+
+
+@pytest.fixture
+def server():
+    with MockOllamaServer(models=[MODEL], response_text="A complete answer.") as server:
+        yield server
+
+
+@pytest.fixture
+def interface(server):
+    interface = LLMInterface(host=server.url, model=MODEL)
+    interface.response_cache = ResponseCache()
+    yield interface
+    interface.close()
+
+
+def screen():
+    return Image.new("RGB", (64, 48), (10, 20, 30))
+
+
+def generations(server):
+    return sum(1 for path, _ in server.requests if path == "/api/generate")
+
+
+def test_complete_stream_is_cached(interface, server):
+    tokens = []
+    assert interface.get_llm_response(screen(), "What is this?", on_token=tokens.append) == "A complete answer."
+    assert interface.get_llm_response(screen(), "What is this?", on_token=tokens.append) == "A complete answer."
+    assert generations(server) == 1
+    assert interface.response_cache.stats()["entries"] == 1
+
+
+def test_unprepared_image_is_not_cached(interface, server):
+    response = interface.get_llm_response(b"not an image", "What is this?", on_token=lambda text: None,
+                                          image_hash="digest")
+    assert response == "Could not prepare the screenshot for the LLM."
+    assert interface.response_cache.stats()["entries"] == 0
+    assert generations(server) == 0
+
+
+def test_stream_without_done_chunk_is_not_cached(interface, monkeypatch):
+    def cut_short(endpoint, payload, timeout=None):
+        yield {"model": MODEL, "response": "A partial", "done": False}
+
+    monkeypatch.setattr(interface.pool, "iter_ndjson", cut_short)
+    response = interface.get_llm_response(screen(), "What is this?", on_token=lambda text: None)
+    assert response == "A partial"
+    assert interface.response_cache.stats()["entries"] == 0
+
+
+def test_async_stream_without_done_chunk_is_not_cached(interface, monkeypatch):
+    async def cut_short(endpoint, payload):
+        yield {"model": MODEL, "response": "A partial", "done": False}
+
+    async def ask():
+        try:
+            return await interface.aget_llm_response(screen(), "What is this?", on_token=lambda text: None)
+        finally:
+            await interface.aclose()
+
+    monkeypatch.setattr(interface.pool, "aiter_ndjson", cut_short)
+    assert asyncio.run(ask()) == "A partial"
+    assert interface.response_cache.stats()["entries"] == 0
@@ -0,0 +1,52 @@
+import asyncio
+import pytest
+from src.core.scheduler import LATEST_WINS, QUEUE, AnalysisScheduler
+from tests.support import wait_for
+
+
+def run_burst(policy, runs):
+    ran = []
+
+    async def job(job_id):
+        await asyncio.sleep(0.01)
+        ran.append(job_id)
+
+    scheduler = AnalysisScheduler(policy=policy, coalesce_window=0.2)
+    try:
+        ids = [scheduler.submit(job) for _ in range(3)]
+        assert wait_for(lambda: scheduler.stats()["completed"] == runs)
+        return ids, ran, scheduler.stats()
+    finally:
+        scheduler.stop()
+
+
+def test_latest_wins_coalesces_a_burst():
+    ids, ran, stats = run_burst(LATEST_WINS, 1)
+    assert ran == ids[-1:]
+    assert stats["coalesced"] == 2 and stats["completed"] == 1
+
+
+def test_queue_runs_every_trigger():
+    ids, ran, stats = run_burst(QUEUE, 3)
+    assert ran == ids
+    assert stats["coalesced"] == 0
+
+
+@pytest.mark.parametrize("policy", [LATEST_WINS, QUEUE])
+def test_new_trigger_cancels_only_under_latest_wins(policy):
+    started = []
+
+    async def slow(job_id):
+        started.append(job_id)
+        await asyncio.sleep(0.3)
+
+    scheduler = AnalysisScheduler(policy=policy, coalesce_window=0)
+    try:
+        scheduler.submit(slow)
+        assert wait_for(lambda: started)
+        scheduler.submit(slow)
+        assert wait_for(lambda: len(started) == 2)
+        assert wait_for(lambda: scheduler.stats()["completed"] + scheduler.stats()["cancelled"] == 2)
+        assert scheduler.stats()["cancelled"] == (1 if policy == LATEST_WINS else 0)
+    finally:
+        scheduler.stop()
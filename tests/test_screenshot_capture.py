@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+from src.core.screenshot_capture import (MODE_ALL, MODE_CURSOR, MODE_MONITOR, MODE_REGION, FakeFramebufferBackend,
+                                         ScreenshotCapture, parse_region)
+
+# A 1280x720 primary monitor with a 640x480 one to its right
+MONITORS = ({"left": 0, "top": 0, "width": 1280, "height": 720},
+            {"left": 1280, "top": 0, "width": 640, "height": 480})
+
+
+@pytest.fixture
+def backend():
+    return FakeFramebufferBackend(MONITORS)
+
+
+def capture_tool(backend, **options):
+    options.setdefault("all_monitors_max_dim", 0)
+    return ScreenshotCapture(output_dir="unused", backend=backend, **options)
+
+
+def expected_rgb(backend, region):
+    """The RGB pixels of a desktop region, from the backend's BGRA desktop."""
+    bgra = backend.desktop[region["top"]:region["top"] + region["height"],
+                           region["left"]:region["left"] + region["width"]]
+    return bgra[..., [2, 1, 0]]
+
+
+def test_full_desktop(backend):
+    capture = capture_tool(backend, mode=MODE_ALL)
+    frame = capture.capture_frame()
+    assert frame.shape == (720, 1920, 4)
+    assert capture.last_bounds == {"left": 0, "top": 0, "width": 1920, "height": 720}
+    # The area below the smaller monitor is part of the bounding box too
+    assert np.array_equal(frame[..., :3], expected_rgb(backend, capture.last_bounds))
+
+
+def test_full_desktop_image_is_downscaled(backend):
+    capture = capture_tool(backend, mode=MODE_ALL, all_monitors_max_dim=960)
+    assert capture.capture_image().size == (960, 360)
+    # capture_frame never downscales
+    assert capture.capture_frame().shape[:2] == (720, 1920)
+
+
+def test_monitor(backend):
+    capture = capture_tool(backend, mode=MODE_MONITOR, monitor=1)
+    assert capture.capture_frame().shape[:2] == (720, 1280)
+    frame = capture.capture_frame(monitor=2)
+    assert frame.shape[:2] == (480, 640)
+    assert np.array_equal(frame[..., :3], expected_rgb(backend, MONITORS[1]))
+    with pytest.raises(ValueError):
+        capture.capture_frame(monitor=3)
+
+
+def test_region(backend):
+    region = parse_region("1200,100,200,50") # Spans both monitors
+    capture = capture_tool(backend, mode=MODE_REGION, region=region)
+    image = capture.capture_image()
+    assert image.size == (200, 50)
+    assert np.array_equal(np.asarray(image), expected_rgb(backend, region))
+    # Regions are clipped to the desktop
+    frame = capture.capture_frame(region={"left": 1800, "top": 600, "width": 400, "height": 400})
+    assert capture.last_bounds == {"left": 1800, "top": 600, "width": 120, "height": 120}
+    assert frame.shape[:2] == (120, 120)
+    with pytest.raises(ValueError):
+        capture.capture_frame(region={"left": 5000, "top": 0, "width": 10, "height": 10})
+    with pytest.raises(ValueError):
+        capture_tool(backend, mode=MODE_REGION).capture_frame()
+
+
+def test_cursor(backend):
+    capture = capture_tool(backend, mode=MODE_CURSOR)
+    backend.cursor = (1500, 200)
+    capture.capture_frame()
+    assert capture.last_bounds == MONITORS[1]
+    backend.cursor = (100, 100)
+    capture.capture_frame()
+    assert capture.last_bounds == MONITORS[0]
+    backend.cursor = None # Unknown: falls back to the primary monitor
+    capture.capture_frame()
+    assert capture.last_bounds == MONITORS[0]
+
+
+def test_rgbx_conversion():
+    desktop = np.zeros((2, 2, 4), dtype=np.uint8)
+    desktop[0, 0] = (10, 20, 30, 0) # BGRA
+    desktop[1, 1] = (200, 100, 50, 7)
+    backend = FakeFramebufferBackend(({"left": 0, "top": 0, "width": 2, "height": 2},), desktop=desktop)
+    capture = capture_tool(backend, mode=MODE_MONITOR, monitor=1)
+    frame = capture.capture_frame()
+    assert tuple(frame[0, 0]) == (30, 20, 10, 255) # RGBX; the X channel is always 255
+    assert tuple(frame[1, 1]) == (50, 100, 200, 255)
+    assert capture.frame_buffer.image.mode == "RGBX"
+    assert capture.frame_buffer.image.getpixel((1, 1))[:3] == (50, 100, 200)
+    assert capture.capture_image().getpixel((0, 0)) == (30, 20, 10)
+
+
+def test_frame_buffer_is_reused(backend):
+    capture = capture_tool(backend, mode=MODE_MONITOR, monitor=1)
+    first = capture.capture_frame()
+    backend.desktop[0, 0, :3] = (1, 2, 3)
+    second = capture.capture_frame()
+    # Same size: the same buffer, overwritten in place, and the PIL image shares it
+    assert second is first and tuple(first[0, 0, :3]) == (3, 2, 1)
+    assert capture.frame_buffer.image.getpixel((0, 0))[:3] == (3, 2, 1)
+    # A new size replaces the buffer; the same size again keeps the new one
+    smaller = capture.capture_frame(monitor=2)
+    assert smaller is not first and smaller.shape[:2] == (480, 640)
+    assert capture.capture_frame(monitor=2) is smaller
+
+
+def test_captured_image_owns_its_pixels(backend):
+    capture = capture_tool(backend, mode=MODE_MONITOR, monitor=1)
+    image = capture.capture_image()
+    before = image.getpixel((0, 0))
+    backend.desktop[0, 0, :3] = 0
+    capture.capture_frame()
+    assert image.getpixel((0, 0)) == before
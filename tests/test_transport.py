@@ -0,0 +1,185 @@
+import asyncio
+import json
+import socket
+import time
+import pytest
+from src.core.transport import (AsyncOllamaTransport, OllamaConnectionError, OllamaRequestError,
+                                OllamaTimeoutError, OllamaTransport, StreamingJSONBody)
+from src.devtools.mock_ollama import MockOllamaServer
+from tests.support import MODEL, free_port_url, wait_for
+
+ANSWER = "One two three four five six seven eight."
+
+
+@pytest.fixture
+def server():
+    with MockOllamaServer(models=[MODEL], response_text=ANSWER) as server:
+        yield server
+
+
+@pytest.fixture
+def unresponsive_url():
+    """A listening socket whose accept queue is full, so new connections are never established."""
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(0)
+    port = listener.getsockname()[1]
+    queued = []
+    for _ in range(3):
+        client = socket.socket()
+        client.setblocking(False)
+        try:
+            client.connect(("127.0.0.1", port))
+        except BlockingIOError:
+            pass
+        queued.append(client)
+    yield f"http://127.0.0.1:{port}"
+    for client in queued:
+        client.close()
+    listener.close()
+
+
+def generate_payload(stream):
+    return {"model": MODEL, "prompt": "Describe the screen.", "stream": stream}
+
+
+def test_streaming_body_matches_json():
+    payload = {"model": MODEL, "prompt": "Describe."}
+    images = [bytes(range(256)) * 7, b"x"]
+    body = StreamingJSONBody(payload, images, chunk_size=100)
+    data = bytes(body)
+    assert len(data) == len(body)
+    decoded = json.loads(data)
+    assert decoded["prompt"] == "Describe." and len(decoded["images"]) == 2
+    assert bytes(body) == data # Iterable again, e.g. for a retry on another host
+
+
+def test_sync_tags_generate_and_pull(server):
+    transport = OllamaTransport(server.url)
+    try:
+        assert [model["name"] for model in transport.get_json("tags")["models"]] == [MODEL]
+        assert transport.post_json("generate", generate_payload(False))["response"] == ANSWER
+        chunks = list(transport.iter_ndjson("generate", generate_payload(True)))
+        assert "".join(chunk["response"] for chunk in chunks) == ANSWER and chunks[-1]["done"]
+        statuses = [chunk["status"] for chunk in transport.iter_ndjson("pull", {"model": "moondream"})]
+        assert statuses[-1] == "success"
+        assert "moondream" in {model["name"] for model in transport.get_json("tags")["models"]}
+        assert server.connection_count == 1 # Every request reused the kept-alive connection
+    finally:
+        transport.close()
+
+
+def test_sync_errors(server):
+    transport = OllamaTransport(server.url)
+    try:
+        with pytest.raises(OllamaRequestError):
+            transport.post_json("generate", {"model": "missing", "prompt": "Hi", "stream": False})
+    finally:
+        transport.close()
+    with pytest.raises(OllamaConnectionError):
+        OllamaTransport(free_port_url()).get_json("tags")
+
+
+def test_sync_read_timeout_is_separate_from_connect_timeout(server):
+    server.prefill_delay = 0.3
+    # A connect timeout shorter than the wait for the answer does not cut the request short
+    transport = OllamaTransport(server.url, connect_timeout=0.05, read_timeout=5)
+    try:
+        assert transport.post_json("generate", generate_payload(False))["response"] == ANSWER
+    finally:
+        transport.close()
+    transport = OllamaTransport(server.url, connect_timeout=5, read_timeout=0.1)
+    try:
+        with pytest.raises(OllamaTimeoutError):
+            transport.post_json("generate", generate_payload(False))
+    finally:
+        transport.close()
+
+
+def test_sync_connect_timeout(unresponsive_url):
+    transport = OllamaTransport(unresponsive_url, connect_timeout=0.2, read_timeout=30)
+    start = time.monotonic()
+    with pytest.raises(OllamaConnectionError):
+        transport.get_json("tags")
+    assert time.monotonic() - start < 5
+    transport.close()
+
+
+def test_sync_closing_the_stream_aborts_the_generation(server):
+    server.token_delay = 0.05
+    transport = OllamaTransport(server.url)
+    try:
+        stream = transport.iter_ndjson("generate", generate_payload(True))
+        assert next(stream)["response"] == "One"
+        stream.close()
+        assert wait_for(lambda: server.cancelled_count == 1)
+    finally:
+        transport.close()
+
+
+def test_async_tags_generate_and_pull(server):
+    async def run():
+        transport = AsyncOllamaTransport(server.url)
+        try:
+            tags = await transport.get_json("tags")
+            assert [model["name"] for model in tags["models"]] == [MODEL]
+            assert (await transport.post_json("generate", generate_payload(False)))["response"] == ANSWER
+            chunks = [chunk async for chunk in transport.iter_ndjson("generate", generate_payload(True))]
+            assert "".join(chunk["response"] for chunk in chunks) == ANSWER and chunks[-1]["done"]
+            statuses = [chunk["status"] async for chunk in transport.iter_ndjson("pull", {"model": "moondream"})]
+            assert statuses[-1] == "success"
+            # Concurrent requests share the pool
+            answers = await asyncio.gather(*(transport.post_json("generate", generate_payload(False))
+                                             for _ in range(3)))
+            assert [answer["response"] for answer in answers] == [ANSWER] * 3
+        finally:
+            await transport.aclose()
+
+    asyncio.run(run())
+
+
+def test_async_timeouts(server, unresponsive_url):
+    server.prefill_delay = 0.3
+
+    async def run():
+        transport = AsyncOllamaTransport(server.url, connect_timeout=0.05, read_timeout=5)
+        try:
+            assert (await transport.post_json("generate", generate_payload(False)))["response"] == ANSWER
+        finally:
+            await transport.aclose()
+        transport = AsyncOllamaTransport(server.url, connect_timeout=5, read_timeout=0.1)
+        try:
+            with pytest.raises(OllamaTimeoutError):
+                await transport.post_json("generate", generate_payload(False))
+        finally:
+            await transport.aclose()
+        transport = AsyncOllamaTransport(unresponsive_url, connect_timeout=0.2, read_timeout=30)
+        try:
+            with pytest.raises(OllamaConnectionError):
+                await transport.get_json("tags")
+        finally:
+            await transport.aclose()
+
+    asyncio.run(run())
+
+
+def test_async_cancellation_aborts_the_generation(server):
+    server.token_delay = 0.05
+
+    async def run():
+        transport = AsyncOllamaTransport(server.url)
+        try:
+            async def consume():
+                async for _ in transport.iter_ndjson("generate", generate_payload(True)):
+                    pass
+
+            task = asyncio.create_task(consume())
+            await asyncio.sleep(0.15)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        finally:
+            await transport.aclose()
+
+    asyncio.run(run())
+    assert wait_for(lambda: server.cancelled_count == 1)
@@ -0,0 +1,70 @@
+import numpy as np
+from src.core.screenshot_capture import MODE_MONITOR, FakeFramebufferBackend, ScreenshotCapture
+from src.core.watch import ScreenWatcher
+
+MONITORS = ({"left": 0, "top": 0, "width": 640, "height": 480},
+            {"left": 640, "top": 0, "width": 320, "height": 240})
+
+
+def make_watcher(backend, monitor=1):
+    capture = ScreenshotCapture(backend=backend, mode=MODE_MONITOR, monitor=monitor)
+    return ScreenWatcher(capture, on_change=lambda event: None, capture_mode=MODE_MONITOR, monitor=monitor,
+                         debounce=0.0, max_delay=10.0, min_change=0.0, cpu_budget=0)
+
+
+def paint(backend, left, top, width, height, value=0):
+    backend.desktop[top:top + height, left:left + width, :3] = value
+
+
+def test_change_is_reported_as_cropped_region():
+    backend = FakeFramebufferBackend(MONITORS)
+    watcher = make_watcher(backend)
+    watcher.debounce = 0.05
+    assert watcher.sample() is None # Baseline
+    paint(backend, 100, 100, 20, 20)
+    assert watcher.sample() is None # Still settling
+    watcher._last_change -= 1
+    event = watcher.sample()
+    assert event is not None and not event.is_full_frame
+    region = event.region
+    assert region["left"] <= 100 and region["left"] + region["width"] >= 120
+    assert region["top"] <= 100 and region["top"] + region["height"] >= 120
+    assert event.image.size == (region["width"], region["height"])
+
+
+def test_frame_size_change_resets_the_burst():
+    backend = FakeFramebufferBackend(MONITORS)
+    watcher = make_watcher(backend)
+    watcher.debounce = 0.05
+    watcher.sample()
+    paint(backend, 0, 0, 64, 64) # A burst on the 640x480 monitor, not settled yet
+    assert watcher.sample() is None
+    assert watcher._pending.shape == (15, 20)
+
+    watcher.monitor = 2 # Moves to the 320x240 monitor mid-burst
+    assert watcher.sample() is None # The detector starts over for the new size
+    assert watcher._pending is None and watcher._first_change is None and watcher._last_change is None
+
+    paint(backend, 640 + 160, 120, 32, 32)
+    assert watcher.sample() is None # No broadcast error merging the old burst
+    assert watcher._pending.shape == (8, 10)
+    watcher._last_change -= 1
+    event = watcher.sample()
+    assert event is not None
+    assert event.frame_size == (320, 240)
+    region = event.region
+    assert region["left"] <= 640 + 160 < region["left"] + region["width"]
+    assert region["top"] <= 120 < region["top"] + region["height"]
+    assert np.asarray(event.image).shape[:2] == (region["height"], region["width"])
+
+
+def test_own_output_is_ignored():
+    backend = FakeFramebufferBackend(MONITORS)
+    watcher = make_watcher(backend)
+    watcher.sample()
+    watcher.begin_output()
+    paint(backend, 200, 200, 64, 64)
+    assert watcher.sample() is None
+    watcher.end_output()
+    assert watcher.sample() is None
+    assert watcher.ignored == 1 and watcher._pending is None